@@ -1,6 +1,26 @@
+import importlib.util
+import os
+import sys
 import tkinter as tk
+from tkinter import messagebox
 import subprocess
 
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# The mqtt_multiple modules import each other relative to their folder
+sys.path.insert(0, os.path.join(ROOT_DIR, "mqtt_multiple"))
+
+hosted_windows = []  # Apps opened in this process; closed together with the launcher
+
+def load_gui(name, path):
+    """Import a GUI script under its own module name; both folders have a group_7_publisher_GUI.py."""
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT_DIR, path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
 def open_manual_publishing():
     # TO run the single editable publishing script
     subprocess.Popen(["python", "./mqtt-single/group_7_publisher_GUI.py"])
@@ -11,6 +31,51 @@ def open_automatic_publishing():
     subprocess.Popen(["python", "./mqtt_multiple/group_7_publisher_GUI.py"])
     subprocess.Popen(["python", "./mqtt_multiple/group_7_subscriber_GUI.py"])
 
+def host_windows(root, factories):
+    """Build each app on a new Toplevel of the launcher. The windows connect as they are built;
+    if one cannot reach the broker, the ones already open are closed again and [] is returned."""
+    apps = []
+    for factory in factories:
+        window = tk.Toplevel(root)
+        try:
+            apps.append(factory(window))
+        except OSError as e:
+            for app in apps:
+                app.on_closing()
+            if window.winfo_exists():
+                window.destroy()
+            messagebox.showerror("Health Monitoring System", f"Could not connect to the MQTT broker: {e}", parent=root)
+            return []
+    for app in apps:
+        app.master.protocol("WM_DELETE_WINDOW", app.on_closing)
+    hosted_windows.extend(apps)
+    return apps
+
+def host_manual_publishing(root):
+    """Open the single publishing windows in this process, as Toplevels of the launcher."""
+    publisher_gui = load_gui("single_publisher_GUI", "mqtt-single/group_7_publisher_GUI.py")
+    subscriber_gui = load_gui("single_subscriber_GUI", "mqtt-single/group_7_subscriber_GUI.py")
+    return host_windows(root, [lambda window: publisher_gui.Publisher(window, 'localhost', 1883, 'health'),
+                               lambda window: subscriber_gui.Subscriber(window, 'localhost', 1883, 'health')])
+
+def host_automatic_publishing(root):
+    """Open the multiple publishing windows in this process, as Toplevels of the launcher."""
+    publisher_gui = load_gui("multiple_publisher_GUI", "mqtt_multiple/group_7_publisher_GUI.py")
+    subscriber_gui = load_gui("multiple_subscriber_GUI", "mqtt_multiple/group_7_subscriber_GUI.py")
+    apps = host_windows(root, [publisher_gui.App, subscriber_gui.HealthSubscriber])
+    if apps:
+        publisher, subscriber = apps
+        publisher.master.geometry(f'{int(root.winfo_screenwidth() * 4 // 6)}x700+0+0')
+        subscriber.master.geometry('600x950')
+    return apps
+
+def close_launcher(root):
+    """Close the hosted windows the way their own close button would, then the launcher."""
+    for app in hosted_windows:
+        if app.master.winfo_exists():
+            app.on_closing()
+    root.destroy()
+
 def setup_gui():
     root = tk.Tk()
     # Configure the main window
@@ -19,7 +84,7 @@ def setup_gui():
 
     # Set the window size
     window_width = 380
-    window_height = 250
+    window_height = 290
     root.geometry(f"{window_width}x{window_height}")
 
     # Get the screen dimension
@@ -40,14 +105,22 @@ def setup_gui():
     label3 = tk.Label(root, text="Select the type of publishing:")
     label3.grid(row=2, column=0, columnspan=3, padx=10, pady=(0, 20))
 
+    # One process starts faster and shares the interpreter; separate processes keep the windows independent
+    in_process = tk.BooleanVar(value=True)
+    in_process_check = tk.Checkbutton(root, text="Open the windows in this process", variable=in_process)
+    in_process_check.grid(row=4, column=0, columnspan=3, padx=10)
+
     # Single publishing button
-    single_button = tk.Button(root, text="Single Publishing", command=open_manual_publishing)
+    single_button = tk.Button(root, text="Single Publishing",
+                              command=lambda: host_manual_publishing(root) if in_process.get() else open_manual_publishing())
     single_button.grid(row=3, column=0, padx=20, pady=10, ipadx=20, ipady=20)
 
     # Multiple publishing button
-    multiple_button = tk.Button(root, text="Multiple Publishing", command=open_automatic_publishing)
+    multiple_button = tk.Button(root, text="Multiple Publishing",
+                                command=lambda: host_automatic_publishing(root) if in_process.get() else open_automatic_publishing())
     multiple_button.grid(row=3, column=1, padx=20, pady=10, ipadx=20, ipady=20)
 
+    root.protocol("WM_DELETE_WINDOW", lambda: close_launcher(root))
     root.mainloop()
 
 if __name__ == "__main__":
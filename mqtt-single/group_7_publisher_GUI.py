@@ -85,6 +85,11 @@ class Publisher:
         # Do nothing, effectively skipping a transmission
         pass
 
+    def on_closing(self):
+        # The publishing thread sees the flag after its current sleep and disconnects
+        self.is_stopped.set()
+        self.master.destroy()
+
     def generate_health_data(self):
         return json.dumps({
             "timestamp": int(time.time()),
@@ -104,4 +109,5 @@ class Publisher:
 if __name__ == "__main__":
     root = tk.Tk()
     app = Publisher(root, 'localhost', 1883, 'health')
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
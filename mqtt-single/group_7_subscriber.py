@@ -1,7 +1,12 @@
-import json
+import os
 import random
+import sys
 from paho.mqtt import client as mqtt_client
 
+# The payload schemas are shared with the multiple-publisher subscriber
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mqtt_multiple'))
+from Utils.group_7_schema_registry import HEALTH_SCHEMA, SchemaError, SchemaRegistry
+
 class Subscriber:
     def __init__(self, broker, port, topic):
         self.client_id = f'python-mqtt-subscriber-{random.randint(0, 10000)}'
@@ -9,17 +14,22 @@ class Subscriber:
         self.port = port
         self.topic = topic
         self.client = mqtt_client.Client(self.client_id)
+        self.schemas = SchemaRegistry([(topic, HEALTH_SCHEMA)])
 
         # Setting the on_message callback within the class
         self.client.on_message = self.on_message
 
     def on_message(self, client, userdata, msg):
-        # Parsing the message payload
-        message = json.loads(msg.payload.decode())
+        # Parsing the message payload into a HealthReading
+        try:
+            reading = self.schemas.decode(msg.topic, msg.payload)
+        except SchemaError as e:
+            print(f"Rejected message on {msg.topic} ({self.schemas.rejections[msg.topic]} so far): {e}")
+            return
         print(f"Received data on {msg.topic}:")
-        print(f"Heart Rate: {message['heart_rate']} BPM")
-        print(f"Blood Pressure: {message['blood_pressure']} mmHg")
-        print(f"Oxygen Saturation: {message['oxygen_saturation']}%")
+        print(f"Heart Rate: {reading.heart_rate} BPM")
+        print(f"Blood Pressure: {reading.systolic}/{reading.diastolic} mmHg")
+        print(f"Oxygen Saturation: {reading.oxygen_saturation}%")
         print("")
 
     def connect_mqtt(self):
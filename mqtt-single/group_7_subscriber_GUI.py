@@ -1,14 +1,30 @@
 import tkinter as tk
 from tkinter import scrolledtext, Frame
 import threading
-import json
+import os
+import sys
 import time
 import random
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 from paho.mqtt import client as mqtt_client
-from matplotlib.animation import FuncAnimation
+
+# The decimation helpers and anomaly rules are shared with the multiple-publisher subscriber
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mqtt_multiple'))
+from subscribers.group_7_anomaly_rules import AnomalyRuleEngine
+from subscribers.group_7_deadline_tracker import DeadlineTracker
+from subscribers.group_7_downsampling import DecimationPyramid
+from Utils.group_7_schema_registry import HEALTH_SCHEMA, SchemaError, SchemaRegistry
+
+SERIES_LABELS = {
+    'heart_rate': 'Heart Rate',
+    'blood_pressure_systolic': 'Systolic BP',
+    'blood_pressure_diastolic': 'Diastolic BP',
+    'oxygen_saturation': 'Oxygen Saturation'
+}
+# Conditions for wild data, in the rule format of subscribers/group_7_anomaly_rules.py
+ANOMALY_RULES = [
+    {"name": "heart_rate_high", "kind": "threshold", "field": "heart_rate", "above": 180},
+    {"name": "oxygen_saturation_low", "kind": "threshold", "field": "oxygen_saturation", "below": 80},
+]
 
 class Subscriber:
     def __init__(self, master, broker, port, topic):
@@ -21,12 +37,19 @@ class Subscriber:
         self.client_id = f'python-mqtt-{random.randint(0, 10000)}'
         self.client = mqtt_client.Client(self.client_id)
 
-        self.data = {'time': [], 'heart_rate': [], 'blood_pressure_systolic': [], 'blood_pressure_diastolic': [], 'oxygen_saturation': []}
+        # Full history per series; only a decimated window of it is ever handed to matplotlib
+        self.data = {name: DecimationPyramid() for name in SERIES_LABELS}
+        self.data_lock = threading.Lock()  # Written on the MQTT thread, read on the Tk thread
+        self.setting_limits = False
+        self.anomaly_rules = AnomalyRuleEngine(ANOMALY_RULES)
+        # Decodes the combined payload ("blood_pressure": "120/80") into a HealthReading
+        self.schemas = SchemaRegistry([(topic, HEALTH_SCHEMA)])
         self.setup_gui()
 
         self.is_stopped = threading.Event()
-        self.last_received = time.time()
-        self.expected_interval = 5 + 2  # Publish interval plus a grace period
+        # Publish interval plus a grace period; checked on a timer, not only when the next message arrives
+        self.deadlines = DeadlineTracker(self.on_missed, intervals={topic: 5}, grace_fraction=0.0, min_grace=2.0)
+        self.master.after(500, self.check_deadlines)
 
     def setup_gui(self):
         Frame(self.master).pack(side=tk.TOP, fill=tk.BOTH, expand=True)
@@ -34,6 +57,7 @@ class Subscriber:
         self.log.pack(pady=10)
         self.log.tag_config("wild", foreground="red")
         self.log.tag_config("missed", foreground="blue")
+        self.log.tag_config("rejected", foreground="orange")
 
         self.start_button = tk.Button(self.master, text="Start Listening", command=self.start_listening)
         self.start_button.pack(side=tk.LEFT, padx=10)
@@ -41,11 +65,33 @@ class Subscriber:
         self.stop_button = tk.Button(self.master, text="Stop Listening", command=self.stop_listening)
         self.stop_button.pack(side=tk.RIGHT, padx=10)
 
+        # Zooming or panning stops the chart from following new data until this is ticked again
+        self.follow_live = tk.BooleanVar(value=True)
+        self.follow_button = tk.Checkbutton(self.master, text="Follow live", variable=self.follow_live,
+                                            command=lambda: self.update_graph(None))
+        self.follow_button.pack(side=tk.LEFT, padx=10)
+
+        # matplotlib is slow to import, so the chart is added once the window is showing
+        self.canvas = None
+        self.master.after_idle(self.setup_chart)
+
+    def setup_chart(self):
+        from matplotlib.animation import FuncAnimation
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from matplotlib.figure import Figure
+
         # Set up the matplotlib Figure and animate it
         self.figure = Figure(figsize=(6, 4), dpi=100)
         self.ax = self.figure.add_subplot(1, 1, 1)
+        self.lines = {}
+        for name, label in SERIES_LABELS.items():
+            self.lines[name], = self.ax.plot([], [], label=label)
+        self.ax.legend()
         self.canvas = FigureCanvasTkAgg(self.figure, master=self.master)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.master, pack_toolbar=False)
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
         self.ani = FuncAnimation(self.figure, self.update_graph, interval=1000)
 
     def start_listening(self):
@@ -75,48 +121,82 @@ class Subscriber:
         self.client.loop_forever()
 
     def on_message(self, client, userdata, msg):
-        message = json.loads(msg.payload.decode())
-        current_time = time.time()
-        if current_time - self.last_received > self.expected_interval:
-            self.log.insert(tk.END, "Missed message detected.\n", "missed")
-        self.display_message(message)
-        self.last_received = current_time
-
-    def display_message(self, message):
-        if self.is_wild_data(message):
-            self.log.insert(tk.END, f"Wild data detected: {json.dumps(message)}\n", "wild")
+        self.deadlines.observe(msg.topic, time.time())
+        try:
+            reading = self.schemas.decode(msg.topic, msg.payload)
+        except SchemaError as e:
+            rejected = self.schemas.rejections[msg.topic]
+            self.log.insert(tk.END, f"Rejected message ({rejected} so far): {e}\n", "rejected")
+            return
+        self.display_message(reading)
+
+    def check_deadlines(self):
+        self.deadlines.advance(time.time())
+        self.master.after(500, self.check_deadlines)
+
+    def on_missed(self, topic, expected_at, missed_count):
+        self.log.insert(tk.END, "Missed message detected.\n", "missed")
+
+    def display_message(self, reading):
+        if self.is_wild_data(reading):
+            self.log.insert(tk.END, f"Wild data detected: {reading}\n", "wild")
         else:
-            display_text = f"Received: Heart Rate: {message['heart_rate']} BPM, "
-            display_text += f"Blood Pressure: {message['blood_pressure']}, "
-            display_text += f"Oxygen Saturation: {message['oxygen_saturation']}%\n"
+            display_text = f"Received: Heart Rate: {reading.heart_rate} BPM, "
+            display_text += f"Blood Pressure: {reading.systolic}/{reading.diastolic}, "
+            display_text += f"Oxygen Saturation: {reading.oxygen_saturation}%\n"
             self.log.insert(tk.END, display_text)
-        self.update_data(message)
+        self.update_data(reading)
 
-    def update_data(self, message):
+    def update_data(self, reading):
         # Append new data to the data dict
-        bp_systolic, bp_diastolic = map(int, message['blood_pressure'].split('/'))
-        self.data['time'].append(time.time())
-        self.data['heart_rate'].append(message['heart_rate'])
-        self.data['blood_pressure_systolic'].append(bp_systolic)
-        self.data['blood_pressure_diastolic'].append(bp_diastolic)
-        self.data['oxygen_saturation'].append(message['oxygen_saturation'])
+        now = time.time()
+        with self.data_lock:
+            self.data['heart_rate'].append(now, reading.heart_rate)
+            self.data['blood_pressure_systolic'].append(now, reading.systolic)
+            self.data['blood_pressure_diastolic'].append(now, reading.diastolic)
+            self.data['oxygen_saturation'].append(now, reading.oxygen_saturation)
 
     def update_graph(self, frame):
-        # This function updates the graph
-        if self.data['time']:
-            self.ax.clear()
-            self.ax.plot(self.data['time'], self.data['heart_rate'], label='Heart Rate')
-            self.ax.plot(self.data['time'], self.data['blood_pressure_systolic'], label='Systolic BP')
-            self.ax.plot(self.data['time'], self.data['blood_pressure_diastolic'], label='Diastolic BP')
-            self.ax.plot(self.data['time'], self.data['oxygen_saturation'], label='Oxygen Saturation')
-            self.ax.legend()
-            self.canvas.draw()
-
-    def is_wild_data(self, message):
-        # Define conditions for wild data
-        return message['heart_rate'] > 180 or message['oxygen_saturation'] < 80
+        # This function updates the graph with a decimated copy of the visible window
+        if self.canvas is None:
+            return
+        with self.data_lock:
+            bounds = self.data['heart_rate'].bounds()
+        if bounds is None:
+            return
+        following = self.follow_live.get()
+        x_start, x_end = bounds if following else self.ax.get_xlim()
+        pixels = int(self.ax.get_window_extent().width)
+        with self.data_lock:
+            for name, line in self.lines.items():
+                line.set_data(*self.data[name].view(x_start, x_end, pixels))
+        if following:
+            self.setting_limits = True
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.setting_limits = False
+        self.canvas.draw_idle()
+
+    def on_xlim_changed(self, ax):
+        # Toolbar zoom or pan: stop following and re-decimate for the new window
+        if self.setting_limits:
+            return
+        self.follow_live.set(False)
+        self.master.after_idle(self.update_graph, None)
+
+    def on_closing(self):
+        self.is_stopped.set()
+        self.client.disconnect()  # Ends loop_forever() on the listening thread
+        self.master.destroy()
+
+    def is_wild_data(self, reading):
+        # Every value of the reading is one sample for the rule engine
+        now = time.time()
+        samples = [(self.topic, field, getattr(reading, field), now) for field in ('heart_rate', 'oxygen_saturation')]
+        return bool(self.anomaly_rules.evaluate(samples).any())
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = Subscriber(root, 'localhost', 1883, 'health')
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
@@ -1,32 +1,80 @@
 import tkinter as tk
+from collections import deque
 from datetime import datetime
 
 class SafeLogger:
-    def __init__(self):
+    def __init__(self, max_lines=1000, refresh_ms=100):
         self.log_widgets = {}
+        self.max_lines = max_lines  # Default cap on lines kept per label
+        self.refresh_ms = refresh_ms  # How often pending lines are written to the widgets
+        self.line_caps = {}  # label -> cap for that widget
+        self.pending = {}  # label -> lines waiting for the next refresh tick
+        self.line_counts = {}  # label -> lines currently shown in the widget
+        self.dropped_lines = {}  # label -> lines discarded because of the cap
 
-    def register_log_widget(self, label, widget):
+    def register_log_widget(self, label, widget, max_lines=None):
         """Register a text widget for logging with a specific label."""
         self.log_widgets[label] = widget
+        self.line_caps[label] = max_lines if max_lines is not None else self.max_lines
+        self.pending[label] = deque()
+        self.line_counts[label] = 0
+        self.dropped_lines[label] = 0
         print(f"Registered log widget for label: {label}")
         self.setup_logging_tags(widget)
+        widget.after(self.refresh_ms, self.flush, label)
 
     def setup_logging_tags(self, widget):
         """Setup tags for logging messages."""
-        widget.tag_config('info', foreground='black')  
-        widget.tag_config('warning', foreground='orange')  
-        widget.tag_config('error', foreground='red')  
+        widget.tag_config('info', foreground='black')
+        widget.tag_config('warning', foreground='orange')
+        widget.tag_config('error', foreground='red')
         widget.tag_config('special', foreground='blue')
 
     def log(self, message, label, tag='info'):
-        """Log a message to the registered text widget with the specified label."""
+        """Queue a message for the text widget registered under the label.
+
+        Safe to call from any thread: only the pending buffer is touched here,
+        the widget itself is updated on the Tk thread by flush().
+        """
         if label in self.log_widgets:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             formatted_message = f"[{timestamp}] {message}\n"
-            def append_message():
-                self.log_widgets[label].insert(tk.END, formatted_message, tag)
-                self.log_widgets[label].see(tk.END)
-            self.log_widgets[label].after(0, append_message)
+            pending = self.pending[label]
+            if len(pending) >= self.line_caps[label]:
+                # More lines arrived in one tick than the widget may hold
+                pending.popleft()
+                self.dropped_lines[label] += 1
+            pending.append((formatted_message, tag))
         else:
             print(f"Log label '{label}' not registered. Available labels: {self.log_widgets.keys()}")
 
+    def flush(self, label):
+        """Write pending lines in one insert, trim the oldest lines in bulk, and reschedule."""
+        widget = self.log_widgets[label]
+        pending = self.pending[label]
+        try:
+            if pending:
+                chunks = []
+                count = 0
+                while pending:
+                    formatted_message, tag = pending.popleft()
+                    chunks.extend((formatted_message, tag))
+                    count += 1
+                widget.insert(tk.END, *chunks)
+                self.line_counts[label] += count
+
+                excess = self.line_counts[label] - self.line_caps[label]
+                if excess > 0:
+                    widget.delete('1.0', f'{excess + 1}.0')
+                    self.line_counts[label] -= excess
+                    self.dropped_lines[label] += excess
+                widget.see(tk.END)
+            widget.after(self.refresh_ms, self.flush, label)
+        except tk.TclError:
+            pass  # The widget was destroyed, stop refreshing it
+
+    def dropped_count(self, label=None):
+        """Lines discarded because of the cap, for one label or for all of them."""
+        if label is not None:
+            return self.dropped_lines.get(label, 0)
+        return sum(self.dropped_lines.values())
@@ -1,6 +1,9 @@
+import os
+
 # MQTT Broker Configuration 
-MQTT_BROKER_URL = "localhost"
-MQTT_BROKER_PORT = 1883
+# Can be pointed elsewhere (e.g. at broker/group_7_embedded_broker.py) through the environment
+MQTT_BROKER_URL = os.environ.get("MQTT_BROKER_URL", "localhost")
+MQTT_BROKER_PORT = int(os.environ.get("MQTT_BROKER_PORT", "1883"))
 MQTT_KEEP_ALIVE_INTERVAL = 60  # Seconds
 
 # GUI Configuration
@@ -13,5 +16,129 @@ GUI_LOG_FONT = ("Courier New", 10)
 TOPIC_HEART_RATE = "health/heart_rate"
 TOPIC_BLOOD_PRESSURE = "health/blood_pressure"
 TOPIC_OXYGEN_SATURATION = "health/spo2"
+# Patients publish on health/<patient_id>/<metric> (see Utils/group_7_topics.py);
+# an empty PUBLISHER_PATIENT_ID keeps the publisher GUI on the global topics above.
+# Subscribers keep the state of every patient in one table (see
+# subscribers/group_7_patient_state.py) with PATIENT_HISTORY readings per vital.
+PATIENT_ID_FORMAT = "patient-{:05d}"  # Synthetic patients, e.g. the traffic replayer's fan-out
+PUBLISHER_PATIENT_ID = os.environ.get("MQTT_PATIENT_ID", "")
+PATIENT_HISTORY = 16
+
+
+
+# Payload Configuration
+# "json" keeps the original ISO-8601 JSON messages, "binary" uses the compact
+# fixed-layout encoding from Utils/group_7_payload_codec.py. Subscribers detect
+# either format automatically.
+PAYLOAD_FORMAT = "json"
+TOPIC_PAYLOAD_FORMATS = {}  # Per-topic overrides, e.g. {TOPIC_HEART_RATE: "binary"}
+
+# Batching Configuration
+# When enabled, publishers group samples per topic into one framed message
+# (see publishers/group_7_batcher.py). Subscribers unpack batches automatically.
+BATCHING_ENABLED = False
+BATCH_MAX_COUNT = 50
+BATCH_MAX_BYTES = 32768
+BATCH_LINGER = 0.5  # Seconds the oldest sample may wait before the batch is sent
+
+# Connection Pool Configuration
+# Publishers share this many MQTT clients instead of opening one each
+MQTT_POOL_SIZE = 2
+
+# Publish QoS and In-Flight Window
+# QoS 0 is fire-and-forget; QoS 1 waits for the broker's PUBACK, which costs a
+# round trip per message but makes a lost sample visible. Each pooled connection
+# allows PUBLISH_WINDOW messages in flight (unacknowledged, or not yet written at
+# QoS 0); while it is full the simulation engine holds back the generators that
+# publish on it.
+MQTT_QOS = int(os.environ.get("MQTT_PUBLISH_QOS", "0"))
+TOPIC_QOS = {}  # Per-topic overrides, e.g. {TOPIC_BLOOD_PRESSURE: 1}
+PUBLISH_WINDOW = 100
+
+# Reconnect and Outbox Configuration
+# Pooled connections connect in the background and retry with exponential
+# backoff; a random part of each wait (the jitter) keeps many publishers from
+# reconnecting in lockstep. While disconnected, messages are spooled to
+# <OUTBOX_DIR>/<pool name>-<connection>.g7tl (see publishers/group_7_outbox.py)
+# and sent at up to OUTBOX_DRAIN_RATE messages/s once the broker is back;
+# live messages published meanwhile are not held behind them.
+RECONNECT_MIN_DELAY = 0.5  # Seconds before the first retry
+RECONNECT_MAX_DELAY = 30.0
+RECONNECT_JITTER = 0.5  # Up to this fraction of each delay is randomly taken off
+OUTBOX_DIR = os.environ.get("MQTT_OUTBOX_DIR", "outbox_data")
+OUTBOX_MAX_BYTES = 64 * 1024 * 1024  # The oldest messages are dropped beyond this
+OUTBOX_DRAIN_RATE = 500
+
+# Metrics Configuration
+# Each process serves its counters, gauges and latency histograms in the
+# Prometheus text format at http://127.0.0.1:<port>/metrics (see
+# Utils/group_7_metrics.py). Port 0 turns an endpoint off.
+METRICS_HOST = "127.0.0.1"
+PUBLISHER_METRICS_PORT = int(os.environ.get("MQTT_PUBLISHER_METRICS_PORT", "9101"))
+SUBSCRIBER_METRICS_PORT = int(os.environ.get("MQTT_SUBSCRIBER_METRICS_PORT", "9102"))
+
+# Time-Series Store Configuration
+# The subscriber GUI keeps every stored sample in memory-mapped segment files
+# (see subscribers/group_7_timeseries_store.py) and reloads them on start
+TIMESERIES_DIR = os.environ.get("MQTT_TIMESERIES_DIR", "timeseries_data")
+TIMESERIES_SEGMENT_SAMPLES = 86400  # One day per segment at one sample a second
+TIMESERIES_RETENTION_DAYS = 7
+
+# Sharded Subscriber Configuration
+# With workers > 0 the subscriber GUI decodes and analyses in that many worker
+# processes (see subscribers/group_7_sharded_subscriber.py). Mode "shared" uses
+# the MQTT shared subscription $share/<group>/..., "hash" partitions topics by hash.
+SUBSCRIBER_WORKERS = int(os.environ.get("MQTT_SUBSCRIBER_WORKERS", "0"))
+SUBSCRIBER_SHARD_MODE = os.environ.get("MQTT_SUBSCRIBER_SHARD_MODE", "shared")
+SUBSCRIBER_SHARE_GROUP = "health"
+
+# Windowed Aggregation
+# When enabled, the subscriber folds every accepted sample into per-stream windows
+# (see subscribers/group_7_window_aggregator.py) and publishes count, min, max,
+# mean, stddev and approximate percentiles of each window as it closes, on
+# <AGGREGATE_TOPIC_ROOT>/<window>/<stream>, e.g. health/agg/1m/patient-00001/heart_rate.
+# A window whose step equals its length is tumbling; a shorter step makes it
+# sliding (published every step over the last length). Every step must be a
+# multiple of the shortest one. Windows are in receive time.
+AGGREGATION_ENABLED = os.environ.get("MQTT_AGGREGATION", "0") == "1"
+AGGREGATE_TOPIC_ROOT = "health/agg"
+AGGREGATE_WINDOWS = [
+    {"name": "1s", "length": 1, "step": 1},
+    {"name": "1m", "length": 60, "step": 10},
+    {"name": "1h", "length": 3600, "step": 3600},
+]
+AGGREGATE_QUANTILES = (0.5, 0.9, 0.99)
+AGGREGATE_SKETCH_ACCURACY = 0.01  # Relative error of the percentiles
 
+# Missed-Transmission Detection
+# Seconds between transmissions per topic, matching the publishers. Topics not
+# listed here have their interval learned from the traffic.
+EXPECTED_INTERVALS = {
+    TOPIC_HEART_RATE: 2,
+    TOPIC_BLOOD_PRESSURE: 3,
+    TOPIC_OXYGEN_SATURATION: 5,
+}
+MISSED_GRACE_FRACTION = 0.5  # Extra wait before a transmission counts as missed, as a fraction of the interval
+MISSED_MIN_GRACE = 1.0  # Seconds; the extra wait is never shorter than this
 
+# Anomaly Rules
+# Compiled once by subscribers/group_7_anomaly_rules.py and evaluated over batches.
+# "field" is a reading field: heart_rate, systolic, diastolic or spo2. Kinds:
+#   threshold: flags values "below" and/or "above" the given limits
+#   rate:      flags a change of more than "max_change" per second for the same patient
+#   zscore:    flags values "threshold" standard deviations from the patient's own
+#              baseline over roughly the last "window" samples, once "min_samples" were seen
+ANOMALY_RULES = [
+    {"name": "heart_rate_low", "kind": "threshold", "field": "heart_rate", "below": 60},
+    {"name": "heart_rate_high", "kind": "threshold", "field": "heart_rate", "above": 100},
+    {"name": "systolic_high", "kind": "threshold", "field": "systolic", "above": 180},
+    {"name": "diastolic_low", "kind": "threshold", "field": "diastolic", "below": 50},
+    {"name": "spo2_low", "kind": "threshold", "field": "spo2", "below": 85},
+    {"name": "heart_rate_jump", "kind": "rate", "field": "heart_rate", "max_change": 60},
+    {"name": "heart_rate_zscore", "kind": "zscore", "field": "heart_rate", "threshold": 4.0,
+     "window": 300, "min_samples": 30},
+    {"name": "systolic_zscore", "kind": "zscore", "field": "systolic", "threshold": 4.0,
+     "window": 300, "min_samples": 30},
+    {"name": "spo2_zscore", "kind": "zscore", "field": "spo2", "threshold": 4.0,
+     "window": 300, "min_samples": 30},
+]
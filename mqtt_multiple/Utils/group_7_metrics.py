@@ -0,0 +1,370 @@
+import bisect
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds: 1 µs up to 1 s, about three per decade
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from ``function()`` at scrape time instead, e.g. a queue's length."""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager that observes the seconds spent inside it."""
+        return HistogramTimer(self)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum
+
+    def quantile(self, fraction):
+        """Estimate from the buckets: the upper bound of the bucket holding the quantile."""
+        counts, count, _ = self.snapshot()
+        if not count:
+            return None
+        rank = fraction * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+class HistogramTimer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """A named metric with optional labels; labels(...) returns the child that holds the value.
+
+    Hot paths should look their child up once and keep it.
+    """
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.default = self.labels()
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"Metric {self.name} takes labels {self.label_names}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in values), None)
+
+    def items(self):
+        with self.lock:
+            return list(self.children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, values)} {format_value(child.get())}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def new_child(self):
+        return GaugeChild()
+
+    def set(self, value):
+        self.default.set(value)
+
+    def set_function(self, function):
+        self.default.set_function(function)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.default.observe(value)
+
+    def time(self):
+        return self.default.time()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.items():
+            counts, count, total = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label_names, values, [("le", format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of one process, rendered in the Prometheus text format.
+
+    counter(), gauge() and histogram() return the existing metric when the name
+    is already registered, so modules can declare the metrics they use at import
+    time without coordinating.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name, help_text, labels=(), **options):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, help_text, labels, **options)
+            elif not isinstance(metric, metric_class) or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def get(self, name):
+        return self.metrics.get(name)
+
+    def render(self):
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def total(self, name):
+        """Sum of a counter or gauge over all of its labels (0 when it does not exist)."""
+        metric = self.metrics.get(name)
+        if metric is None:
+            return 0
+        return sum(child.get() for _, child in metric.items())
+
+    def merged_histogram(self, name, **match):
+        """One HistogramChild combining every label of a histogram, for quantiles across topics.
+
+        ``match`` keeps only the children with those label values, e.g. qos="1".
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            return None
+        wanted = [(metric.label_names.index(label), str(value)) for label, value in match.items()]
+        merged = HistogramChild(metric.buckets)
+        for values, child in metric.items():
+            if any(values[index] != value for index, value in wanted):
+                continue
+            counts, count, total = child.snapshot()
+            merged.counts = [a + b for a, b in zip(merged.counts, counts)]
+            merged.count += count
+            merged.sum += total
+        return merged
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+class MetricsServer:
+    """Serves a registry at http://<host>:<port>/metrics on a background thread."""
+
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        handler = type("Handler", (MetricsRequestHandler,), {"registry": registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+
+shared_registry = None
+shared_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide registry that the publishers, generators and subscriber report to."""
+    global shared_registry
+    with shared_registry_lock:
+        if shared_registry is None:
+            shared_registry = MetricsRegistry()
+        return shared_registry
+
+
+def latency_summary(histogram):
+    """Short "p50 ≤ 25 µs, p99 ≤ 1 ms" description of a histogram for the GUI panels."""
+    if histogram is None or not histogram.count:
+        return "no samples"
+    parts = []
+    for label, fraction in (("p50", 0.5), ("p99", 0.99)):
+        bound = histogram.quantile(fraction)
+        if bound == math.inf:
+            parts.append(f"{label} > {format_seconds(histogram.buckets[-1])}")
+        else:
+            parts.append(f"{label} ≤ {format_seconds(bound)}")
+    return ", ".join(parts)
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:g} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:g} ms"
+    return f"{seconds:g} s"
+
+
+def start_metrics_server(host, port, registry=None):
+    """Start the scrape endpoint, or return None when ``port`` is 0/None or already taken."""
+    if not port:
+        return None
+    try:
+        return MetricsServer(registry or get_registry(), host, port).start()
+    except OSError as e:
+        print(f"Metrics endpoint on {host}:{port} not started: {e}")
+        return None
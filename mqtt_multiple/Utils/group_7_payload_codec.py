@@ -0,0 +1,110 @@
+import struct
+from collections import namedtuple
+import Utils.group_7_config as config
+from Utils.group_7_topics import metric_topic
+
+# Binary payloads start with a marker byte that can never begin a JSON document,
+# followed by a format version and a metric id. The rest of the layout is fixed
+# per metric: int64 epoch nanoseconds, then the reading itself.
+BINARY_MARKER = 0xB7
+BINARY_VERSION = 1
+
+# Batches of samples share one MQTT message: marker, version, uint16 sample
+# count, then each sample as a uint32 length followed by its payload bytes.
+BATCH_MARKER = 0xB8
+BATCH_VERSION = 1
+
+METRIC_HEART_RATE = 1
+METRIC_BLOOD_PRESSURE = 2
+METRIC_SPO2 = 3
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+HeartRateReading = namedtuple("HeartRateReading", ["timestamp_ns", "heart_rate"])
+BloodPressureReading = namedtuple("BloodPressureReading", ["timestamp_ns", "systolic", "diastolic"])
+SpO2Reading = namedtuple("SpO2Reading", ["timestamp_ns", "spo2"])
+# mqtt-single sends every vital in one message
+HealthReading = namedtuple("HealthReading", ["timestamp_ns", "heart_rate", "systolic", "diastolic", "oxygen_saturation"])
+
+HEART_RATE_LAYOUT = struct.Struct("<BBBqB")
+BLOOD_PRESSURE_LAYOUT = struct.Struct("<BBBqHH")
+SPO2_LAYOUT = struct.Struct("<BBBqB")
+HEADER_LAYOUT = struct.Struct("<BBB")
+BATCH_HEADER_LAYOUT = struct.Struct("<BBH")
+BATCH_ITEM_LAYOUT = struct.Struct("<I")
+MAX_BATCH_COUNT = 0xFFFF
+
+# metric id -> (layout, record type)
+BINARY_LAYOUTS = {
+    METRIC_HEART_RATE: (HEART_RATE_LAYOUT, HeartRateReading),
+    METRIC_BLOOD_PRESSURE: (BLOOD_PRESSURE_LAYOUT, BloodPressureReading),
+    METRIC_SPO2: (SPO2_LAYOUT, SpO2Reading),
+}
+
+
+def payload_format_for(topic):
+    """Return the configured payload format for a topic (per-patient topics use their metric's), falling back to the default."""
+    return config.TOPIC_PAYLOAD_FORMATS.get(metric_topic(topic), config.PAYLOAD_FORMAT)
+
+
+def encode_heart_rate(timestamp_ns, heart_rate):
+    return HEART_RATE_LAYOUT.pack(BINARY_MARKER, BINARY_VERSION, METRIC_HEART_RATE, timestamp_ns, heart_rate)
+
+
+def encode_blood_pressure(timestamp_ns, systolic, diastolic):
+    return BLOOD_PRESSURE_LAYOUT.pack(BINARY_MARKER, BINARY_VERSION, METRIC_BLOOD_PRESSURE, timestamp_ns, systolic, diastolic)
+
+
+def encode_spo2(timestamp_ns, spo2):
+    return SPO2_LAYOUT.pack(BINARY_MARKER, BINARY_VERSION, METRIC_SPO2, timestamp_ns, spo2)
+
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] == BINARY_MARKER
+
+
+def decode_binary(payload):
+    """Decode a binary payload straight into its reading record."""
+    marker, version, metric = HEADER_LAYOUT.unpack_from(payload)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary payload version {version}")
+    if metric not in BINARY_LAYOUTS:
+        raise ValueError(f"Unknown metric id {metric} in binary payload")
+    layout, record = BINARY_LAYOUTS[metric]
+    if len(payload) != layout.size:
+        raise ValueError(f"Binary payload for metric {metric} must be {layout.size} bytes, got {len(payload)}")
+    return record._make(layout.unpack(payload)[3:])
+
+
+def encode_batch(payloads):
+    """Frame several encoded payloads (bytes) into one batch message."""
+    if len(payloads) > MAX_BATCH_COUNT:
+        raise ValueError(f"A batch holds at most {MAX_BATCH_COUNT} samples")
+    parts = [BATCH_HEADER_LAYOUT.pack(BATCH_MARKER, BATCH_VERSION, len(payloads))]
+    for payload in payloads:
+        parts.append(BATCH_ITEM_LAYOUT.pack(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def is_batch(payload):
+    return len(payload) > 0 and payload[0] == BATCH_MARKER
+
+
+def split_batch(payload):
+    """Return the individual sample payloads of a batch as zero-copy memoryviews."""
+    marker, version, count = BATCH_HEADER_LAYOUT.unpack_from(payload)
+    if version != BATCH_VERSION:
+        raise ValueError(f"Unsupported batch version {version}")
+    view = memoryview(payload)
+    offset = BATCH_HEADER_LAYOUT.size
+    samples = []
+    for _ in range(count):
+        (length,) = BATCH_ITEM_LAYOUT.unpack_from(payload, offset)
+        offset += BATCH_ITEM_LAYOUT.size
+        if offset + length > len(payload):
+            raise ValueError("Truncated batch payload")
+        samples.append(view[offset:offset + length])
+        offset += length
+    return samples
@@ -0,0 +1,222 @@
+import json
+import struct
+from datetime import datetime
+import Utils.group_7_config as config
+from Utils.group_7_topic_dispatch import TopicTrie
+from Utils.group_7_topics import metric_topic, patient_topic
+from Utils.group_7_payload_codec import (BloodPressureReading, HealthReading, HeartRateReading, SpO2Reading,
+                                         decode_binary, is_binary)
+
+MAX_PAYLOAD_BYTES = 4096  # Larger messages are rejected before parsing
+
+
+class SchemaError(ValueError):
+    """A payload that does not match the schema registered for its topic."""
+
+
+# Field kinds: each converter checks one JSON value and appends its record fields to ``values``
+
+def int_field(schema, key, value, values):
+    if type(value) is not int:
+        raise SchemaError(f"{schema} field '{key}' must be an integer, got {type(value).__name__}")
+    values.append(value)
+
+
+def number_field(schema, key, value, values):
+    if type(value) is not int and type(value) is not float:
+        raise SchemaError(f"{schema} field '{key}' must be a number, got {type(value).__name__}")
+    values.append(value)
+
+
+def pair_field(schema, key, value, values):
+    """[first, second] list of integers, e.g. blood pressure as [systolic, diastolic]."""
+    if type(value) is not list or len(value) != 2 or type(value[0]) is not int or type(value[1]) is not int:
+        raise SchemaError(f"{schema} field '{key}' must be a list of two integers, got {value!r}")
+    values.extend(value)
+
+
+def ratio_field(schema, key, value, values):
+    """"first/second" string of integers, e.g. blood pressure as "120/80"."""
+    if type(value) is not str:
+        raise SchemaError(f"{schema} field '{key}' must be a 'number/number' string, got {type(value).__name__}")
+    first, slash, second = value.partition('/')
+    if not slash or not first.isdigit() or not second.isdigit():
+        raise SchemaError(f"{schema} field '{key}' must be a 'number/number' string, got {value!r}")
+    values.append(int(first))
+    values.append(int(second))
+
+
+FIELD_KINDS = {
+    "int": (int_field, 1),
+    "number": (number_field, 1),
+    "pair": (pair_field, 2),
+    "ratio": (ratio_field, 2),
+}
+
+
+def timestamp_ns(schema, value):
+    """ISO-8601 string or epoch seconds, as epoch nanoseconds."""
+    if type(value) is str:
+        try:
+            return int(datetime.fromisoformat(value).timestamp() * 1_000_000_000)
+        except ValueError:
+            raise SchemaError(f"{schema} timestamp is not ISO-8601: {value!r}") from None
+    if type(value) is int or type(value) is float:
+        return int(value * 1_000_000_000)
+    raise SchemaError(f"{schema} timestamp must be a string or a number, got {type(value).__name__}")
+
+
+class PayloadSchema:
+    """Typed definition of one JSON payload shape and the decoder compiled from it.
+
+    ``fields`` lists (JSON key, kind) pairs in record order after the timestamp;
+    kinds are the keys of FIELD_KINDS. The decoder is built once: it checks the
+    keys and types in a fixed sequence and fills the ``record`` namedtuple
+    directly, raising SchemaError with the offending field on the first problem.
+    Readings below ``minimum`` are rejected too. A binary payload (see
+    Utils/group_7_payload_codec.py) is accepted when it decodes to ``record``.
+    """
+
+    def __init__(self, name, record, fields, timestamp="timestamp", minimum=0):
+        self.name = name
+        self.record = record
+        self.fields = list(fields)
+        self.timestamp = timestamp
+        self.minimum = minimum
+        width = 1 + sum(FIELD_KINDS[kind][1] for _, kind in self.fields)
+        if width != len(record._fields):
+            raise ValueError(f"Schema {name} yields {width} values but {record.__name__} has {len(record._fields)}")
+        self.decode_json = self.compile()
+
+    def __repr__(self):
+        return f"PayloadSchema({self.name})"
+
+    def compile(self):
+        name, make, minimum, timestamp_key = self.name, self.record._make, self.minimum, self.timestamp
+        steps = [(key, FIELD_KINDS[kind][0]) for key, kind in self.fields]
+
+        def decode(data):
+            if type(data) is not dict:
+                raise SchemaError(f"{name} payload must be a JSON object, got {type(data).__name__}")
+            try:
+                values = [timestamp_ns(name, data[timestamp_key])]
+                for key, convert in steps:
+                    convert(name, key, data[key], values)
+            except KeyError as e:
+                raise SchemaError(f"{name} payload is missing field {e}") from None
+            if min(values[1:]) < minimum:
+                raise SchemaError(f"Negative reading in {name} payload: {values[1:]}")
+            return make(values)
+        return decode
+
+    def decode(self, payload):
+        """Decode raw bytes (JSON or binary) into a ``record``."""
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            raise SchemaError(f"{self.name} payload is {len(payload)} bytes, more than {MAX_PAYLOAD_BYTES}")
+        if is_binary(payload):
+            try:
+                reading = decode_binary(payload)
+            except (ValueError, struct.error) as e:
+                raise SchemaError(f"Error decoding binary {self.name} payload: {e}") from None
+            if type(reading) is not self.record:
+                raise SchemaError(f"Payload does not match {self.name} schema: got {type(reading).__name__}")
+            if min(reading[1:]) < self.minimum:
+                raise SchemaError(f"Negative reading in {self.name} payload: {reading}")
+            return reading
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()  # json.loads does not accept memoryviews
+        # Anything that is not a JSON object is rejected without parsing it
+        if not payload.lstrip()[:1] == b'{':
+            raise SchemaError(f"{self.name} payload is neither binary nor a JSON object")
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise SchemaError(f"Error decoding JSON: {e}") from None
+        return self.decode_json(data)
+
+
+# Payload shapes of the multiple publishers (one vital per topic)
+HEART_RATE_SCHEMA = PayloadSchema("heart_rate", HeartRateReading, [("heart_rate", "int")])
+BLOOD_PRESSURE_SCHEMA = PayloadSchema("blood_pressure", BloodPressureReading, [("blood_pressure", "pair")])
+SPO2_SCHEMA = PayloadSchema("spo2", SpO2Reading, [("spO2", "int")])
+# Payload shape of mqtt-single (every vital in one message, blood pressure as "120/80")
+HEALTH_SCHEMA = PayloadSchema("health", HealthReading, [
+    ("heart_rate", "int"), ("blood_pressure", "ratio"), ("oxygen_saturation", "int")])
+
+
+class SchemaRegistry:
+    """Maps topic filters (MQTT wildcards allowed) to payload schemas.
+
+    The first registered filter matching a topic wins. Filters are kept in a
+    topic trie (Utils/group_7_topic_dispatch.py) and the answer is cached per
+    topic, so matching runs once per topic, not once per message, and does not
+    slow down as filters are added. decode() counts accepted and rejected
+    messages per topic; per-patient topics are counted under their metric
+    topic, so the counts stay small with many patients. Topics without a
+    schema are rejected.
+    """
+
+    def __init__(self, schemas=()):
+        self.patterns = TopicTrie()  # topic filter -> schema
+        self.resolved = {}  # topic -> schema, or None when nothing matches
+        self.accepted = {}  # topic -> decoded messages
+        self.rejections = {}  # topic -> rejected messages
+        self.last_errors = {}  # topic -> latest rejection message
+        for pattern, schema in schemas:
+            self.register(pattern, schema)
+
+    def register(self, pattern, schema):
+        self.patterns.insert(pattern, schema)
+        self.resolved = {}
+
+    def unregister(self, pattern):
+        self.patterns.remove(pattern)
+        self.resolved = {}
+
+    def schema_for(self, topic):
+        try:
+            return self.resolved[topic]
+        except KeyError:
+            pass
+        matches = self.patterns.match(topic)
+        schema = matches[0] if matches else None
+        self.resolved[topic] = schema
+        return schema
+
+    def decode(self, topic, payload):
+        """Decode one sample payload for ``topic`` into its record; raises SchemaError."""
+        schema = self.schema_for(topic)
+        try:
+            if schema is None:
+                raise SchemaError(f"No payload schema registered for topic {topic}")
+            reading = schema.decode(payload)
+        except SchemaError as e:
+            self.reject(topic, str(e))
+            raise
+        key = metric_topic(topic)
+        self.accepted[key] = self.accepted.get(key, 0) + 1
+        return reading
+
+    def reject(self, topic, message):
+        """Count a rejected message, also for failures found outside decode() (e.g. a broken batch)."""
+        key = metric_topic(topic)
+        self.rejections[key] = self.rejections.get(key, 0) + 1
+        self.last_errors[key] = message
+
+    def stats(self):
+        """Per-topic accepted and rejected counts, plus the latest rejection reason."""
+        # Copies first: decode() may add topics on another thread meanwhile
+        accepted, rejections, last_errors = dict(self.accepted), dict(self.rejections), dict(self.last_errors)
+        return {topic: {"accepted": accepted.get(topic, 0), "rejected": rejections.get(topic, 0),
+                        "last_error": last_errors.get(topic)}
+                for topic in sorted(set(accepted) | set(rejections))}
+
+
+def default_registry():
+    """Registry for the topics of the multiple publishers, as configured, and their per-patient forms."""
+    schemas = [
+        (config.TOPIC_HEART_RATE, HEART_RATE_SCHEMA),
+        (config.TOPIC_BLOOD_PRESSURE, BLOOD_PRESSURE_SCHEMA),
+        (config.TOPIC_OXYGEN_SATURATION, SPO2_SCHEMA),
+    ]
+    return SchemaRegistry(schemas + [(patient_topic(topic, '+'), schema) for topic, schema in schemas])
@@ -0,0 +1,154 @@
+import threading
+
+# Cached resolutions per dispatcher; the cache starts over when it grows past this
+RESOLVED_CACHE_LIMIT = 200000
+
+
+def strip_share(topic_filter):
+    """The plain filter of a shared subscription ($share/<group>/<filter>)."""
+    if topic_filter.startswith("$share/"):
+        return topic_filter.split("/", 2)[2]
+    return topic_filter
+
+
+class TopicNode:
+    """One topic level: its children by level name and the entries whose filter ends here."""
+
+    def __init__(self):
+        self.children = {}  # level -> TopicNode; "+" and "#" are ordinary keys
+        self.entries = []  # (registration order, value)
+
+
+class TopicTrie:
+    """Topic filters (MQTT wildcards allowed) split into a tree by level.
+
+    match() walks the levels of a topic once, following the exact, "+" and "#"
+    branches, so its cost depends on the depth of the topic and the wildcards
+    on its path, not on how many filters are stored. Values come back in the
+    order they were inserted. As in MQTT, wildcards at the first level do not
+    match topics that start with "$".
+    """
+
+    def __init__(self):
+        self.root = TopicNode()
+        self.inserted = 0
+        self.size = 0
+
+    def insert(self, topic_filter, value):
+        node = self.root
+        for level in strip_share(topic_filter).split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = TopicNode()
+            node = child
+        node.entries.append((self.inserted, value))
+        self.inserted += 1
+        self.size += 1
+
+    def remove(self, topic_filter, value=None):
+        """Remove ``value`` (every value when None) stored under ``topic_filter``; returns how many."""
+        path = [self.root]
+        levels = strip_share(topic_filter).split("/")
+        for level in levels:
+            child = path[-1].children.get(level)
+            if child is None:
+                return 0
+            path.append(child)
+        node = path[-1]
+        kept = [entry for entry in node.entries if value is not None and entry[1] != value]
+        removed = len(node.entries) - len(kept)
+        node.entries = kept
+        self.size -= removed
+        # Prune the branches nothing is stored under any more
+        for level, parent, child in zip(reversed(levels), reversed(path[:-1]), reversed(path[1:])):
+            if child.entries or child.children:
+                break
+            del parent.children[level]
+        return removed
+
+    def match(self, topic):
+        """Every value whose filter matches the concrete ``topic``, in insertion order."""
+        levels = topic.split("/")
+        found = []
+        nodes = [self.root]
+        for depth, level in enumerate(levels):
+            wildcards = depth > 0 or not level.startswith("$")
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if wildcards:
+                    rest = children.get("#")
+                    if rest is not None:
+                        found.extend(rest.entries)
+                    single = children.get("+")
+                    if single is not None:
+                        next_nodes.append(single)
+                exact = children.get(level)
+                if exact is not None:
+                    next_nodes.append(exact)
+            if not next_nodes:
+                break
+            nodes = next_nodes
+        else:
+            for node in nodes:
+                found.extend(node.entries)
+                # "a/#" also matches "a" itself
+                rest = node.children.get("#")
+                if rest is not None:
+                    found.extend(rest.entries)
+        found.sort(key=lambda entry: entry[0])
+        return [value for _, value in found]
+
+    def __len__(self):
+        return self.size
+
+
+class TopicDispatcher:
+    """Routes concrete topics to the handlers registered for matching topic filters.
+
+    Filters live in a TopicTrie; the handlers resolved for each concrete topic
+    are cached, so after the first message on a topic dispatch() costs one dict
+    lookup however many filters and topics there are. register() and
+    unregister() may run while another thread dispatches: they rebuild the
+    cache instead of editing it.
+    """
+
+    def __init__(self):
+        self.trie = TopicTrie()
+        self.resolved = {}  # topic -> tuple of handlers
+        self.lock = threading.Lock()
+
+    def register(self, topic_filter, handler):
+        with self.lock:
+            self.trie.insert(topic_filter, handler)
+            self.resolved = {}
+
+    def unregister(self, topic_filter, handler=None):
+        """Drop ``handler`` (every handler when None) from ``topic_filter``; returns how many were removed."""
+        with self.lock:
+            removed = self.trie.remove(topic_filter, handler)
+            self.resolved = {}
+            return removed
+
+    def handlers_for(self, topic):
+        handlers = self.resolved.get(topic)
+        if handlers is None:
+            with self.lock:
+                handlers = tuple(self.trie.match(topic))
+                if len(self.resolved) >= RESOLVED_CACHE_LIMIT:
+                    self.resolved = {}
+                self.resolved[topic] = handlers
+        return handlers
+
+    def matches(self, topic):
+        return len(self.handlers_for(topic)) > 0
+
+    def dispatch(self, topic, *args):
+        """Call every handler registered for ``topic`` with ``*args``; returns how many ran."""
+        handlers = self.handlers_for(topic)
+        for handler in handlers:
+            handler(*args)
+        return len(handlers)
+
+    def __len__(self):
+        return len(self.trie)
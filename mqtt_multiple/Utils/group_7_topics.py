@@ -0,0 +1,44 @@
+import Utils.group_7_config as config
+
+# Per-patient streams insert the patient id after the root level:
+# health/heart_rate -> health/<patient_id>/heart_rate
+# Only these metric topics have per-patient forms; other three-level topics are left alone
+METRIC_TOPICS = frozenset((config.TOPIC_HEART_RATE, config.TOPIC_BLOOD_PRESSURE, config.TOPIC_OXYGEN_SATURATION))
+
+
+def patient_topic(topic, patient_id):
+    """The per-patient form of a metric topic; a topic that already is per-patient is returned as it is."""
+    if split_patient_topic(topic)[0] is not None:
+        return topic
+    root, _, metric = topic.partition('/')
+    return f"{root}/{patient_id}/{metric}"
+
+
+def patient_id_for(index):
+    return config.PATIENT_ID_FORMAT.format(index)
+
+
+def split_patient_topic(topic):
+    """(patient id, metric topic) of a topic; the patient id is None for the global topics and any
+    topic that is not <root>/<patient_id>/<metric> for one of METRIC_TOPICS."""
+    levels = topic.split('/')
+    if len(levels) == 3:
+        metric = f"{levels[0]}/{levels[2]}"
+        if metric in METRIC_TOPICS:
+            return levels[1], metric
+    return None, topic
+
+
+def metric_topic(topic):
+    """The metric topic a per-patient topic belongs to (global topics are returned as they are)."""
+    return split_patient_topic(topic)[1]
+
+
+def patient_filter(topic):
+    """Wildcard filter matching a metric topic for every patient."""
+    return patient_topic(topic, '+')
+
+
+def qos_for(topic):
+    """The configured publish QoS for a topic (per-patient topics use their metric's), falling back to the default."""
+    return config.TOPIC_QOS.get(metric_topic(topic), config.MQTT_QOS)
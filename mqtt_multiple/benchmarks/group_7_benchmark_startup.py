@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run from anywhere: the modules below import each other relative to mqtt_multiple/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# GUI scripts, loaded the way group_7_Main_GUI.py loads them
+GUI_SCRIPTS = {
+    "multiple_publisher_GUI": "mqtt_multiple/group_7_publisher_GUI.py",
+    "multiple_subscriber_GUI": "mqtt_multiple/group_7_subscriber_GUI.py",
+    "single_publisher_GUI": "mqtt-single/group_7_publisher_GUI.py",
+    "single_subscriber_GUI": "mqtt-single/group_7_subscriber_GUI.py",
+}
+# Launcher mode -> the (publisher, subscriber) scripts it opens
+MODES = {
+    "multiple": ("multiple_publisher_GUI", "multiple_subscriber_GUI"),
+    "single": ("single_publisher_GUI", "single_subscriber_GUI"),
+}
+# Modules that must not be imported before a window is on screen
+DEFERRED_MODULES = ("matplotlib",)
+WINDOW_TIMEOUT = 30.0
+
+
+def open_window(launcher, name, root):
+    """Create one GUI the way its own __main__ block does; returns the app."""
+    module = launcher.load_gui(name, GUI_SCRIPTS[name])
+    if name == "multiple_publisher_GUI":
+        return module.App(root)
+    if name == "multiple_subscriber_GUI":
+        return module.HealthSubscriber(root)
+    if name == "single_publisher_GUI":
+        return module.Publisher(root, 'localhost', 1883, 'health')
+    return module.Subscriber(root, 'localhost', 1883, 'health')
+
+
+def chart_ready(app):
+    # Both subscriber windows build their chart in setup_chart(), after the window is up
+    return not hasattr(app, "setup_chart") or getattr(app, "canvas", None) is not None
+
+
+def wait_for(root, condition):
+    deadline = time.monotonic() + WINDOW_TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("window did not appear in time")
+        root.update()
+        time.sleep(0.001)
+    return time.time()
+
+
+def child(scenario):
+    """Runs in a fresh interpreter: "import:<gui>", "window:<gui>" or "launcher:<mode>"."""
+    import tkinter as tk
+    sys.path.insert(0, ROOT_DIR)
+    import group_7_Main_GUI as launcher
+
+    kind, name = scenario.split(":")
+    names = MODES[name] if kind == "launcher" else (name,)
+    started = time.perf_counter()
+    for gui in names:
+        launcher.load_gui(gui, GUI_SCRIPTS[gui])
+    result = {"import_ms": (time.perf_counter() - started) * 1000,
+              "deferred_modules_loaded": [module for module in DEFERRED_MODULES if module in sys.modules]}
+    root = None
+    if kind != "import":
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            result["error"] = f"no display: {e}"
+    if root is not None:
+        if kind == "launcher":
+            host = launcher.host_automatic_publishing if name == "multiple" else launcher.host_manual_publishing
+            apps = host(root)
+        else:
+            apps = [open_window(launcher, name, root)]
+        result["first_window_at"] = wait_for(root, lambda: all(app.master.winfo_ismapped() for app in apps))
+        result["chart_ready_at"] = wait_for(root, lambda: all(chart_ready(app) for app in apps))
+        for app in apps:
+            app.on_closing()
+        if root.winfo_exists():
+            root.destroy()
+    result["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def spawn(scenario, env):
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario]
+    return time.time(), subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def collect(spawned_at, process):
+    output, _ = process.communicate(timeout=WINDOW_TIMEOUT * 2)
+    if process.returncode != 0:
+        raise RuntimeError(f"startup child exited with {process.returncode}")
+    result = json.loads(output.strip().splitlines()[-1])
+    for event in ("first_window", "chart_ready"):
+        if f"{event}_at" in result:
+            result[f"{event}_ms"] = (result.pop(f"{event}_at") - spawned_at) * 1000
+    return result
+
+
+def median_of(results, key):
+    values = [result[key] for result in results if result.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+def measure_mode(mode, repeat, env):
+    """Both windows of a mode, hosted in one process versus one process each (launched together)."""
+    one_process, separate = [], []
+    for _ in range(repeat):
+        one_process.append(collect(*spawn(f"launcher:{mode}", env)))
+        children = [spawn(f"window:{name}", env) for name in MODES[mode]]
+        results = [collect(*child_process) for child_process in children]
+        error = next((result["error"] for result in results if "error" in result), None)
+        separate.append({
+            "first_window_ms": None if error else max(result["first_window_ms"] for result in results),
+            "chart_ready_ms": None if error else max(result["chart_ready_ms"] for result in results),
+            "max_rss_bytes": sum(result["max_rss_bytes"] for result in results),
+            "error": error,
+        })
+    report = {}
+    for label, results in (("one_process", one_process), ("separate_processes", separate)):
+        report[label] = {key: median_of(results, key) for key in ("first_window_ms", "chart_ready_ms", "max_rss_bytes")}
+        if results[0].get("error"):
+            report[label]["error"] = results[0]["error"]
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GUI import time and time-to-first-window benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per measurement (the median is reported)")
+    parser.add_argument("--modes", default="multiple,single", help="Comma-separated launcher modes to open windows for")
+    parser.add_argument("--max-import-ms", type=float, default=0,
+                        help="Fail when a GUI script takes longer than this to import (0: no limit)")
+    parser.add_argument("--max-first-window-ms", type=float, default=0,
+                        help="Fail when a mode's windows take longer than this to appear in one process (0: no limit)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(child(args.child)))
+        return
+
+    from broker.group_7_embedded_broker import EmbeddedBroker
+
+    # Windows connect on start, so give them a broker of their own and keep their files and ports out of the way
+    broker = EmbeddedBroker(port=0).start()
+    scratch = tempfile.mkdtemp(prefix="group_7_startup_")
+    env = dict(os.environ, MQTT_BROKER_URL="127.0.0.1", MQTT_BROKER_PORT=str(broker.port),
+               MQTT_PUBLISHER_METRICS_PORT="0", MQTT_SUBSCRIBER_METRICS_PORT="0",
+               MQTT_TIMESERIES_DIR=os.path.join(scratch, "timeseries"), MQTT_OUTBOX_DIR=os.path.join(scratch, "outbox"))
+    regressions = []
+    try:
+        imports = {}
+        for name in GUI_SCRIPTS:
+            results = [collect(*spawn(f"import:{name}", env)) for _ in range(args.repeat)]
+            imports[name] = {"import_ms": median_of(results, "import_ms"),
+                             "deferred_modules_loaded": results[0]["deferred_modules_loaded"]}
+            print(f"{name:>24}: import {imports[name]['import_ms']:.0f} ms", file=sys.stderr)
+            if imports[name]["deferred_modules_loaded"]:
+                regressions.append(f"{name} imports {', '.join(imports[name]['deferred_modules_loaded'])} at load")
+            if args.max_import_ms and imports[name]["import_ms"] > args.max_import_ms:
+                regressions.append(f"{name} imports in {imports[name]['import_ms']:.0f} ms")
+
+        modes = {}
+        for mode in args.modes.split(","):
+            modes[mode] = measure_mode(mode, args.repeat, env)
+            one_process = modes[mode]["one_process"]
+            if one_process.get("error"):
+                print(f"{mode:>24}: windows not measured ({one_process['error']})", file=sys.stderr)
+                continue
+            print(f"{mode:>24}: first window {one_process['first_window_ms']:.0f} ms in one process, "
+                  f"{modes[mode]['separate_processes']['first_window_ms']:.0f} ms in separate processes", file=sys.stderr)
+            if args.max_first_window_ms and one_process["first_window_ms"] > args.max_first_window_ms:
+                regressions.append(f"{mode} windows appear after {one_process['first_window_ms']:.0f} ms")
+    finally:
+        broker.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "benchmark": "startup",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "child")},
+        "imports": imports,
+        "modes": modes,
+        "regressions": regressions,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    if regressions:
+        print("Startup regressions: " + "; ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
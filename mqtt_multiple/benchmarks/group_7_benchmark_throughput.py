@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+# Run from anywhere: the modules below import each other relative to mqtt_multiple/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Utils.group_7_config as config
+from Utils.group_7_topics import patient_id_for
+from benchmarks.group_7_loopback_broker import LoopbackBroker
+from broker.group_7_embedded_broker import EmbeddedBroker
+from publishers.group_7_connection_pool import MqttConnectionPool
+from publishers.group_7_publisher_heartrate import HeartRatePublisher
+from publishers.group_7_publisher_bloodpressure import BloodPressurePublisher
+from publishers.group_7_publisher_sp02 import SpO2Publisher
+from subscribers.group_7_sharded_subscriber import SHARD_MODES, ShardedSubscriber
+from subscribers.group_7_subscriber_engine import SubscriberEngine
+from subscribers.group_7_window_aggregator import WindowAggregator
+
+PUBLISHER_CLASSES = [
+    (HeartRatePublisher, config.TOPIC_HEART_RATE),
+    (BloodPressurePublisher, config.TOPIC_BLOOD_PRESSURE),
+    (SpO2Publisher, config.TOPIC_OXYGEN_SATURATION),
+]
+
+
+class NullLogger:
+    """Publishers log every message; keep that out of the measurement."""
+
+    def log(self, message, label=None, tag='info'):
+        pass
+
+
+class LatencySink:
+    """Subscriber sink that records publish-to-receive latency in nanoseconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def record(self, reading):
+        latency = time.time_ns() - reading.timestamp_ns
+        with self.lock:
+            self.latencies.append(latency)
+
+    def on_sample(self, topic, reading, received_at):
+        self.record(reading)
+
+    def on_anomaly(self, topic, reading, received_at):
+        self.record(reading)
+
+    def on_error(self, topic, message):
+        self.errors += 1
+
+    def reset(self):
+        with self.lock:
+            self.latencies = []
+            self.errors = 0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def current_rss_bytes():
+    """Resident set size right now (Linux), falling back to the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def make_broker(kind):
+    """Return (client_factory, host, port, broker stats callable, cleanup) for the requested broker."""
+    if kind == "loopback":
+        broker = LoopbackBroker()
+        stats = lambda: {"messages_in": broker.messages_in, "messages_out": broker.messages_out}
+        return broker.client_factory, None, None, stats, lambda: None
+    if kind == "embedded":
+        from paho.mqtt import client as mqtt_client
+        broker = EmbeddedBroker(port=0).start()
+        return mqtt_client.Client, "127.0.0.1", broker.port, broker.stats, broker.stop
+    if kind == "external":
+        from paho.mqtt import client as mqtt_client
+        return mqtt_client.Client, config.MQTT_BROKER_URL, config.MQTT_BROKER_PORT, lambda: None, lambda: None
+    raise ValueError(f"Unknown broker '{kind}'")
+
+
+def start_sharded_subscriber(args, sink, host, port):
+    """Worker processes plus a thread that merges their reports; returns (subscriber, stop poller)."""
+    subscriber = ShardedSubscriber([sink], workers=args.subscriber_workers, mode=args.shard_mode,
+                                   host=host, port=port, report_interval=0.1)
+    subscriber.subscribe("health/#")
+    subscriber.start()
+    if not subscriber.wait_until_ready():
+        raise RuntimeError("Subscriber workers did not report in time")
+    stop = threading.Event()
+
+    def poll():
+        while not stop.wait(0.05):
+            subscriber.poll()
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+
+    def stop_poller():
+        stop.set()
+        poller.join()
+    return subscriber, stop_poller
+
+
+def run_step(args, devices, rate):
+    """Run one (device count, per-device rate) step and return its measurements."""
+    client_factory, host, port, broker_stats, cleanup = make_broker(args.broker)
+    sink = LatencySink()
+    aggregator = None
+    if args.aggregate:
+        # Aggregates are counted, not published, so they do not add to the measured traffic
+        aggregator = WindowAggregator(lambda topic, payload: None)
+        aggregator.start()
+    stop_poller = lambda: None
+    if args.subscriber_workers:
+        subscriber, stop_poller = start_sharded_subscriber(args, sink, host, port)
+    else:
+        subscriber = SubscriberEngine([sink] + ([aggregator] if aggregator is not None else []),
+                                      host=host, port=port, client_factory=client_factory)
+        subscriber.subscribe("health/#")
+        subscriber.connect()
+        subscriber.start()
+
+    # No outbox: a benchmark should count what the broker refuses, not spool it
+    pool = MqttConnectionPool(args.pool_size, host=host, port=port, client_factory=client_factory, outbox_dir="")
+    publishers = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(devices):
+            publisher_class, topic = PUBLISHER_CLASSES[index % len(PUBLISHER_CLASSES)]
+            # Every three devices (one per vital) make up one patient on health/<patient_id>/<metric>
+            patient_id = patient_id_for(index // len(PUBLISHER_CLASSES)) if args.patients else None
+            publisher = publisher_class(None, NullLogger(), topic, pool, patient_id)
+            publisher.publish_interval = 1.0 / rate
+            publisher.data_generator.publish_interval = 1.0 / rate
+            publisher.data_generator.payload_format = args.format
+            if args.batch:
+                publisher.enable_batching(linger=args.batch_linger)
+            publishers.append(publisher)
+    pool.wait_until_connected()
+
+    for publisher in publishers:
+        publisher.start()
+    time.sleep(args.warmup)
+    sink.reset()
+    received_before = subscriber.stats["received"]
+    aggregates_before = aggregator.stats["published"] if aggregator is not None else 0
+    published_before = sum(c["published"] for c in pool.stats())
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+
+    time.sleep(args.duration)
+
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    published = sum(c["published"] for c in pool.stats()) - published_before
+    received = subscriber.stats["received"] - received_before
+    aggregates = aggregator.stats["published"] - aggregates_before if aggregator is not None else 0
+    rss = current_rss_bytes()
+    broker = broker_stats()
+    with sink.lock:
+        latencies = sorted(sink.latencies)
+
+    for publisher in publishers:
+        publisher.close()
+    pool.close()
+    stop_poller()
+    subscriber.close()
+    cleanup()
+
+    to_ms = lambda ns: None if ns is None else ns / 1e6
+    return {
+        "devices": devices,
+        "rate_per_device": rate,
+        "offered_msgs_per_s": devices * rate,
+        "published": published,
+        "received": received,
+        "publish_msgs_per_s": published / wall,
+        "receive_msgs_per_s": received / wall,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 0.50)),
+            "p95": to_ms(percentile(latencies, 0.95)),
+            "p99": to_ms(percentile(latencies, 0.99)),
+            "max": to_ms(latencies[-1] if latencies else None),
+        },
+        "cpu_percent": 100.0 * cpu / wall,
+        "rss_bytes": rss,
+        "errors": sink.errors,
+        "aggregates_published": aggregates if aggregator is not None else None,
+        "aggregate_msgs_per_s": aggregates / wall if aggregator is not None else None,
+        "patients": len(subscriber.patients),
+        "patient_state_bytes": subscriber.patients.nbytes(),
+        "broker": broker,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Publisher -> broker -> subscriber throughput and latency benchmark.")
+    parser.add_argument("--broker", default="loopback", choices=["loopback", "embedded", "external"],
+                        help="loopback: in-process stand-in without sockets; embedded: broker/group_7_embedded_broker.py "
+                             "on a free local port; external: the broker in Utils/group_7_config.py")
+    parser.add_argument("--devices", default="10,100,1000", help="Comma-separated device counts to step through")
+    parser.add_argument("--rates", default="1,10", help="Comma-separated messages per second per device")
+    parser.add_argument("--duration", type=float, default=5.0, help="Measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before each step")
+    parser.add_argument("--format", default="binary", choices=["json", "binary"], help="Payload format")
+    parser.add_argument("--qos", type=int, default=config.MQTT_QOS, choices=[0, 1, 2],
+                        help="Publish QoS for every topic")
+    parser.add_argument("--pool-size", type=int, default=config.MQTT_POOL_SIZE, help="Publisher connection pool size")
+    parser.add_argument("--patients", action="store_true",
+                        help="Publish on per-patient topics, one patient per three devices, instead of the three "
+                             "global topics")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="Run the windowed aggregation stage in the subscriber and count the aggregates it would "
+                             "publish (in-process subscriber only)")
+    parser.add_argument("--batch", action="store_true", help="Enable publisher-side batching")
+    parser.add_argument("--batch-linger", type=float, default=0.05, help="Batch linger time in seconds")
+    parser.add_argument("--subscriber-workers", type=int, default=0,
+                        help="Run the subscriber sharded over this many worker processes (embedded or external "
+                             "broker only). Received counts then lag by up to one worker report (0.1 s), latency "
+                             "covers only the samples the coordinator forwards, and CPU is the coordinator's.")
+    parser.add_argument("--shard-mode", default="shared", choices=SHARD_MODES,
+                        help="How sharded workers split the messages")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.subscriber_workers and args.broker == "loopback":
+        parser.error("--subscriber-workers needs --broker embedded or external: workers connect over the network")
+    if args.subscriber_workers and args.aggregate:
+        parser.error("--aggregate needs the in-process subscriber: sharded workers only report the latest samples")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config.MQTT_QOS = args.qos  # Publishers look their QoS up when they are created
+    steps = []
+    for devices in [int(value) for value in args.devices.split(",")]:
+        for rate in [float(value) for value in args.rates.split(",")]:
+            result = run_step(args, devices, rate)
+            steps.append(result)
+            print(f"{devices:>7} devices x {rate:g}/s: {result['receive_msgs_per_s']:.0f} msgs/s received, "
+                  f"p99 {result['latency_ms']['p99']} ms, CPU {result['cpu_percent']:.0f}%", file=sys.stderr)
+
+    report = {
+        "benchmark": "throughput",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "steps": steps,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import queue
+import threading
+from paho.mqtt.client import MQTT_ERR_NO_CONN, topic_matches_sub
+
+
+class LoopbackMessage:
+    """Minimal stand-in for paho's MQTTMessage."""
+
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+
+
+class LoopbackPublishInfo:
+    """Minimal stand-in for paho's MQTTMessageInfo."""
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+
+    def __getitem__(self, index):
+        return (self.rc, self.mid)[index]
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+
+class LoopbackBroker:
+    """In-process broker stand-in that routes messages between LoopbackClients.
+
+    No sockets are involved: publish() hands the message to every matching
+    subscriber's inbox and each client delivers from its own thread, the way
+    paho's network thread would. It exists so benchmarks can drive the real
+    publisher and subscriber classes on one machine without Mosquitto.
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.lock = threading.Lock()
+        self.messages_in = 0
+        self.messages_out = 0
+
+    def client_factory(self, *args, **kwargs):
+        """Drop-in replacement for ``mqtt.Client`` bound to this broker."""
+        client = LoopbackClient(self)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def route(self, topic, payload, qos):
+        with self.lock:
+            self.messages_in += 1
+            targets = [client for client in self.clients if client.matches(topic)]
+            self.messages_out += len(targets)
+        message = LoopbackMessage(topic, payload, qos)
+        for client in targets:
+            client.inbox.put(message)
+
+
+class LoopbackClient:
+    """Subset of the paho client API used by the publishers and the subscriber engine."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.subscriptions = set()
+        self.inbox = queue.Queue()
+        self.thread = None
+        self.running = False
+        self.next_mid = 0
+        self.connected = False
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.on_publish = None
+
+    def matches(self, topic):
+        return any(topic_matches_sub(sub, topic) for sub in self.subscriptions)
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.connected = True
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        return 0
+
+    def connect_async(self, host=None, port=None, keepalive=60):
+        return self.connect(host, port, keepalive)
+
+    def reconnect(self):
+        return self.connect()
+
+    def disconnect(self):
+        self.connected = False
+        self.running = False
+        self.inbox.put(None)
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+        return 0
+
+    def max_inflight_messages_set(self, inflight):
+        pass  # Every publish is acknowledged before publish() returns
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.add(topic)
+        return (0, 0)
+
+    def unsubscribe(self, topic):
+        self.subscriptions.discard(topic)
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.next_mid += 1
+        self.broker.route(topic, payload, qos)
+        if self.on_publish is not None:
+            self.on_publish(self, None, self.next_mid)
+        return LoopbackPublishInfo(self.next_mid)
+
+    def deliver(self):
+        while self.running:
+            message = self.inbox.get()
+            if message is None:
+                break
+            if self.on_message is not None:
+                self.on_message(self, None, message)
+
+    def loop(self, timeout=1.0):
+        """One round of the network loop: deliver what arrives within ``timeout``."""
+        if not self.connected:
+            return MQTT_ERR_NO_CONN
+        try:
+            message = self.inbox.get(timeout=timeout)
+        except queue.Empty:
+            return 0
+        if message is not None and self.on_message is not None:
+            self.on_message(self, None, message)
+        return 0
+
+    def loop_start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.deliver, daemon=True)
+            self.thread.start()
+        return 0
+
+    def loop_stop(self):
+        self.running = False
+        self.inbox.put(None)
+        return 0
+
+    def loop_forever(self):
+        self.running = True
+        self.deliver()
+        return 0
@@ -0,0 +1,466 @@
+import argparse
+import asyncio
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+# MQTT 3.1.1 control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+SHARED_PREFIX = "$share/"
+
+
+class ProtocolError(Exception):
+    """Raised when a client sends something this broker does not accept."""
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT 3.1.1 topic filter matching with ``+`` and ``#`` wildcards."""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    # Wildcards at the first level never match topics starting with $ (e.g. $SYS)
+    if topic.startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length > 0:
+            byte |= 0x80
+        encoded.append(byte)
+        if length == 0:
+            return bytes(encoded)
+
+
+def encode_string(text):
+    data = text.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def read_string(body, offset):
+    (length,) = struct.unpack_from("!H", body, offset)
+    offset += 2
+    return body[offset:offset + length].decode("utf-8"), offset + length
+
+
+def read_bytes(body, offset):
+    (length,) = struct.unpack_from("!H", body, offset)
+    offset += 2
+    return bytes(body[offset:offset + length]), offset + length
+
+
+class ClientSession:
+    """State for one connected client."""
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.keepalive = 0
+        self.will = None  # (topic, payload, qos, retain)
+        self.subscriptions = set()  # filters as the client sent them, including $share/...
+        self.next_packet_id = 0
+        self.inflight = {}  # packet id -> send time, outgoing QoS 1 awaiting PUBACK
+        self.messages_out = 0
+        self.dropped = 0
+        self.closed = False
+
+    def send_packet(self, packet_type, flags, body=b""):
+        if self.closed:
+            return
+        self.writer.write(bytes([(packet_type << 4) | flags]) + encode_remaining_length(len(body)) + body)
+
+    def queue_depth(self):
+        """Bytes written to this client but not yet accepted by the socket."""
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() if transport is not None and not transport.is_closing() else 0
+
+    def deliver(self, topic, payload, qos, retain=False):
+        # A slow consumer must not grow the broker without bound; QoS 0 is allowed to drop
+        if qos == 0 and self.queue_depth() > self.broker.max_queue_bytes:
+            self.dropped += 1
+            self.broker.counters["dropped"] += 1
+            return
+        body = encode_string(topic)
+        if qos > 0:
+            self.next_packet_id = self.next_packet_id % 0xFFFF + 1
+            self.inflight[self.next_packet_id] = time.monotonic()
+            body += struct.pack("!H", self.next_packet_id)
+        self.send_packet(PUBLISH, (qos << 1) | (1 if retain else 0), body + payload)
+        self.messages_out += 1
+        self.broker.counters["messages_out"] += 1
+
+
+class EmbeddedBroker:
+    """Lightweight asyncio MQTT 3.1.1 broker for tests, benchmarks and load runs.
+
+    Supports QoS 0 and 1, ``+``/``#`` wildcards, retained messages, last will,
+    keep-alive and ``$share/<group>/<filter>`` shared subscriptions (delivered
+    round-robin within a group). Sessions are not persisted: every connection
+    behaves as a clean session. QoS 2 publishes are refused by closing the
+    connection and QoS 2 subscriptions are granted QoS 1.
+
+    Run it in-process with start()/stop(), inside an existing loop with serve(),
+    or as a separate process with start_subprocess() / ``python group_7_embedded_broker.py``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883, max_queue_bytes=8 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.max_queue_bytes = max_queue_bytes
+        self.sessions = {}  # client id -> ClientSession
+        self.connections = set()  # every open ClientSession, connected or not yet
+        self.subscriptions = {}  # filter -> {session: qos}
+        self.shared = {}  # (group, filter) -> {"members": {session: qos}, "next": int}
+        self.retained = {}  # topic -> (payload, qos)
+        self.counters = {
+            "connections": 0,
+            "messages_in": 0,
+            "messages_out": 0,
+            "dropped": 0,
+            "fanout_matches": 0,
+            "fanout_ns": 0,
+        }
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.startup_error = None
+
+    # Running the broker
+
+    async def serve(self):
+        """Start listening on the current event loop; returns once the socket is bound."""
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    def start(self):
+        """Run the broker on a background thread. Use port 0 to pick a free port."""
+        self.ready.clear()
+        self.thread = threading.Thread(target=self.run_loop, name="EmbeddedBroker", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.startup_error is not None:
+            raise self.startup_error
+        return self
+
+    def run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.serve())
+        except OSError as e:
+            self.startup_error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.shutdown())
+            self.loop.close()
+
+    async def shutdown(self):
+        """Close every client connection and let the handlers finish on their own."""
+        self.server.close()
+        for session in list(self.connections):
+            session.writer.close()
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            done, still_running = await asyncio.wait(pending, timeout=1.0)
+            for task in still_running:
+                task.cancel()
+
+    def stop(self):
+        if self.loop is not None and self.thread is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Connection handling
+
+    async def read_packet(self, session):
+        """Return (packet type, flags, body) or None when the client went away."""
+        timeout = session.keepalive * 1.5 if session.keepalive else None
+        try:
+            header = await asyncio.wait_for(session.reader.readexactly(1), timeout)
+            length = 0
+            multiplier = 1
+            for _ in range(4):
+                (byte,) = await session.reader.readexactly(1)
+                length += (byte & 0x7F) * multiplier
+                if not byte & 0x80:
+                    break
+                multiplier *= 128
+            else:
+                raise ProtocolError("Malformed remaining length")
+            body = await session.reader.readexactly(length) if length else b""
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def handle_client(self, reader, writer):
+        session = ClientSession(self, reader, writer)
+        self.connections.add(session)
+        graceful = False
+        try:
+            packet = await self.read_packet(session)
+            if packet is None or packet[0] != CONNECT:
+                return
+            self.handle_connect(session, packet[2])
+            while True:
+                packet = await self.read_packet(session)
+                if packet is None:
+                    break
+                packet_type, flags, body = packet
+                if packet_type == DISCONNECT:
+                    graceful = True
+                    break
+                self.handle_packet(session, packet_type, flags, body)
+                await writer.drain()
+        except (ProtocolError, struct.error, UnicodeDecodeError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(session)
+            self.drop_session(session, publish_will=not graceful)
+            writer.close()
+
+    def handle_connect(self, session, body):
+        protocol, offset = read_string(body, 0)
+        level, connect_flags, session.keepalive = struct.unpack_from("!BBH", body, offset)
+        offset += 4
+        if protocol not in ("MQTT", "MQIsdp") or level not in (3, 4):
+            session.send_packet(CONNACK, 0, bytes([0, 1]))  # Unacceptable protocol version
+            raise ProtocolError("Unsupported protocol")
+        session.client_id, offset = read_string(body, offset)
+        if not session.client_id:
+            session.client_id = f"auto-{id(session):x}"
+        if connect_flags & 0x04:
+            will_topic, offset = read_string(body, offset)
+            will_payload, offset = read_bytes(body, offset)
+            session.will = (will_topic, will_payload, min((connect_flags >> 3) & 0x03, 1), bool(connect_flags & 0x20))
+        # Username and password are accepted without checking
+
+        # A new connection with the same client id takes over the old one
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:
+            self.drop_session(previous, publish_will=False)
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+        self.counters["connections"] += 1
+        session.send_packet(CONNACK, 0, bytes([0, 0]))
+
+    def handle_packet(self, session, packet_type, flags, body):
+        if packet_type == PUBLISH:
+            self.handle_publish(session, flags, body)
+        elif packet_type == PUBACK:
+            (packet_id,) = struct.unpack_from("!H", body)
+            session.inflight.pop(packet_id, None)
+        elif packet_type == SUBSCRIBE:
+            self.handle_subscribe(session, body)
+        elif packet_type == UNSUBSCRIBE:
+            self.handle_unsubscribe(session, body)
+        elif packet_type == PINGREQ:
+            session.send_packet(PINGRESP, 0)
+        else:
+            raise ProtocolError(f"Unsupported packet type {packet_type}")
+
+    def handle_publish(self, session, flags, body):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic, offset = read_string(body, 0)
+        if qos > 1:
+            raise ProtocolError("QoS 2 is not supported")
+        if qos == 1:
+            (packet_id,) = struct.unpack_from("!H", body, offset)
+            offset += 2
+        self.publish(topic, bytes(body[offset:]), qos, retain)
+        if qos == 1:
+            session.send_packet(PUBACK, 0, struct.pack("!H", packet_id))
+
+    def handle_subscribe(self, session, body):
+        (packet_id,) = struct.unpack_from("!H", body)
+        offset = 2
+        granted = []
+        new_filters = []
+        while offset < len(body):
+            topic_filter, offset = read_string(body, offset)
+            qos = min(body[offset] & 0x03, 1)
+            offset += 1
+            self.add_subscription(session, topic_filter, qos)
+            granted.append(qos)
+            new_filters.append((topic_filter, qos))
+        session.send_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted))
+        # Retained messages go to new non-shared subscriptions only
+        for topic_filter, qos in new_filters:
+            if topic_filter.startswith(SHARED_PREFIX):
+                continue
+            for topic, (payload, retained_qos) in self.retained.items():
+                if topic_matches(topic_filter, topic):
+                    session.deliver(topic, payload, min(qos, retained_qos), retain=True)
+
+    def handle_unsubscribe(self, session, body):
+        (packet_id,) = struct.unpack_from("!H", body)
+        offset = 2
+        while offset < len(body):
+            topic_filter, offset = read_string(body, offset)
+            self.remove_subscription(session, topic_filter)
+        session.send_packet(UNSUBACK, 0, struct.pack("!H", packet_id))
+
+    # Subscriptions and routing
+
+    def add_subscription(self, session, topic_filter, qos):
+        session.subscriptions.add(topic_filter)
+        if topic_filter.startswith(SHARED_PREFIX):
+            group, _, shared_filter = topic_filter[len(SHARED_PREFIX):].partition("/")
+            entry = self.shared.setdefault((group, shared_filter), {"members": {}, "next": 0})
+            entry["members"][session] = qos
+        else:
+            self.subscriptions.setdefault(topic_filter, {})[session] = qos
+
+    def remove_subscription(self, session, topic_filter):
+        session.subscriptions.discard(topic_filter)
+        if topic_filter.startswith(SHARED_PREFIX):
+            group, _, shared_filter = topic_filter[len(SHARED_PREFIX):].partition("/")
+            entry = self.shared.get((group, shared_filter))
+            if entry is not None:
+                entry["members"].pop(session, None)
+                if not entry["members"]:
+                    del self.shared[(group, shared_filter)]
+        else:
+            subscribers = self.subscriptions.get(topic_filter)
+            if subscribers is not None:
+                subscribers.pop(session, None)
+                if not subscribers:
+                    del self.subscriptions[topic_filter]
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Route one message to every matching subscriber (callable from the broker loop)."""
+        started = time.perf_counter_ns()
+        self.counters["messages_in"] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+
+        # A client with overlapping subscriptions gets one copy at the highest granted QoS
+        targets = {}
+        for topic_filter, subscribers in self.subscriptions.items():
+            if topic_matches(topic_filter, topic):
+                for session, sub_qos in subscribers.items():
+                    targets[session] = max(targets.get(session, 0), sub_qos)
+        for (group, shared_filter), entry in self.shared.items():
+            if topic_matches(shared_filter, topic):
+                members = list(entry["members"].items())
+                session, sub_qos = members[entry["next"] % len(members)]
+                entry["next"] += 1
+                targets[session] = max(targets.get(session, 0), sub_qos)
+
+        for session, sub_qos in targets.items():
+            session.deliver(topic, payload, min(qos, sub_qos))
+        self.counters["fanout_matches"] += len(targets)
+        self.counters["fanout_ns"] += time.perf_counter_ns() - started
+
+    def drop_session(self, session, publish_will):
+        if session.closed:
+            return
+        session.closed = True
+        for topic_filter in list(session.subscriptions):
+            self.remove_subscription(session, topic_filter)
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        if publish_will and session.will is not None:
+            self.publish(*session.will)
+
+    def stats(self):
+        """Broker counters plus per-client queue depths. Thread-safe enough for monitoring."""
+        sessions = list(self.sessions.values())
+        stats = dict(self.counters)
+        stats["clients"] = len(sessions)
+        stats["subscriptions"] = len(self.subscriptions) + len(self.shared)
+        stats["retained"] = len(self.retained)
+        stats["avg_fanout_us"] = (self.counters["fanout_ns"] / self.counters["messages_in"] / 1000
+                                  if self.counters["messages_in"] else 0.0)
+        stats["queue_depths"] = {s.client_id: s.queue_depth() for s in sessions}
+        stats["inflight"] = {s.client_id: len(s.inflight) for s in sessions}
+        return stats
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def start_subprocess(port=1883, host="127.0.0.1"):
+    """Run the broker in a separate Python process and wait until it accepts connections."""
+    process = subprocess.Popen([sys.executable, __file__, "--host", host, "--port", str(port)])
+    if not wait_for_port(host, port):
+        process.terminate()
+        raise RuntimeError(f"Embedded broker did not start on {host}:{port}")
+    return process
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the embedded MQTT broker.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--stats-interval", type=float, default=0, help="Print counters every N seconds")
+    args = parser.parse_args(argv)
+
+    broker = EmbeddedBroker(args.host, args.port)
+    broker.start()
+    print(f"Embedded MQTT broker listening on {broker.host}:{broker.port}")
+    try:
+        while True:
+            time.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                stats = broker.stats()
+                print(f"in {stats['messages_in']} out {stats['messages_out']} dropped {stats['dropped']} "
+                      f"clients {stats['clients']} fan-out {stats['avg_fanout_us']:.1f} us/msg")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import time
+import numpy as np
+
+
+class ReadingBatch:
+    """A block of simulated readings for ``n_devices`` devices over ``n_ticks`` ticks.
+
+    ``timestamps_ns`` is an int64 array of epoch nanoseconds shaped
+    ``(n_devices, n_ticks)``. ``values`` has the same leading shape, with a
+    trailing axis for multi-value metrics such as blood pressure. ``wild_mask``
+    marks injected out-of-range readings and ``skip_mask`` marks transmissions
+    that were skipped and should not be sent.
+    """
+
+    def __init__(self, timestamps_ns, values, wild_mask, skip_mask):
+        self.timestamps_ns = timestamps_ns
+        self.values = values
+        self.wild_mask = wild_mask
+        self.skip_mask = skip_mask
+
+    @property
+    def shape(self):
+        return self.timestamps_ns.shape
+
+    def sent_mask(self):
+        return ~self.skip_mask
+
+    def sent_count(self):
+        return int(self.skip_mask.size - np.count_nonzero(self.skip_mask))
+
+
+def uniform_range(rng, low, high, shape):
+    """Integers drawn uniformly from the inclusive range ``[low, high]``."""
+    return rng.integers(low, high + 1, size=shape, dtype=np.int16)
+
+
+def either_range(rng, low_range, high_range, shape):
+    """Integers drawn from one of two inclusive ranges, picked with equal odds per element."""
+    low = uniform_range(rng, low_range[0], low_range[1], shape)
+    high = uniform_range(rng, high_range[0], high_range[1], shape)
+    return np.where(rng.random(shape) < 0.5, low, high)
+
+
+def build_batch(rng, n_devices, n_ticks, publish_interval, normal, wild,
+                wild_rate=0.0, skip_rate=0.0, skip_first=0, start_time=None):
+    """Assemble a ReadingBatch from per-metric ``normal`` and ``wild`` samplers.
+
+    Both samplers take a shape and return an integer array of that shape (plus
+    any trailing value axis). Wild readings replace normal ones wherever the
+    wild mask is set; ``skip_first`` skips the first ticks of every device, the
+    same way a pending ``skip_transmission`` would for a single generator.
+    """
+    shape = (n_devices, n_ticks)
+    if start_time is None:
+        start_time = time.time()
+    start_ns = int(start_time * 1_000_000_000)
+    interval_ns = int(publish_interval * 1_000_000_000)
+    ticks_ns = start_ns + np.arange(1, n_ticks + 1, dtype=np.int64) * interval_ns
+    timestamps_ns = np.broadcast_to(ticks_ns, shape).copy()
+
+    values = normal(shape)
+    wild_mask = rng.random(shape) < wild_rate if wild_rate > 0 else np.zeros(shape, dtype=bool)
+    if wild_mask.any():
+        wild_values = wild(shape)
+        mask = wild_mask if values.ndim == 2 else wild_mask[..., np.newaxis]
+        values = np.where(mask, wild_values, values)
+
+    skip_mask = rng.random(shape) < skip_rate if skip_rate > 0 else np.zeros(shape, dtype=bool)
+    if skip_first > 0:
+        skip_mask[:, :skip_first] = True
+    return ReadingBatch(timestamps_ns, values, wild_mask, skip_mask)
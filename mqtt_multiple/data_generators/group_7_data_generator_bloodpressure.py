@@ -3,6 +3,14 @@ import json
 import random
 from datetime import datetime
 import time
+from Utils.group_7_payload_codec import FORMAT_BINARY, encode_blood_pressure
+from Utils.group_7_metrics import get_registry
+
+METRICS = get_registry()
+ENCODE_SECONDS = METRICS.histogram("generator_encode_seconds", "Time to build one payload",
+                                   ["metric"]).labels("blood_pressure")
+SKIPPED = METRICS.counter("generator_skipped_total", "Transmissions skipped on request", ["metric"]).labels("blood_pressure")
+WILD = METRICS.counter("generator_wild_total", "Wild readings sent on request", ["metric"]).labels("blood_pressure")
 
 class BloodPressureDataGenerator:
     def __init__(self, update_callback, publish_interval=3):
@@ -10,31 +18,66 @@ class BloodPressureDataGenerator:
         self.publish_interval = publish_interval
         self.active = False
         self.transmissions_to_skip = 0
+        self.payload_format = "json"
     
     def generate_data(self):
+        while self.active:
+            time.sleep(self.publish_interval) # Wait for the next data transmission
+            self.tick()
+
+    def tick(self):
+        """Run a single transmission step, honouring any pending skips."""
         try:
-            while self.active:
-                time.sleep(self.publish_interval) # Wait for the next data transmission
-                if self.transmissions_to_skip > 0:
-                    self.transmissions_to_skip -= 1
-                    continue
-                systolic = random.randint(90, 140)
-                diastolic = random.randint(60, 90)
-                timestamp = datetime.now().isoformat()
-                data_package = {"timestamp": timestamp, "blood_pressure": [systolic, diastolic]}
-                # Pass data to the callback
-                self.update_callback(json.dumps(data_package))
+            if self.transmissions_to_skip > 0:
+                self.transmissions_to_skip -= 1
+                SKIPPED.inc()
+                return
+            systolic = random.randint(90, 140)
+            diastolic = random.randint(60, 90)
+            # Pass data to the callback
+            self.update_callback(self.build_payload(systolic, diastolic))
         except Exception as e:
             self.update_callback(json.dumps({"error": str(e)}))
             self.active = False 
 
+    def generate_batch(self, n_devices, n_ticks, wild_rate=0.0, skip_rate=0.0, start_time=None, rng=None):
+        """Generate a block of blood pressure readings for many devices at once.
+
+        Returns a ReadingBatch whose ``values`` array has shape ``(n_devices, n_ticks, 2)``
+        holding systolic and diastolic pairs. Pending skipped transmissions are
+        applied to the first ticks of every device.
+        """
+        # Imported here so the GUI does not pay for NumPy unless batches are used
+        import numpy as np
+        from data_generators.group_7_batch_generation import build_batch, either_range, uniform_range
+        rng = rng if rng is not None else np.random.default_rng()
+        skip_first = min(self.transmissions_to_skip, n_ticks)
+        self.transmissions_to_skip -= skip_first
+        return build_batch(
+            rng, n_devices, n_ticks, self.publish_interval,
+            normal=lambda shape: np.stack([uniform_range(rng, 90, 140, shape),
+                                           uniform_range(rng, 60, 90, shape)], axis=-1),
+            wild=lambda shape: np.stack([either_range(rng, (50, 89), (181, 240), shape),
+                                         either_range(rng, (20, 59), (121, 180), shape)], axis=-1),
+            wild_rate=wild_rate, skip_rate=skip_rate, skip_first=skip_first, start_time=start_time)
+
     def send_wild_data(self):
         # Extremely high or low blood pressure
         wild_systolic = random.choice([random.randint(50, 89), random.randint(181, 240)])
         wild_diastolic = random.choice([random.randint(20, 59), random.randint(121, 180)])
-        timestamp = datetime.now().isoformat()
-        wild_data = {"timestamp": timestamp, "blood_pressure": [wild_systolic, wild_diastolic]}
-        self.update_callback(json.dumps(wild_data))
+        WILD.inc()
+        self.update_callback(self.build_payload(wild_systolic, wild_diastolic))
+
+    def build_payload(self, systolic, diastolic):
+        """Encode a reading in the configured payload format."""
+        started = time.perf_counter()
+        if self.payload_format == FORMAT_BINARY:
+            payload = encode_blood_pressure(time.time_ns(), systolic, diastolic)
+        else:
+            timestamp = datetime.now().isoformat()
+            payload = json.dumps({"timestamp": timestamp, "blood_pressure": [systolic, diastolic]})
+        ENCODE_SECONDS.observe(time.perf_counter() - started)
+        return payload
 
     def skip_transmission(self, count):
         self.transmissions_to_skip += count
\ No newline at end of file
@@ -3,6 +3,14 @@ import json
 import time
 from datetime import datetime
 from Utils.group_7_SafeLogger import SafeLogger
+from Utils.group_7_payload_codec import FORMAT_BINARY, encode_heart_rate
+from Utils.group_7_metrics import get_registry
+
+METRICS = get_registry()
+ENCODE_SECONDS = METRICS.histogram("generator_encode_seconds", "Time to build one payload",
+                                   ["metric"]).labels("heart_rate")
+SKIPPED = METRICS.counter("generator_skipped_total", "Transmissions skipped on request", ["metric"]).labels("heart_rate")
+WILD = METRICS.counter("generator_wild_total", "Wild readings sent on request", ["metric"]).labels("heart_rate")
 
 class HeartRateDataGenerator:
     def __init__(self, update_callback, publish_interval, logger):
@@ -11,29 +19,61 @@ class HeartRateDataGenerator:
         self.active = False
         self.transmissions_to_skip = 0
         self.logger = logger  
+        self.payload_format = "json"
 
     def generate_data(self):
+        while self.active:
+            time.sleep(self.publish_interval) # Wait for the next data transmission
+            self.tick()
+
+    def tick(self):
+        """Run a single transmission step, honouring any pending skips."""
         try:
-            while self.active:
-                time.sleep(self.publish_interval) # Wait for the next data transmission
-                if self.transmissions_to_skip > 0:
-                    self.transmissions_to_skip -= 1
-                    continue
-                heart_rate = random.randint(60, 100)
-                timestamp = datetime.now().isoformat()
-                data_package = {"timestamp": timestamp, "heart_rate": heart_rate}
-                # Pass data to the callback function
-                self.update_callback(json.dumps(data_package))
+            if self.transmissions_to_skip > 0:
+                self.transmissions_to_skip -= 1
+                SKIPPED.inc()
+                return
+            heart_rate = random.randint(60, 100)
+            # Pass data to the callback function
+            self.update_callback(self.build_payload(heart_rate))
         except Exception as e:
             self.logger.log(f"Error in generating data: {str(e)}", "Heart Rate")
             self.active = False  
 
+    def generate_batch(self, n_devices, n_ticks, wild_rate=0.0, skip_rate=0.0, start_time=None, rng=None):
+        """Generate a block of heart rate readings for many devices at once.
+
+        Returns a ReadingBatch whose ``values`` array has shape ``(n_devices, n_ticks)``.
+        Pending skipped transmissions are applied to the first ticks of every device.
+        """
+        # Imported here so the GUI does not pay for NumPy unless batches are used
+        import numpy as np
+        from data_generators.group_7_batch_generation import build_batch, either_range, uniform_range
+        rng = rng if rng is not None else np.random.default_rng()
+        skip_first = min(self.transmissions_to_skip, n_ticks)
+        self.transmissions_to_skip -= skip_first
+        return build_batch(
+            rng, n_devices, n_ticks, self.publish_interval,
+            normal=lambda shape: uniform_range(rng, 60, 100, shape),
+            wild=lambda shape: either_range(rng, (50, 59), (101, 140), shape),
+            wild_rate=wild_rate, skip_rate=skip_rate, skip_first=skip_first, start_time=start_time)
+
     def send_wild_data(self):
         # Extremely high or low heart rate
         wild_heart_rate = random.choice([random.randint(50, 59), random.randint(101, 140)])
-        timestamp = datetime.now().isoformat()
-        wild_data = {"timestamp": timestamp, "heart_rate": wild_heart_rate}
-        self.update_callback(json.dumps(wild_data))
+        WILD.inc()
+        self.update_callback(self.build_payload(wild_heart_rate))
+
+    def build_payload(self, heart_rate):
+        """Encode a reading in the configured payload format."""
+        started = time.perf_counter()
+        if self.payload_format == FORMAT_BINARY:
+            payload = encode_heart_rate(time.time_ns(), heart_rate)
+        else:
+            timestamp = datetime.now().isoformat()
+            payload = json.dumps({"timestamp": timestamp, "heart_rate": heart_rate})
+        ENCODE_SECONDS.observe(time.perf_counter() - started)
+        return payload
 
     def skip_transmission(self, count):
         self.transmissions_to_skip += count
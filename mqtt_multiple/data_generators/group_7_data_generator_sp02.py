@@ -3,6 +3,14 @@ import json
 import random
 from datetime import datetime
 import time
+from Utils.group_7_payload_codec import FORMAT_BINARY, encode_spo2
+from Utils.group_7_metrics import get_registry
+
+METRICS = get_registry()
+ENCODE_SECONDS = METRICS.histogram("generator_encode_seconds", "Time to build one payload",
+                                   ["metric"]).labels("spo2")
+SKIPPED = METRICS.counter("generator_skipped_total", "Transmissions skipped on request", ["metric"]).labels("spo2")
+WILD = METRICS.counter("generator_wild_total", "Wild readings sent on request", ["metric"]).labels("spo2")
 
 class Sp02DataGenerator:
     def __init__(self, update_callback, publish_interval=3):
@@ -10,29 +18,61 @@ class Sp02DataGenerator:
         self.publish_interval = publish_interval
         self.active = False
         self.transmissions_to_skip = 0
+        self.payload_format = "json"
 
     def generate_data(self):
+        while self.active:
+            time.sleep(self.publish_interval) # Wait for the next data transmission
+            self.tick()
+
+    def tick(self):
+        """Run a single transmission step, honouring any pending skips."""
         try:
-            while self.active:
-                time.sleep(self.publish_interval) # Wait for the next data transmission
-                if self.transmissions_to_skip > 0:
-                    self.transmissions_to_skip -= 1
-                    continue
-                spo2 = random.randint(90, 100)
-                timestamp = datetime.now().isoformat()
-                data_package = {"timestamp": timestamp, "spO2": spo2}
-                # Pass data to the callback
-                self.update_callback(json.dumps(data_package))
+            if self.transmissions_to_skip > 0:
+                self.transmissions_to_skip -= 1
+                SKIPPED.inc()
+                return
+            spo2 = random.randint(90, 100)
+            # Pass data to the callback
+            self.update_callback(self.build_payload(spo2))
         except Exception as e:
             self.update_callback(json.dumps({"error": str(e)}))
             self.active = False 
 
+    def generate_batch(self, n_devices, n_ticks, wild_rate=0.0, skip_rate=0.0, start_time=None, rng=None):
+        """Generate a block of SpO2 readings for many devices at once.
+
+        Returns a ReadingBatch whose ``values`` array has shape ``(n_devices, n_ticks)``.
+        Pending skipped transmissions are applied to the first ticks of every device.
+        """
+        # Imported here so the GUI does not pay for NumPy unless batches are used
+        import numpy as np
+        from data_generators.group_7_batch_generation import build_batch, uniform_range
+        rng = rng if rng is not None else np.random.default_rng()
+        skip_first = min(self.transmissions_to_skip, n_ticks)
+        self.transmissions_to_skip -= skip_first
+        return build_batch(
+            rng, n_devices, n_ticks, self.publish_interval,
+            normal=lambda shape: uniform_range(rng, 90, 100, shape),
+            wild=lambda shape: uniform_range(rng, 50, 74, shape),
+            wild_rate=wild_rate, skip_rate=skip_rate, skip_first=skip_first, start_time=start_time)
+
     def send_wild_data(self):
         # Extremely low SpO2 levels
         wild_spo2 = random.randint(50, 74)
-        timestamp = datetime.now().isoformat()
-        wild_data = {"timestamp": timestamp, "spO2": wild_spo2}
-        self.update_callback(json.dumps(wild_data))
+        WILD.inc()
+        self.update_callback(self.build_payload(wild_spo2))
+
+    def build_payload(self, spo2):
+        """Encode a reading in the configured payload format."""
+        started = time.perf_counter()
+        if self.payload_format == FORMAT_BINARY:
+            payload = encode_spo2(time.time_ns(), spo2)
+        else:
+            timestamp = datetime.now().isoformat()
+            payload = json.dumps({"timestamp": timestamp, "spO2": spo2})
+        ENCODE_SECONDS.observe(time.perf_counter() - started)
+        return payload
 
     def skip_transmission(self, count):
         self.transmissions_to_skip += count
\ No newline at end of file
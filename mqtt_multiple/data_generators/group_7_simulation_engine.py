@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from Utils.group_7_metrics import get_registry
+
+DEFERRED = get_registry().counter("generator_ticks_deferred_total",
+                                  "Ticks held back because the publisher's in-flight window was full")
+BACKPRESSURE_RETRY = 0.01  # Seconds between checks whether held-back devices may tick again
+
+
+class SimulationEngine:
+    """Drive many simulated devices from a single asyncio event loop.
+
+    A device is any object with ``active``, ``publish_interval`` and ``tick()``,
+    which is what the data generators provide. Each device gets one timer on the
+    loop instead of a sleeping thread, so the number of devices is bounded by
+    memory rather than by thread count.
+
+    A device may also have ``blocked()``; while it returns True the device's
+    tick is held back (backpressure) and retried every BACKPRESSURE_RETRY
+    seconds by one shared timer.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.timers = {}  # id(device) -> asyncio.TimerHandle for the next tick
+        self.held = {}  # id(device) -> (device, due) for ticks waiting on backpressure
+        self.retry_handle = None
+        self.ticks = 0
+        self.deferred = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the event loop thread if it is not already running."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.ready.clear()
+        self.thread = threading.Thread(target=self.run_loop, name="SimulationEngine", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def shutdown(self):
+        """Cancel every device timer and stop the event loop thread."""
+        if self.loop is None or not self.thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.cancel_all)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def cancel_all(self):
+        for handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+        self.held.clear()
+        if self.retry_handle is not None:
+            self.retry_handle.cancel()
+            self.retry_handle = None
+
+    def add_device(self, device):
+        """Schedule a device; its first tick fires one interval from now."""
+        self.start()
+        self.loop.call_soon_threadsafe(self.schedule_device, device)
+
+    def remove_device(self, device):
+        """Stop ticking a device. Safe to call for devices that were never added."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.unschedule_device, device)
+
+    def schedule_device(self, device):
+        if id(device) in self.timers or id(device) in self.held:
+            return
+        due = self.loop.time() + device.publish_interval
+        self.timers[id(device)] = self.loop.call_at(due, self.fire, device, due)
+
+    def unschedule_device(self, device):
+        handle = self.timers.pop(id(device), None)
+        if handle is not None:
+            handle.cancel()
+        self.held.pop(id(device), None)
+
+    def fire(self, device, due):
+        if not device.active:
+            self.timers.pop(id(device), None)
+            return
+        blocked = getattr(device, "blocked", None)
+        if blocked is not None and blocked():
+            self.timers.pop(id(device), None)
+            self.held[id(device)] = (device, due)
+            self.deferred += 1
+            DEFERRED.inc()
+            if self.retry_handle is None:
+                self.retry_handle = self.loop.call_later(BACKPRESSURE_RETRY, self.retry_held)
+            return
+        try:
+            device.tick()
+            self.ticks += 1
+        except Exception:
+            # Generators report their own errors; this only guards the loop itself
+            self.errors += 1
+            device.active = False
+        if not device.active:
+            self.timers.pop(id(device), None)
+            return
+        # Keep a fixed cadence, but do not try to catch up on ticks missed under load
+        now = self.loop.time()
+        due += device.publish_interval
+        if due < now:
+            due = now + device.publish_interval
+        self.timers[id(device)] = self.loop.call_at(due, self.fire, device, due)
+
+    def retry_held(self):
+        self.retry_handle = None
+        for key, (device, due) in list(self.held.items()):
+            if not device.blocked():
+                del self.held[key]
+                self.fire(device, due)  # Holds the device again if it is still blocked
+        if self.held and self.retry_handle is None:
+            self.retry_handle = self.loop.call_later(BACKPRESSURE_RETRY, self.retry_held)
+
+    def device_count(self):
+        return len(self.timers) + len(self.held)
+
+
+shared_engine = None
+shared_engine_lock = threading.Lock()
+
+
+def get_shared_engine():
+    """Return the process-wide engine used by the publishers."""
+    global shared_engine
+    with shared_engine_lock:
+        if shared_engine is None:
+            shared_engine = SimulationEngine()
+        return shared_engine
+
+
+if __name__ == '__main__':
+    # Quick load check: tick a large number of throwaway devices for a few seconds
+    import argparse
+
+    class CountingDevice:
+        def __init__(self, publish_interval):
+            self.publish_interval = publish_interval
+            self.active = True
+            self.transmissions_to_skip = 0
+
+        def tick(self):
+            pass
+
+    parser = argparse.ArgumentParser(description="Run the simulation engine with dummy devices.")
+    parser.add_argument("--devices", type=int, default=100000)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    engine = SimulationEngine()
+    engine.start()
+    for _ in range(args.devices):
+        engine.add_device(CountingDevice(args.interval))
+    time.sleep(args.duration)
+    engine.shutdown()
+    print(f"{args.devices} devices, {engine.ticks} ticks in {args.duration}s "
+          f"({engine.ticks / args.duration:.0f} ticks/s), {engine.errors} errors")
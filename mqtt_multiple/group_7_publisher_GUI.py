@@ -1,12 +1,13 @@
+import time
 import tkinter as tk
 from tkinter.scrolledtext import ScrolledText
 from datetime import datetime
-import publishers.group_7_basepublisher as basepublisher
 from Utils.group_7_SafeLogger import SafeLogger
 from publishers.group_7_publisher_heartrate import HeartRatePublisher
 from publishers.group_7_publisher_bloodpressure import BloodPressurePublisher
 from publishers.group_7_publisher_sp02 import SpO2Publisher
 import Utils.group_7_config as config
+from Utils.group_7_metrics import get_registry, latency_summary, start_metrics_server
 from functools import partial
 
 class App:
@@ -21,9 +22,16 @@ class App:
         blood_pressure_topic = "health/blood_pressure"
         spo2_topic = "health/spo2"
 
-        self.heart_publisher = HeartRatePublisher(lambda msg: self.logger.log(msg, "Heart Rate"), self.logger, heart_rate_topic)
-        self.bp_publisher = BloodPressurePublisher(lambda msg: self.logger.log(msg, "Blood Pressure"), self.logger, blood_pressure_topic)
-        self.spo2_publisher = SpO2Publisher(lambda msg: self.logger.log(msg, "SpO2"), self.logger, spo2_topic)
+        # With a patient ID the three vitals go to health/<patient_id>/<metric> instead
+        patient_id = config.PUBLISHER_PATIENT_ID
+
+        self.heart_publisher = HeartRatePublisher(lambda msg: self.logger.log(msg, "Heart Rate"), self.logger, heart_rate_topic, patient_id=patient_id)
+        self.bp_publisher = BloodPressurePublisher(lambda msg: self.logger.log(msg, "Blood Pressure"), self.logger, blood_pressure_topic, patient_id=patient_id)
+        self.spo2_publisher = SpO2Publisher(lambda msg: self.logger.log(msg, "SpO2"), self.logger, spo2_topic, patient_id=patient_id)
+
+        # Prometheus text at http://127.0.0.1:<port>/metrics; the metrics line in the title frame shows the same numbers
+        self.metrics_server = start_metrics_server(config.METRICS_HOST, config.PUBLISHER_METRICS_PORT)
+        self.last_published = (time.monotonic(), 0)
 
         self.setup_data_displays_and_controls()
         
@@ -36,13 +44,24 @@ class App:
         # Broker url and port from config file
         tk.Label(title_frame, text="Publishing to Broker URL: " + config.MQTT_BROKER_URL, font=("Arial", 10)).pack(side=tk.LEFT)
         tk.Label(title_frame, text="Port: " + str(config.MQTT_BROKER_PORT), font=("Arial", 10)).pack(side=tk.LEFT)
+        tk.Label(title_frame, text="Patient: " + (config.PUBLISHER_PATIENT_ID or "none (global topics)"), font=("Arial", 10)).pack(side=tk.LEFT)
 
         self.status_bar = tk.Label(title_frame, text="Connection Status: Disconnected", font=("Arial", 10))
         # Check if already connected to the broker and update the status accordingly
 
-        if self.heart_publisher.on_connect and self.bp_publisher.on_connect and self.spo2_publisher.on_connect:
+        if all(publisher.connection.connected for publisher in (self.heart_publisher, self.bp_publisher, self.spo2_publisher)):
             self.status_bar.config(text="Connection Status: Connected")
 
+        # Shared connection pool load, refreshed once a second
+        self.pool_stats_label = tk.Label(title_frame, text="", font=("Arial", 9))
+        self.pool_stats_label.pack(side=tk.LEFT, padx=10)
+        self.refresh_pool_stats()
+
+        # Publish rate, drops and encode latency from the metrics registry
+        self.metrics_label = tk.Label(title_frame, text="", font=("Arial", 9))
+        self.metrics_label.pack(side=tk.LEFT, padx=10)
+        self.refresh_metrics()
+
         # Connect button
         tk.Button(title_frame, text="Connect", command=self.connect, width=10).pack(side=tk.RIGHT)
         # Disconnect button
@@ -62,7 +81,7 @@ class App:
         frame.grid(row=row, column=0, padx=10, pady=10, sticky="ew")
         self.master.columnconfigure(0, weight=1) 
         tk.Label(frame, text=f"{label}", font=("Arial", 10)).grid(row=0, column=0, sticky="w")
-        display_label = tk.Label(frame, text=f"Publishing every: {publisher.publish_interval} seconds", font=("Arial", 9))
+        display_label = tk.Label(frame, text=f"Publishing to {publisher.mqtt_topic} every: {publisher.publish_interval} seconds at QoS {publisher.qos}", font=("Arial", 9))
         display_label.grid(row=0, column=1, sticky="w")
 
         # Setting up the log area for each publisher
@@ -90,6 +109,44 @@ class App:
         tk.Button(frame, text=f"Send Wild Data", command=partial(self.send_wild_data, publisher, label), width=button_width).grid(row=4, column=8, padx=3, pady=3)
         tk.Button(frame, text=f"Skip Transmission", command=partial(self.skip_transmission, publisher, label), width=button_width).grid(row=5, column=8, padx=3, pady=3)
 
+    def refresh_pool_stats(self):
+        """Show state, in-flight, queued and spooled messages for each pooled MQTT connection."""
+        parts = []
+        for s in self.heart_publisher.pool.stats():
+            if s["connected"]:
+                state = f"{s['in_flight']}/{s['window']} in flight, {s['queue_depth']} queued"
+            elif s["retry_in"] is not None:
+                state = f"retry in {s['retry_in']:.0f} s ({s['last_error']})"
+            else:
+                state = "connecting"
+            if s["outbox_depth"]:
+                state += f", outbox {s['outbox_depth']} ({s['drain_rate']:.0f}/s out)"
+            parts.append(f"#{s['connection']}: {state}")
+        self.pool_stats_label.config(text="Connections " + " | ".join(parts))
+        self.master.after(1000, self.refresh_pool_stats)
+
+    def refresh_metrics(self):
+        metrics = get_registry()
+        now, published = time.monotonic(), metrics.total("publisher_messages_published_total")
+        then, published_before = self.last_published
+        self.last_published = (now, published)
+        rate = (published - published_before) / (now - then) if now > then else 0.0
+        endpoint = self.metrics_server.url if self.metrics_server is not None else "endpoint off"
+        # Publish-to-acknowledgement latency per QoS level: what QoS 1 costs over QoS 0
+        acks = []
+        for qos in range(3):
+            histogram = metrics.merged_histogram("publisher_ack_seconds", qos=qos)
+            if histogram is not None and histogram.count:
+                acks.append(f"QoS {qos} {latency_summary(histogram)}")
+        self.metrics_label.config(
+            text=f"Published {rate:.0f}/s, {metrics.total('publisher_messages_dropped_total')} dropped, "
+                 f"{metrics.total('publisher_messages_lost_total')} lost, "
+                 f"{metrics.total('generator_skipped_total')} skipped, {metrics.total('generator_wild_total')} wild | "
+                 f"Encode {latency_summary(metrics.merged_histogram('generator_encode_seconds'))} | {endpoint}\n"
+                 f"Ack {'; '.join(acks) or 'no samples'} | "
+                 f"{metrics.total('generator_ticks_deferred_total')} ticks held back by full in-flight windows")
+        self.master.after(1000, self.refresh_metrics)
+
     def update_log_width(self, log_frame, event):
         # Update the width of the log frame based on the window size
         width = event.width - 20 
@@ -125,7 +182,6 @@ class App:
 
     def connect(self):
         """Connect to the broker and update the connection status."""
-        basepublisher.BasePublisher.on_connect = True
         self.heart_publisher.start()
         self.bp_publisher.start()
         self.spo2_publisher.start()
@@ -142,13 +198,18 @@ class App:
 
     def on_closing(self):
         """Called when the window is closed."""
-        self.client.disconnect() 
-        self.client.loop_stop() 
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        # Each publisher releases the shared pool; the last one in the process (see
+        # group_7_Main_GUI.py) stops its network threads, other windows keep publishing
+        for publisher in (self.heart_publisher, self.bp_publisher, self.spo2_publisher):
+            publisher.close()
         self.master.destroy() 
 
 if __name__ == '__main__':
     root2 = tk.Tk()
     app2 = App(root2)
+    root2.protocol("WM_DELETE_WINDOW", app2.on_closing)
     screen_width2 = root2.winfo_screenwidth()
     screen_height2 = root2.winfo_screenheight()
     width2 = int(screen_width2 * 4 // 6)
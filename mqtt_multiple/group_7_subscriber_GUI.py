@@ -1,24 +1,42 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-from paho.mqtt import client as mqtt_client
-import json
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from collections import deque
 import time
+import numpy as np
 from datetime import datetime
-
-broker = 'localhost'  
-port = 1883
+import Utils.group_7_config as config
+from Utils.group_7_SafeLogger import SafeLogger
+from Utils.group_7_metrics import get_registry, latency_summary, start_metrics_server
+from Utils.group_7_topic_dispatch import TopicDispatcher
+from Utils.group_7_topics import metric_topic, patient_filter, split_patient_topic
+from subscribers.group_7_downsampling import minmax_decimate
+from subscribers.group_7_live_chart import LiveChartRenderer
+from subscribers.group_7_sharded_subscriber import ShardedSubscriber
+from subscribers.group_7_subscriber_engine import SubscriberEngine
+from subscribers.group_7_timeseries_store import TimeSeriesStore
+from subscribers.group_7_window_aggregator import WindowAggregator, aggregate_pool, pool_publisher
+
+broker = config.MQTT_BROKER_URL
+port = config.MQTT_BROKER_PORT
 topics = {
     "Heart Rate": "health/heart_rate",
     "Blood Pressure": "health/blood_pressure",
     "SpO2": "health/spo2"
 }
+# Ingestion: the MQTT thread only decodes and enqueues, Tk drains on a fixed tick
+INGEST_TICK_MS = 100
+INGEST_BATCH_LIMIT = 500  # Most samples handled per tick, so one burst cannot freeze the GUI
+INGEST_QUEUE_LIMIT = 10000  # Oldest samples are dropped beyond this
+CHART_MAX_FPS = 10  # Upper bound on chart redraws per second, whatever the message rate
+CHART_WINDOW_SAMPLES = 50  # Newest samples plotted per series; longer windows are decimated to the chart width
+METRICS_REFRESH_MS = 1000
+METRICS = get_registry()
+INGEST_QUEUE_DEPTH = METRICS.gauge("subscriber_ingest_queue_depth", "Decoded samples waiting for the Tk thread")
+INGEST_DROPPED = METRICS.counter("subscriber_ingest_dropped_total", "Samples dropped because the ingest queue was full")
 expected_intervals = {
-    "health/heart_rate": 1,   
-    "health/blood_pressure": 3,  
-    "SpO2": 5  
+    topics["Heart Rate"]: 2,
+    topics["Blood Pressure"]: 3,
+    topics["SpO2"]: 5
 }
 
 class HealthSubscriber:
@@ -26,27 +44,71 @@ class HealthSubscriber:
         self.master = master
         self.master.title("Health Data Subscriber")
 
-        self.last_received_time = {}  # Track the last receive time for each topic
         self.topic_labels = {} # Store the labels for each topic
-        self.line_objects = {} # Store the line objects for each topic
-        self.data_queues = {
-            topics["Heart Rate"]: deque(maxlen=50),
-            topics["Blood Pressure"] + '_systolic': deque(maxlen=50),
-            topics["Blood Pressure"] + '_diastolic': deque(maxlen=50),
-            topics["SpO2"]: deque(maxlen=50)
+        # Topic filter -> label updaters of the checked topics; resolved once per concrete topic
+        self.display_handlers = TopicDispatcher()
+        self.display_updaters = {}  # topic name -> the updater registered for it, to unregister exactly that one
+        self.display_formats = {
+            topics["Heart Rate"]: lambda data: f"Heart Rate: {data.heart_rate} bpm",
+            topics["Blood Pressure"]: lambda data: f"Blood Pressure: {data.systolic}/{data.diastolic} mmHg",
+            topics["SpO2"]: lambda data: f"SpO2: {data.spo2}%",
         }
+        self.line_objects = {} # Store the line objects for each topic
+        # Decoding, validation, anomaly checks and storage live in the engine; this window is one of its sinks
+        self.sharded = config.SUBSCRIBER_WORKERS > 0
+        if self.sharded:
+            # Worker processes do the decoding and analysis; this window reads the merged results
+            self.engine = ShardedSubscriber([self], workers=config.SUBSCRIBER_WORKERS,
+                                            mode=config.SUBSCRIBER_SHARD_MODE, group=config.SUBSCRIBER_SHARE_GROUP,
+                                            history=50, host=broker, port=port, store_dir=config.TIMESERIES_DIR,
+                                            intervals=expected_intervals)
+        else:
+            # Full history goes to memory-mapped files; the chart shows the last 50 samples of each series
+            store = TimeSeriesStore(config.TIMESERIES_DIR, window=50,
+                                    segment_samples=config.TIMESERIES_SEGMENT_SAMPLES,
+                                    retention_seconds=config.TIMESERIES_RETENTION_DAYS * 24 * 3600)
+            self.engine = SubscriberEngine([self], history=50, host=broker, port=port, store=store,
+                                           intervals=expected_intervals)
+        self.data_queues = self.engine.data_queues
+        # Windowed aggregates for dashboards, published back to the broker (only the
+        # in-process engine sees every sample; sharded workers report the latest ones)
+        self.aggregator_pool = None
+        if config.AGGREGATION_ENABLED and not self.sharded:
+            self.aggregator_pool = aggregate_pool(broker, port)
+            aggregator = WindowAggregator(pool_publisher(self.aggregator_pool))
+            aggregator.start()
+            self.engine.add_sink(aggregator)
+        for series in [topics["Heart Rate"], topics["Blood Pressure"] + '_systolic',
+                       topics["Blood Pressure"] + '_diastolic', topics["SpO2"]]:
+            self.engine.series(series)
+
+        # Filled on the network thread, drained on the Tk thread
+        self.ingest_queue = deque()
+        self.ingest_stats = {"enqueued": 0, "drained": 0, "dropped": 0, "queue_depth": 0,
+                             "max_queue_depth": 0, "last_drain_ms": 0.0, "max_drain_ms": 0.0}
+        INGEST_QUEUE_DEPTH.set_function(lambda: len(self.ingest_queue))
+        # Prometheus text at http://127.0.0.1:<port>/metrics; the panel below shows the same numbers
+        self.metrics_server = start_metrics_server(config.METRICS_HOST, config.SUBSCRIBER_METRICS_PORT)
+        self.last_metrics = (time.monotonic(), 0)
+        # Both log panes are capped and written once per logger tick; samples are summarised per drain
+        self.logger = SafeLogger()
+        self.received_counts = {}  # metric topic -> samples shown since the last drain
 
         self.setup_gui()
       
-        self.client = mqtt_client.Client("SubscriberClient")
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.connect(broker, port)
-        self.client.loop_start()
+        try:
+            self.engine.connect(on_message=self.on_message)
+        except OSError:
+            # No broker: release what was set up so far; whoever opened the window reports it
+            self.on_closing()
+            raise
+        self.engine.start()
+        self.client = self.engine.client
         
-        self.active_subscriptions = set() 
-        self.last_received_time = {}  
-        self.last_value_time = {}
+        self.active_subscriptions = self.engine.active_subscriptions
+
+        self.master.after(INGEST_TICK_MS, self.drain_ingest_queue)
+        self.master.after(METRICS_REFRESH_MS, self.refresh_metrics)
 
     def setup_gui(self):
         large_font = ('Arial', 14)  
@@ -59,7 +121,7 @@ class HealthSubscriber:
             # Checkbox for each topic
             var = tk.BooleanVar()
             cb = tk.Checkbutton(self.master, text=topic_name, variable=var, font=large_font,
-                                command=lambda t=topics[topic_name], v=var: self.subscribe_or_unsubscribe(t, v))
+                                command=lambda n=topic_name, v=var: self.subscribe_or_unsubscribe(n, v))
             cb.grid(row=row, column=0, sticky='w')
 
             # Label for each topic
@@ -77,9 +139,55 @@ class HealthSubscriber:
         self.anomaly_log_text = scrolledtext.ScrolledText(self.master, height=5, width=75, font=large_font)
         self.anomaly_log_text.grid(row=row, column=0, columnspan=2, padx=10, pady=10, sticky='nsew')
         row += 1
+        self.logger.register_log_widget("Subscriber", self.log_text)
+        self.logger.register_log_widget("Anomalies", self.anomaly_log_text)
+
+        # Ingestion queue counters
+        self.ingest_stats_label = tk.Label(self.master, text="Queue: 0 pending", font=('Arial', 10))
+        self.ingest_stats_label.grid(row=row, column=0, columnspan=2, padx=10, sticky='w')
+        row += 1
+
+        # Anomaly rule hit counters and evaluation cost
+        self.rule_stats_label = tk.Label(self.master, text="Rules: no samples yet", font=('Arial', 10),
+                                         justify='left', wraplength=560)
+        self.rule_stats_label.grid(row=row, column=0, columnspan=2, padx=10, sticky='w')
+        row += 1
+
+        # Throughput and where the time goes, from the metrics registry
+        self.metrics_label = tk.Label(self.master, text="Metrics: waiting for data", font=('Arial', 10),
+                                      justify='left', wraplength=560)
+        self.metrics_label.grid(row=row, column=0, columnspan=2, padx=10, sticky='w')
+        row += 1
+
+        # Per-patient state: how many patients are tracked, and one patient's latest readings on request
+        patient_frame = tk.Frame(self.master)
+        patient_frame.grid(row=row, column=0, columnspan=2, padx=10, sticky='w')
+        tk.Label(patient_frame, text="Patient:", font=('Arial', 10)).pack(side=tk.LEFT)
+        self.patient_entry = tk.Entry(patient_frame, width=16)
+        self.patient_entry.pack(side=tk.LEFT)
+        self.patient_entry.bind("<Return>", lambda event: self.show_patient())
+        tk.Button(patient_frame, text="Show", command=self.show_patient).pack(side=tk.LEFT, padx=5)
+        self.patients_label = tk.Label(patient_frame, text="No patients yet", font=('Arial', 10))
+        self.patients_label.pack(side=tk.LEFT, padx=5)
+        row += 1
+        self.patient_label = tk.Label(self.master, text="", font=('Arial', 10), justify='left', wraplength=560)
+        self.patient_label.grid(row=row, column=0, columnspan=2, padx=10, sticky='w')
+        row += 1
+
+        # The chart is built once the window is on screen: matplotlib takes longer
+        # to import than everything else in this window together
+        self.chart = None
+        self.chart_placeholder = tk.Label(self.master, text="Loading chart...", font=('Arial', 10))
+        self.chart_placeholder.grid(row=10, column=0, columnspan=2, padx=10, pady=10, sticky='nsew')
+        self.master.after_idle(self.setup_chart)
+
+    def setup_chart(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
         # Canvas for plotting should span both columns as well
-        self.fig, self.ax = plt.subplots(figsize=(10, 5))
+        self.fig = Figure(figsize=(10, 5))
+        self.ax = self.fig.add_subplot()
         self.lines = {}
         colors = {'health/heart_rate': 'r', 'health/blood_pressure_systolic': 'b', 'health/blood_pressure_diastolic': 'g', 'health/spo2': 'purple'}
         for topic in topics.values():
@@ -94,41 +202,33 @@ class HealthSubscriber:
         self.ax.set_ylim(0, 150)  # Adjust y-axis limit based on expected data range
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.master)
         self.canvas.draw()
+        self.chart_placeholder.destroy()
         self.canvas_widget = self.canvas.get_tk_widget()
         self.canvas_widget.grid(row=10, column=0, columnspan=2, padx=10, pady=10, sticky='nsew')
+        self.chart = LiveChartRenderer(self.master, self.canvas, self.ax, self.lines, max_fps=CHART_MAX_FPS)
+        self.update_graph()  # Show whatever history was reloaded from disk
 
+    def on_status(self, message):
+        # Runs on the network thread, so hand the message to the Tk side through the queue
+        self.enqueue((None, None, time.time(), message))
 
-    def on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            message = "Connected successfully to MQTT broker."
-        else:
-            message = f"Failed to connect, return code {rc}"
-        
-        # Log the connection message in your GUI and print it
-        self.master.after(0, self.log_message, message)
-        self.master.after(0, self.update_gui_with_message, message)
-
-    def subscribe_or_unsubscribe(self, topic, var):
-        derived_topic_systolic = topic + '_systolic'
-        derived_topic_diastolic = topic + '_diastolic'
+    def subscribe_or_unsubscribe(self, topic_name, var):
+        # The global topic plus the same metric for every patient (health/+/<metric>)
+        topic = topics[topic_name]
+        filters = [topic, patient_filter(topic)]
         if var.get():  # If the checkbox is checked, subscribe to the topic
-            self.client.subscribe(topic)
-            self.active_subscriptions.add(topic)
-            self.active_subscriptions.add(derived_topic_systolic)
-            self.active_subscriptions.add(derived_topic_diastolic)
-            self.log_message(f"Subscribed to {topic}, {derived_topic_systolic}, and {derived_topic_diastolic}")
+            updater = self.display_updaters[topic_name] = self.display_updater(topic_name)
+            for topic_filter in filters:
+                self.engine.subscribe(topic_filter)
+                self.display_handlers.register(topic_filter, updater)
+            self.log_message(f"Subscribed to {' and '.join(filters)}")
         else:  # If the checkbox is unchecked, unsubscribe from the topic
-            self.client.unsubscribe(topic)
-            self.active_subscriptions.discard(topic)
-            self.active_subscriptions.discard(derived_topic_systolic)
-            self.active_subscriptions.discard(derived_topic_diastolic)
-            self.log_message(f"Unsubscribed from {topic}, {derived_topic_systolic}, and {derived_topic_diastolic}")
-
-    def log_message(self, message):
-        # Assuming you have initialized self.log_text elsewhere in your setup_gui method
-        if hasattr(self, 'log_text'):
-            self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
+            updater = self.display_updaters.pop(topic_name, None)
+            for topic_filter in filters:
+                self.engine.unsubscribe(topic_filter)
+                if updater is not None:
+                    self.display_handlers.unregister(topic_filter, updater)
+            self.log_message(f"Unsubscribed from {' and '.join(filters)}")
 
     def update_gui_with_message(self, message):
         if hasattr(self, 'log_text'):
@@ -138,78 +238,113 @@ class HealthSubscriber:
             print("Log text widget not available:", message)
 
     def on_message(self, client, userdata, msg):
-        topic = msg.topic
-        current_time = time.time()
-        
-        try:
-            data = json.loads(msg.payload.decode())
-            print(f"Received data on {topic}: {data}")  
-
-            # Only process messages for topics that are actively subscribed to
-            if topic not in self.active_subscriptions:
-                return  # Skip processing for unsubscribed topics
-
-            # Logging the received message
-            self.log_message(f"Received message on {topic}: {data}")
-
-            # Check for wild data
-            if self.is_wild_data(data, topic):
-                self.log_message(f"Wild data on {topic}: {data}")
-                self.anomaly_log_text.insert(tk.END, f"Excluded wild data on {topic} at {current_time}: {data}\n")
-                self.anomaly_log_text.see(tk.END)
-                return  # Skip further processing of this message
-
-            self.log_message(f"Received message on {topic}: {data}")
-
-            # Handling Heart Rate data
-            if topic == topics["Heart Rate"]:
-                heart_rate = data.get('heart_rate')
-                if heart_rate is not None:
-                    self.data_queues[topic].append((heart_rate, current_time))
-                    self.update_display(topic, data)
-
-            # Handling Blood Pressure data
-            elif topic == topics["Blood Pressure"]:
-                blood_pressure = data.get('blood_pressure')
-                if blood_pressure and len(blood_pressure) == 2:
-                    systolic, diastolic = blood_pressure
-                    self.data_queues[topic + '_systolic'].append((systolic, current_time))
-                    self.data_queues[topic + '_diastolic'].append((diastolic, current_time))
-                    self.update_display(topic, data)
-
-            # Handling SpO2 data
-            elif topic == topics["SpO2"]:
-                spO2 = data.get('spO2')
-                if spO2 is not None:
-                    self.data_queues[topic].append((spO2, current_time))
-                    self.update_display(topic, data)
-
-                # Update the graph after new data has been appended
-                self.update_graph()
+        """Runs on paho's network thread: decode and enqueue only, never touch Tk here."""
+        for entry in self.engine.decode(msg.topic, msg.payload, time.time()):
+            self.enqueue(entry)
+
+    def enqueue(self, entry):
+        stats = self.ingest_stats
+        if len(self.ingest_queue) >= INGEST_QUEUE_LIMIT:
+            self.ingest_queue.popleft()
+            stats["dropped"] += 1
+            INGEST_DROPPED.inc()
+        self.ingest_queue.append(entry)
+        stats["enqueued"] += 1
+
+    def drain_ingest_queue(self):
+        """Handle queued samples in one batch on the Tk thread, then redraw once."""
+        started = time.perf_counter()
+        if self.sharded:
+            self.engine.poll()  # Merged worker reports come back through on_sample/on_anomaly/on_missed
+        processed = 0
+        batch = []
+        while self.ingest_queue and processed < INGEST_BATCH_LIMIT:
+            entry = self.ingest_queue.popleft()
+            if entry[0] is None:
+                self.log_message(entry[3])  # Connection status, not a sample
             else:
-                self.log_message(f"Excluded wild data on {topic}: {data}")
-
-        except json.JSONDecodeError as e:
-            self.log_message(f"Error decoding JSON: {str(e)}")
-        except KeyError as e:
-            self.log_message(f"Data key error: {str(e)}")  # Handles missing keys in data dictionaries
-        except Exception as e:
-            self.log_message(f"Unhandled error: {str(e)}")  # General catch-all for any other exceptions
-
-
-    def check_for_wild_data(self, data, topic):
-        wild = False
-        if topic == topics["Heart Rate"] and (data['heart_rate'] < 60 or data['heart_rate'] > 100):
-            wild = True
-        elif topic == topics["Blood Pressure"] and (data['blood_pressure'][0] > 180 or data['blood_pressure'][1] < 50):
-            wild = True
-        elif topic == topics["SpO2"] and (data['spO2'] < 85):
-            wild = True
-        
-        if wild:
-            self.anomaly_button.config(bg='red')
-            self.anomaly_log_text.insert(tk.END, f"Wild data detected: {data} on topic {topic}\n")
-            self.anomaly_log_text.see(tk.END)
+                batch.append(entry)
+            processed += 1
+        # Overdue streams come back through on_missed on this thread
+        self.engine.check_deadlines()
+        if self.sharded:
+            self.update_graph()
+            self.update_rule_stats()
+        if batch:
+            try:
+                # Validation, anomaly rules over the whole batch and storage, then on_sample/on_anomaly/on_error
+                self.engine.handle_batch(batch)
+            except Exception as e:
+                self.log_message(f"Unhandled error: {str(e)}")  # General catch-all for any other exceptions
+            self.update_graph()
+            self.update_rule_stats()
+        if self.received_counts:
+            self.log_message("Received " + ", ".join(f"{count} on {metric}" for metric, count in self.received_counts.items()))
+            self.received_counts = {}
+
+        stats = self.ingest_stats
+        drain_ms = (time.perf_counter() - started) * 1000
+        stats["drained"] += processed
+        stats["queue_depth"] = len(self.ingest_queue)
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"] + processed)
+        stats["last_drain_ms"] = drain_ms
+        stats["max_drain_ms"] = max(stats["max_drain_ms"], drain_ms)
+        rejected = ", ".join(f"{topic.split('/')[-1]} {counts['rejected']}"
+                             for topic, counts in self.engine.schema_stats().items() if counts['rejected'])
+        self.ingest_stats_label.config(
+            text=f"Queue: {stats['queue_depth']} pending (max {stats['max_queue_depth']}), "
+                 f"{stats['dropped']} dropped | Drain: {drain_ms:.1f} ms (max {stats['max_drain_ms']:.1f} ms) | "
+                 f"Missed: {self.engine.stats['missed']} | Rejected: {rejected or 'none'}")
+        self.master.after(INGEST_TICK_MS, self.drain_ingest_queue)
+
+    def refresh_metrics(self):
+        now, received = time.monotonic(), self.engine.stats["received"]
+        then, received_before = self.last_metrics
+        self.last_metrics = (now, received)
+        rate = (received - received_before) / (now - then) if now > then else 0.0
+        endpoint = self.metrics_server.url if self.metrics_server is not None else "endpoint off"
+        # In sharded mode decoding happens in the workers, so only the rate is known here
+        decode = latency_summary(METRICS.merged_histogram('subscriber_decode_seconds'))
+        handle = latency_summary(METRICS.merged_histogram('subscriber_handle_seconds'))
+        self.metrics_label.config(text=f"Received {rate:.0f}/s | Decode {decode} | Handle {handle} | {endpoint}")
+        patients = self.engine.patients
+        if len(patients):
+            self.patients_label.config(text=f"{len(patients)} patients, {patients.anomalous_count()} with an anomaly, "
+                                            f"{patients.nbytes() / 1e6:.1f} MB of state")
+        if self.patient_entry.get().strip():
+            self.show_patient()
+        self.master.after(METRICS_REFRESH_MS, self.refresh_metrics)
+
+    def show_patient(self):
+        patient_id = self.patient_entry.get().strip()
+        patient = self.engine.patients.patient(patient_id)
+        self.patient_label.config(text=patient.summary() if patient is not None else f"Nothing received from {patient_id}")
+
+    def update_rule_stats(self):
+        rules = self.engine.rule_stats()
+        hits = ", ".join(f"{rule['name']} {rule['hits']}" for rule in rules if rule['hits'])
+        evaluated = sum(rule['evaluated'] for rule in rules)
+        cost_ns = sum(rule['cost_ms'] for rule in rules) * 1e6 / evaluated if evaluated else 0.0
+        self.rule_stats_label.config(
+            text=f"Rules: {hits or 'no hits'} | {evaluated} rule checks, {cost_ns:.0f} ns each")
+
+    def on_sample(self, topic, data, current_time):
+        # Counted here, logged as one line per drain
+        metric = metric_topic(topic)
+        self.received_counts[metric] = self.received_counts.get(metric, 0) + 1
+        if not self.display_handlers.dispatch(topic, topic, data):
+            self.log_message(f"Excluded data on unknown topic {topic}: {data}")
+
+    def on_anomaly(self, topic, data, current_time):
+        self.log_message(f"Wild data on {topic}: {data}")
+        self.logger.log(f"Excluded wild data on {topic} at {current_time}: {data}", "Anomalies")
+
+    def on_missed(self, topic, expected_at, missed_count):
+        self.mark_missed_message(topic, expected_at)
+
+    def on_error(self, topic, message):
+        self.log_message(message)
+
 
     def reset_graph(self):
         """Resets the graph to its initial empty state."""
@@ -223,70 +358,46 @@ class HealthSubscriber:
         
         self.canvas.draw()  # Redraw the canvas to show the cleared state
 
-    def is_wild_data(self, data, topic):
-        if topic == topics["Heart Rate"] and (data['heart_rate'] < 60 or data['heart_rate'] > 100):
-            return True
-        elif topic == topics["Blood Pressure"] and (data['blood_pressure'][0] > 180 or data['blood_pressure'][1] < 50):
-            return True
-        elif topic == topics["SpO2"] and (data['spO2'] < 85):
-            return True
-        return False
-
-    def mark_missed_message(self, topic, elapsed_time):
-        missed_time = self.last_received_time[topic] + expected_intervals[topic]
-        # Log the missed message
-        self.anomaly_log_text.insert(tk.END, f"Missed transmission detected for {topic} at {datetime.fromtimestamp(missed_time)}\n")
-        self.anomaly_log_text.see(tk.END)
-        # Append a special value (e.g., None) to mark a gap in the data queue
-        if topic in self.data_queues:
-            self.data_queues[topic].append((None, missed_time))
-
-    def update_display(self, topic, data):
-        # Dynamically update the label corresponding to the topic with new data
-        topic_name = next(key for key, value in topics.items() if value == topic)
-        if topic_name in self.topic_labels:
-            if topic == topics["Heart Rate"]:
-                self.topic_labels[topic_name].config(text=f"Heart Rate: {data['heart_rate']} bpm")
-            elif topic == topics["Blood Pressure"]:
-                systolic, diastolic = data['blood_pressure']
-                self.topic_labels[topic_name].config(text=f"Blood Pressure: {systolic}/{diastolic} mmHg")
-            elif topic == topics["SpO2"]:
-                self.topic_labels[topic_name].config(text=f"SpO2: {data['spO2']}%")
-
+    def mark_missed_message(self, topic, missed_time):
+        # Log the missed message; the engine has already stored a gap in the series
+        self.logger.log(f"Missed transmission detected for {topic} at {datetime.fromtimestamp(missed_time)}", "Anomalies")
         self.update_graph()
 
-    def update_graph(self):
-        # Ensure we process the correct queue lengths and handle potential empty queues
-        for topic, line in self.lines.items():
-            data_queue = self.data_queues[topic]
-            x_data = list(range(len(data_queue)))  # x data should be the index count of data points
-            y_data = [data[0] for data in data_queue if data is not None]  # y data from the queue, filtering out None
-
-            if len(x_data) != len(y_data):
-                # This should not happen, but in case it does, log an error or handle it.
-                print(f"Data length mismatch for topic {topic}: x_data {len(x_data)}, y_data {len(y_data)}")
-                continue  # Skip this iteration to avoid plotting errors
+    def display_updater(self, topic_name):
+        """Handler that shows a reading of one topic, from any patient, on that topic's label."""
+        label = self.topic_labels[topic_name]
+        text_for = self.display_formats[topics[topic_name]]
 
-            line.set_data(x_data, y_data)  # Update the line data
+        def update(topic, data):
+            patient_id, _ = split_patient_topic(topic)
+            label.config(text=text_for(data) if patient_id is None else f"{text_for(data)} ({patient_id})")
+        return update
 
-        # Adjust plot limits and refresh
-        self.ax.relim()  # Recalculate limits
-        self.ax.autoscale_view(True, True, True)  # Autoscale view to include all data
-        self.canvas.draw()  # Redraw the canvas to update the plot
+    def update_graph(self):
+        # Hand the latest series to the renderer; it draws at most CHART_MAX_FPS times a second
+        if self.chart is None:
+            return  # Still loading; setup_chart() draws the history when it is ready
+        pixels = int(self.ax.get_window_extent().width)
+        for topic in self.lines:
+            # Zero-copy view of the newest samples; missed transmissions are stored as NaN and plotted as gaps
+            _, y_data = self.data_queues[topic].tail(CHART_WINDOW_SAMPLES)
+            x_data = np.arange(len(y_data))  # x data should be the index count of data points
+            # Never push more than about two points per pixel to matplotlib
+            x_data, y_data = minmax_decimate(x_data, y_data, pixels)
+            self.chart.set_data(topic, x_data, y_data)
 
 
     def log_message(self, message):
-        """Log a message to the ScrolledText widget safely."""
-        if hasattr(self, 'log_text'):  
-            self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
-        else:
-            print(message)  
+        """Log a message to the ScrolledText widget safely (capped, written on the logger's tick)."""
+        self.logger.log(message, "Subscriber")
 
     def on_closing(self):
         """Called when the window is closed."""
-        self.client.disconnect() 
-        self.client.loop_stop() 
+        self.engine.close()
+        if self.aggregator_pool is not None:
+            self.aggregator_pool.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         self.master.destroy() 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+import argparse
+import time
+import Utils.group_7_config as config
+from Utils.group_7_metrics import start_metrics_server
+from Utils.group_7_topics import patient_filter
+from subscribers.group_7_sinks import sink_from_spec
+from subscribers.group_7_sharded_subscriber import SHARD_MODES, ShardedSubscriber
+from subscribers.group_7_subscriber_engine import SubscriberEngine
+from subscribers.group_7_timeseries_store import TimeSeriesStore
+from subscribers.group_7_window_aggregator import WindowAggregator, aggregate_pool, pool_publisher
+
+METRIC_TOPICS = [config.TOPIC_HEART_RATE, config.TOPIC_BLOOD_PRESSURE, config.TOPIC_OXYGEN_SATURATION]
+# The three global topics and the same metrics for every patient (health/+/<metric>)
+DEFAULT_TOPICS = METRIC_TOPICS + [patient_filter(topic) for topic in METRIC_TOPICS]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the health data subscriber without a GUI.")
+    parser.add_argument("--broker", default=config.MQTT_BROKER_URL, help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=config.MQTT_BROKER_PORT, help="MQTT broker port")
+    parser.add_argument("--topic", action="append", dest="topics",
+                        help="Topic filter to subscribe to (repeatable, wildcards allowed). "
+                             "Defaults to the three health topics, globally and per patient.")
+    parser.add_argument("--sink", action="append", dest="sinks",
+                        help="Where results go: stdout, file:PATH or sqlite:PATH (repeatable). Defaults to stdout.")
+    parser.add_argument("--history", type=int, default=50, help="Samples in the live window of each series")
+    parser.add_argument("--store", help="Directory for the memory-mapped time-series store. "
+                                        "Without it, stored samples are kept in memory only.")
+    parser.add_argument("--metrics-port", type=int, default=config.SUBSCRIBER_METRICS_PORT,
+                        help="Serve Prometheus metrics on 127.0.0.1 at this port (0: off)")
+    parser.add_argument("--workers", type=int, default=config.SUBSCRIBER_WORKERS,
+                        help="Worker processes to shard decoding and analysis over (0: run in this process)")
+    parser.add_argument("--shard-mode", default=config.SUBSCRIBER_SHARD_MODE, choices=SHARD_MODES,
+                        help="shared: MQTT shared subscription; hash: partition topics by hash")
+    parser.add_argument("--share-group", default=config.SUBSCRIBER_SHARE_GROUP, help="Shared subscription group name")
+    parser.add_argument("--aggregate", action="store_true", default=config.AGGREGATION_ENABLED,
+                        help=f"Publish windowed aggregates of every stream to {config.AGGREGATE_TOPIC_ROOT}/<window>/... "
+                             f"(windows: {', '.join(window['name'] for window in config.AGGREGATE_WINDOWS)})")
+    args = parser.parse_args(argv)
+    if args.aggregate and args.workers > 0:
+        parser.error("--aggregate needs --workers 0: sharded workers only report the latest sample of each topic")
+    return args
+
+
+def print_rejections(subscriber):
+    for topic, counts in subscriber.schema_stats().items():
+        if counts["rejected"]:
+            print(f"{topic}: {counts['rejected']} rejected, {counts['accepted']} accepted "
+                  f"(last: {counts['last_error']})")
+
+
+def run_sharded(args, sinks):
+    coordinator = ShardedSubscriber(sinks, workers=args.workers, mode=args.shard_mode, group=args.share_group,
+                                    history=args.history, host=args.broker, port=args.port, store_dir=args.store)
+    for topic in args.topics or DEFAULT_TOPICS:
+        coordinator.subscribe(topic)
+    coordinator.start()
+    try:
+        while True:
+            coordinator.poll()
+            coordinator.check_deadlines()
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("Subscriber is stopping...")
+    finally:
+        coordinator.close()
+        print_rejections(coordinator)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sinks = [sink_from_spec(spec) for spec in (args.sinks or ["stdout"])]
+    start_metrics_server(config.METRICS_HOST, args.metrics_port)
+    if args.workers > 0:
+        run_sharded(args, sinks)
+        return
+    store = None
+    if args.store:
+        store = TimeSeriesStore(args.store, window=args.history,
+                                segment_samples=config.TIMESERIES_SEGMENT_SAMPLES,
+                                retention_seconds=config.TIMESERIES_RETENTION_DAYS * 24 * 3600)
+    aggregator_pool = None
+    if args.aggregate:
+        # Aggregates go back to the broker on a connection of their own
+        aggregator_pool = aggregate_pool(args.broker, args.port)
+        aggregator = WindowAggregator(pool_publisher(aggregator_pool))
+        aggregator.start()
+        sinks.append(aggregator)
+    engine = SubscriberEngine(sinks, history=args.history, host=args.broker, port=args.port, store=store)
+    for topic in args.topics or DEFAULT_TOPICS:
+        engine.subscribe(topic)
+    engine.connect()
+    engine.watch_deadlines()
+    try:
+        engine.run_forever()
+    except KeyboardInterrupt:
+        print("Subscriber is stopping...")
+    finally:
+        engine.close()
+        if aggregator_pool is not None:
+            aggregator_pool.close()
+        print_rejections(engine)
+        if len(engine.patients):
+            print(f"{len(engine.patients)} patients tracked, {engine.patients.anomalous_count()} with an anomaly")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,44 @@
 import json
 import random
-import paho.mqtt.client as mqtt
+import time
 import Utils.group_7_config as config
 from Utils.group_7_SafeLogger import SafeLogger
+from Utils.group_7_metrics import get_registry
+from Utils.group_7_topics import patient_topic, qos_for
+from publishers.group_7_batcher import MessageBatcher
+from publishers.group_7_connection_pool import get_shared_pool, release_shared_pool
+
+PUBLISHED = get_registry().counter("publisher_messages_published_total",
+                                   "Samples handed to the MQTT client or the batcher", ["topic"])
 
 class BasePublisher:
-    def __init__(self, update_callback, logger, mqtt_topic):
+    def __init__(self, update_callback, logger, mqtt_topic, pool=None, patient_id=None):
         self.update_callback = update_callback
+        self.patient_id = patient_id
+        if patient_id:
+            # One publisher per patient and vital: health/<patient_id>/<metric>
+            mqtt_topic = patient_topic(mqtt_topic, patient_id)
         self.active = False
         self.transmissions_to_skip = 0
         self.logger = logger  
         self.mqtt_topic = mqtt_topic
+        self.qos = qos_for(mqtt_topic)
+        self.held_since = None  # perf_counter when the in-flight window filled up, while it stays full
+        self.batcher = None
+        self.shared_pool = pool is None  # Released in close(), so the last publisher closes it
+        self.pool = pool if pool is not None else get_shared_pool()
+        self.published_counter = PUBLISHED.labels(mqtt_topic)
         print(f"Logger received in {self.__class__.__name__}: {self.logger}")
 
         self.setup_mqtt_client()
+        if config.BATCHING_ENABLED:
+            self.enable_batching(config.BATCH_MAX_COUNT, config.BATCH_MAX_BYTES, config.BATCH_LINGER)
 
     def setup_mqtt_client(self):
-        self.client = mqtt.Client()
-        self.client.on_connect = self.on_connect
-        self.client.connect(config.MQTT_BROKER_URL, config.MQTT_BROKER_PORT, config.MQTT_KEEP_ALIVE_INTERVAL)
-        self.client.loop_start()
+        # The client is shared with the other publishers on the same pooled connection
+        self.connection = self.pool.acquire(self.mqtt_topic)
+        self.connection.add_connect_listener(self.on_connect)
+        self.client = self.connection.client
 
     def on_connect(self, client, userdata, flags, rc):
         label = self.__class__.__name__
@@ -28,6 +47,36 @@ class BasePublisher:
         else:
             self.logger.log(f"Connection failed with result code {rc}.", label)
 
+    def enable_batching(self, max_count=50, max_bytes=32768, linger=0.5):
+        """Group samples per topic into framed batch messages before publishing."""
+        if self.batcher is None:
+            self.batcher = MessageBatcher(self.connection.publish, max_count, max_bytes, linger)
+
+    def send(self, topic, payload):
+        """Publish an encoded sample, through the batching stage when it is enabled."""
+        self.published_counter.inc()
+        if self.batcher is not None:
+            self.batcher.add(topic, payload)
+        else:
+            self.connection.publish(topic, payload, self.qos)
+
+    def window_full(self):
+        """Backpressure check for the simulation engine: True while the connection's in-flight window is full."""
+        full = self.connection.window_full()
+        if full and self.held_since is None:
+            self.held_since = time.perf_counter()
+            self.report(f"In-flight window full ({self.connection.window} messages, QoS {self.qos}), "
+                        f"holding back samples")
+        elif not full and self.held_since is not None:
+            waited = time.perf_counter() - self.held_since
+            self.held_since = None
+            self.report(f"In-flight window has room again after {waited * 1000:.0f} ms")
+        return full
+
+    def report(self, message):
+        if self.update_callback is not None:
+            self.update_callback(message)
+
     def skip_transmissions(self, count):
         self.transmissions_to_skip += count
 
@@ -43,12 +92,27 @@ class BasePublisher:
     def publish_data(self, data, topic):
         if self.active and self.transmissions_to_skip <= 0:
             corrupted_data = self.potentially_corrupt_data(data)
-            self.client.publish(topic, json.dumps(corrupted_data))
+            self.send(topic, json.dumps(corrupted_data))
         elif self.transmissions_to_skip > 0:
             self.transmissions_to_skip -= 1
             self.logger.log(f"Skipped a transmission for {self.__class__.__name__}.")
 
     def stop(self):
         self.active = False
-        self.client.disconnect()  # Disconnect from the broker
-        self.logger.log(f"Disconnected from MQTT broker for {self.__class__.__name__}.")
\ No newline at end of file
+        if self.batcher is not None:
+            self.batcher.flush()
+        # Give the topic back to the pool; the shared client stays connected for the others
+        self.connection.remove_connect_listener(self.on_connect)
+        self.pool.release(self.mqtt_topic)
+        self.logger.log(f"Disconnected from MQTT broker for {self.__class__.__name__}.")
+
+    def close(self):
+        """Stop for good: besides stop(), flush the batcher, end its linger thread and
+        release the shared pool (other windows in the process may still use it)."""
+        self.stop()
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+        if self.shared_pool:
+            self.shared_pool = False
+            release_shared_pool()
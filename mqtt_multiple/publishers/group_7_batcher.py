@@ -0,0 +1,95 @@
+import threading
+import time
+from Utils.group_7_payload_codec import BATCH_ITEM_LAYOUT, BATCH_HEADER_LAYOUT, MAX_BATCH_COUNT, encode_batch
+
+
+class MessageBatcher:
+    """Collect samples per topic and publish them as one framed MQTT message.
+
+    A topic's batch is flushed when it reaches ``max_count`` samples, when adding
+    a sample would push it past ``max_bytes``, or when its oldest sample has
+    waited ``linger`` seconds. A single background thread handles the linger
+    deadlines for every topic.
+    """
+
+    def __init__(self, send, max_count=50, max_bytes=32768, linger=0.5):
+        self.send = send  # callable(topic, payload) that performs the actual publish
+        self.max_count = min(max_count, MAX_BATCH_COUNT)
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.pending = {}  # topic -> list of payloads
+        self.pending_bytes = {}  # topic -> framed size of the pending batch
+        self.deadlines = {}  # topic -> monotonic time the batch must go out by
+        self.condition = threading.Condition()
+        self.running = True
+        self.batches_sent = 0
+        self.samples_sent = 0
+        self.flusher = threading.Thread(target=self.flush_expired, name="MessageBatcher", daemon=True)
+        self.flusher.start()
+
+    def add(self, topic, payload):
+        """Queue one sample for ``topic``; may publish a full batch synchronously."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        item_size = BATCH_ITEM_LAYOUT.size + len(payload)
+        ready = []
+        with self.condition:
+            if topic in self.pending and self.pending_bytes[topic] + item_size > self.max_bytes:
+                ready.append((topic, self.take(topic)))
+            if topic not in self.pending:
+                self.pending[topic] = []
+                self.pending_bytes[topic] = BATCH_HEADER_LAYOUT.size
+                self.deadlines[topic] = time.monotonic() + self.linger
+                self.condition.notify()
+            self.pending[topic].append(payload)
+            self.pending_bytes[topic] += item_size
+            if len(self.pending[topic]) >= self.max_count or self.pending_bytes[topic] >= self.max_bytes:
+                ready.append((topic, self.take(topic)))
+        for batch_topic, payloads in ready:
+            self.publish_batch(batch_topic, payloads)
+
+    def take(self, topic):
+        """Remove and return the pending payloads for a topic. Caller holds the lock."""
+        self.pending_bytes.pop(topic)
+        self.deadlines.pop(topic)
+        return self.pending.pop(topic)
+
+    def publish_batch(self, topic, payloads):
+        self.send(topic, encode_batch(payloads))
+        self.batches_sent += 1
+        self.samples_sent += len(payloads)
+
+    def flush(self, topic=None):
+        """Publish pending samples now, for one topic or for all of them."""
+        with self.condition:
+            topics = [topic] if topic is not None else list(self.pending)
+            ready = [(t, self.take(t)) for t in topics if t in self.pending]
+        for batch_topic, payloads in ready:
+            self.publish_batch(batch_topic, payloads)
+
+    def flush_expired(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = time.monotonic()
+                expired = [topic for topic, deadline in self.deadlines.items() if deadline <= now]
+                ready = [(topic, self.take(topic)) for topic in expired]
+                if not ready:
+                    timeout = min(self.deadlines.values()) - now if self.deadlines else None
+                    self.condition.wait(timeout)
+                    continue
+            for batch_topic, payloads in ready:
+                self.publish_batch(batch_topic, payloads)
+
+    def close(self):
+        """Flush everything that is pending and stop the linger thread."""
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.flusher.join()
+
+    def pending_count(self):
+        with self.condition:
+            return sum(len(payloads) for payloads in self.pending.values())
@@ -0,0 +1,424 @@
+import os
+import random
+import threading
+import time
+import paho.mqtt.client as mqtt
+import Utils.group_7_config as config
+from Utils.group_7_metrics import get_registry
+from Utils.group_7_topics import qos_for
+from publishers.group_7_outbox import Outbox
+
+METRICS = get_registry()
+CONNECTED = METRICS.gauge("publisher_connection_up", "1 while the pooled MQTT client is connected", ["connection"])
+QUEUE_DEPTH = METRICS.gauge("publisher_connection_queue_depth",
+                            "Packets queued in paho but not yet written to the socket", ["connection"])
+IN_FLIGHT = METRICS.gauge("publisher_connection_in_flight", "Messages published but not yet acknowledged",
+                          ["connection"])
+DROPPED = METRICS.counter("publisher_messages_dropped_total", "MQTT messages the client refused to send", ["topic"])
+LOST = METRICS.counter("publisher_messages_lost_total",
+                       "QoS 0 messages still queued in the client when the connection dropped", ["connection"])
+ACK_SECONDS = METRICS.histogram("publisher_ack_seconds",
+                                "Publish to PUBACK/PUBCOMP (QoS 1/2), or to the socket write (QoS 0)",
+                                ["connection", "qos"])
+CONNECT_ATTEMPTS = METRICS.counter("publisher_connect_attempts_total", "Connection attempts, retries included",
+                                   ["connection"])
+OUTBOX_DEPTH = METRICS.gauge("publisher_outbox_depth", "Messages spooled to disk, waiting for the broker",
+                             ["connection"])
+OUTBOX_BYTES = METRICS.gauge("publisher_outbox_bytes", "Bytes spooled to disk, waiting for the broker",
+                             ["connection"])
+OUTBOX_DRAIN_RATE = METRICS.gauge("publisher_outbox_drain_rate",
+                                  "Spooled messages sent per second, over the last second", ["connection"])
+OUTBOX_SPOOLED = METRICS.counter("publisher_outbox_spooled_total", "Messages spooled while disconnected",
+                                 ["connection"])
+OUTBOX_DRAINED = METRICS.counter("publisher_outbox_drained_total", "Spooled messages sent after reconnecting",
+                                 ["connection"])
+OUTBOX_DROPPED = METRICS.counter("publisher_outbox_dropped_total", "Oldest spooled messages dropped when full",
+                                 ["connection"])
+
+LOOP_TIMEOUT = 1.0  # Seconds the network thread waits for socket activity
+DRAIN_INTERVAL = 0.02  # Shorter wait while the outbox is draining
+DRAIN_MAX_QUEUED = 1000  # Draining pauses while paho still holds this many unwritten packets
+
+
+class ReconnectBackoff:
+    """Exponential backoff with jitter: the delay doubles from ``min_delay`` up to
+    ``max_delay`` and a random fraction of up to ``jitter`` is taken off each one."""
+
+    def __init__(self, min_delay, max_delay, jitter):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.max_delay, self.min_delay * 2 ** min(self.attempts, 32))
+        self.attempts += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def reset(self):
+        self.attempts = 0
+
+
+class PooledConnection:
+    """One MQTT client shared by every publisher whose topics are assigned to it.
+
+    The connection runs its own network thread, which connects in the
+    background, reconnects with backoff after the broker goes away and drains
+    the outbox. Messages published while disconnected are spooled to the outbox
+    (when there is one) instead of being dropped.
+    """
+
+    def __init__(self, index, client, outbox=None, drain_rate=None, window=None):
+        self.index = index
+        self.client = client
+        self.outbox = outbox
+        self.window = window if window is not None else config.PUBLISH_WINDOW
+        self.drain_limit = drain_rate if drain_rate is not None else config.OUTBOX_DRAIN_RATE
+        self.topics = {}  # topic -> number of publishers using it
+        self.connect_listeners = []
+        self.connected = False
+        self.connect_args = None  # (flags, rc) from the last CONNACK
+        self.started = False
+        self.thread = None
+        self.closing = threading.Event()
+        self.backoff = ReconnectBackoff(config.RECONNECT_MIN_DELAY, config.RECONNECT_MAX_DELAY, config.RECONNECT_JITTER)
+        self.retry_at = None  # monotonic time of the next connection attempt while waiting
+        self.last_error = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.published = 0
+        self.sent_at = {}  # mid -> (perf_counter at publish, qos) until the ack arrives
+        self.early_acks = {}  # mid -> perf_counter of an ack that arrived before publish() returned
+        self.drain_allowance = 0.0
+        self.last_drain = time.monotonic()
+        self.drain_rate = 0.0  # Measured, messages/s
+        self.rate_started = time.monotonic()
+        self.rate_drained = 0
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        # paho queues QoS 1/2 messages beyond its own limit without telling anyone; keep it in step
+        self.client.max_inflight_messages_set(self.window)
+        self.ack_histograms = [ACK_SECONDS.labels(index, qos) for qos in range(3)]
+        self.lost_counter = LOST.labels(index)
+        self.attempts_counter = CONNECT_ATTEMPTS.labels(index)
+        self.spooled_counter = OUTBOX_SPOOLED.labels(index)
+        self.drained_counter = OUTBOX_DRAINED.labels(index)
+        self.outbox_dropped_counter = OUTBOX_DROPPED.labels(index)
+        CONNECTED.labels(index).set_function(lambda: int(self.connected))
+        QUEUE_DEPTH.labels(index).set_function(self.queue_depth)
+        IN_FLIGHT.labels(index).set_function(lambda: self.in_flight)
+        OUTBOX_DEPTH.labels(index).set_function(self.outbox_depth)
+        OUTBOX_BYTES.labels(index).set_function(lambda: self.outbox.bytes if self.outbox is not None else 0)
+        OUTBOX_DRAIN_RATE.labels(index).set_function(lambda: self.drain_rate)
+
+    def start(self, host, port, keepalive):
+        """Start the network thread, once per pooled client; returns without waiting for the broker."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self.thread = threading.Thread(target=self.run, args=(host, port, keepalive),
+                                       name=f"MqttConnection-{self.index}", daemon=True)
+        self.thread.start()
+
+    def run(self, host, port, keepalive):
+        socket_open = False
+        while not self.closing.is_set():
+            try:
+                socket_open = self.run_once(host, port, keepalive, socket_open)
+            except Exception as e:
+                # A failing callback must not end the thread: that would stop reconnects and draining for good
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.wait_before_retry()
+
+    def run_once(self, host, port, keepalive, socket_open):
+        """Connect, or run one pass of the network loop; returns whether the socket is open."""
+        if not socket_open:
+            self.attempts_counter.inc()
+            try:
+                self.client.connect(host, port, keepalive)
+            except OSError as e:
+                self.last_error = str(e)
+                self.wait_before_retry()
+                return False
+        rc = self.client.loop(DRAIN_INTERVAL if self.outbox_depth() else LOOP_TIMEOUT)
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            self.connected = False
+            if not self.closing.is_set():
+                self.last_error = mqtt.error_string(rc)
+                self.wait_before_retry()
+            return False
+        if self.connected and self.outbox_depth():
+            self.drain()
+        self.update_drain_rate()
+        return True
+
+    def wait_before_retry(self):
+        delay = self.backoff.next_delay()
+        self.retry_at = time.monotonic() + delay
+        self.closing.wait(delay)
+        self.retry_at = None
+
+    def add_connect_listener(self, listener):
+        """Register an ``on_connect(client, userdata, flags, rc)`` style callback."""
+        self.connect_listeners.append(listener)
+        if self.connected:
+            listener(self.client, None, *self.connect_args)
+
+    def remove_connect_listener(self, listener):
+        if listener in self.connect_listeners:
+            self.connect_listeners.remove(listener)
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        self.connected = rc == 0
+        self.connect_args = (flags, rc)
+        if rc == 0:
+            self.backoff.reset()
+            self.last_error = None
+            self.last_drain = time.monotonic()
+        else:
+            self.last_error = mqtt.connack_string(rc)
+        for listener in list(self.connect_listeners):
+            try:
+                listener(client, userdata, flags, rc)
+            except Exception as e:
+                # One publisher's callback must not keep the others from hearing about the connection
+                self.last_error = f"connect listener failed: {e}"
+
+    def on_disconnect(self, client, userdata, *args):
+        self.connected = False
+        self.drain_rate = 0.0
+        # paho resends unacknowledged QoS 1/2 messages after reconnecting, but QoS 0 ones are gone
+        with self.lock:
+            lost = [mid for mid, (_, qos) in self.sent_at.items() if qos == 0]
+            for mid in lost:
+                del self.sent_at[mid]
+            self.in_flight = max(0, self.in_flight - len(lost))
+            self.early_acks.clear()
+        if lost:
+            self.lost_counter.inc(len(lost))
+
+    def on_publish(self, client, userdata, mid, *args):
+        acked = time.perf_counter()
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            sent = self.sent_at.pop(mid, None)
+            if sent is None:
+                self.early_acks[mid] = acked
+        if sent is not None:
+            self.ack_histograms[sent[1]].observe(acked - sent[0])
+
+    def publish(self, topic, payload, qos=None):
+        """Send now, or spool to the outbox while disconnected.
+
+        Once connected, live messages go straight to the client while the outbox
+        drains behind them at drain_limit, so spooled messages may arrive after
+        newer ones. ``qos`` defaults to the topic's configured QoS (see
+        Utils/group_7_topics.py).
+        """
+        qos = qos if qos is not None else qos_for(topic)
+        if self.outbox is not None and not self.connected:
+            self.spool(topic, payload, qos)
+            return None
+        info = self.send(topic, payload, qos)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0 and self.outbox is not None:
+            # The connection dropped just now
+            self.spool(topic, payload, qos)
+        elif info.rc != mqtt.MQTT_ERR_SUCCESS and not (qos and info.rc == mqtt.MQTT_ERR_NO_CONN):
+            DROPPED.labels(topic).inc()
+        return info
+
+    def send(self, topic, payload, qos):
+        """Hand one message to the client and start timing its acknowledgement."""
+        with self.lock:
+            self.in_flight += 1
+            self.published += 1
+        sent = time.perf_counter()
+        info = self.client.publish(topic, payload, qos)
+        # paho keeps QoS 1/2 messages it could not send and delivers them after reconnecting
+        if info.rc != mqtt.MQTT_ERR_SUCCESS and not (qos and info.rc == mqtt.MQTT_ERR_NO_CONN):
+            with self.lock:
+                self.in_flight -= 1
+                self.published -= 1
+            return info
+        with self.lock:
+            acked = self.early_acks.pop(info.mid, None)
+            if acked is None:
+                self.sent_at[info.mid] = (sent, qos)
+        if acked is not None:
+            self.ack_histograms[qos].observe(acked - sent)
+        return info
+
+    def window_full(self):
+        """True while ``window`` messages are in flight; generators wait for room (see SimulationEngine)."""
+        return self.in_flight >= self.window
+
+    def spool(self, topic, payload, qos):
+        dropped = self.outbox.put(topic, payload, qos)
+        self.spooled_counter.inc()
+        if dropped:
+            self.outbox_dropped_counter.inc(dropped)
+
+    def drain(self):
+        """Hand spooled messages back to the client, at no more than drain_limit messages/s."""
+        now = time.monotonic()
+        burst = max(1.0, self.drain_limit * DRAIN_INTERVAL)
+        self.drain_allowance = min(burst, self.drain_allowance + (now - self.last_drain) * self.drain_limit)
+        self.last_drain = now
+        count = min(int(self.drain_allowance), DRAIN_MAX_QUEUED - self.queue_depth(), self.window - self.in_flight)
+        if count <= 0:
+            return
+        sent = 0
+        for record in self.outbox.peek(count):
+            info = self.send(record.topic, record.payload, record.qos)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                if record.qos and info.rc == mqtt.MQTT_ERR_NO_CONN:
+                    sent += 1  # paho holds on to it until the connection is back
+                break  # Disconnected again; the rest stays spooled
+            sent += 1
+        self.outbox.remove(sent)
+        self.drain_allowance -= sent
+        self.drained_counter.inc(sent)
+
+    def update_drain_rate(self):
+        now = time.monotonic()
+        if now - self.rate_started >= 1.0:
+            drained = self.outbox.drained if self.outbox is not None else 0
+            self.drain_rate = (drained - self.rate_drained) / (now - self.rate_started)
+            self.rate_started, self.rate_drained = now, drained
+
+    def outbox_depth(self):
+        return self.outbox.depth if self.outbox is not None else 0
+
+    def queue_depth(self):
+        """Packets paho has queued on this client but not yet written to the socket."""
+        out_packet = getattr(self.client, "_out_packet", None)
+        return len(out_packet) if out_packet is not None else 0
+
+    def stats(self):
+        retry_at = self.retry_at  # Read once: the network thread clears it when the wait ends
+        return {
+            "connection": self.index,
+            "connected": self.connected,
+            "topics": len(self.topics),
+            "published": self.published,
+            "in_flight": self.in_flight,
+            "window": self.window,
+            "queue_depth": self.queue_depth(),
+            "retry_in": max(0.0, retry_at - time.monotonic()) if retry_at is not None else None,
+            "last_error": self.last_error,
+            "outbox_depth": self.outbox_depth(),
+            "outbox_bytes": self.outbox.bytes if self.outbox is not None else 0,
+            "drain_rate": self.drain_rate,
+        }
+
+    def close(self):
+        self.closing.set()
+        self.client.disconnect()
+        if self.thread is not None:
+            self.thread.join(LOOP_TIMEOUT + 1)
+        if self.outbox is not None:
+            self.outbox.close()
+
+
+class MqttConnectionPool:
+    """Share a small, fixed number of MQTT clients between many publishers.
+
+    Each topic is pinned to one connection so its messages stay in order; new
+    topics go to the connection that currently carries the fewest topics.
+    Clients are created and connected lazily on first use. Each connection
+    spools to its own outbox segment, ``<outbox_dir>/<name>-<index>.g7tl``;
+    an empty ``outbox_dir`` turns spooling off. Processes that publish at the
+    same time need different names.
+    """
+
+    def __init__(self, size, host=None, port=None, keepalive=None, client_factory=mqtt.Client,
+                 name="publisher", outbox_dir=None):
+        self.size = max(1, size)
+        self.host = host if host is not None else config.MQTT_BROKER_URL
+        self.port = port if port is not None else config.MQTT_BROKER_PORT
+        self.keepalive = keepalive if keepalive is not None else config.MQTT_KEEP_ALIVE_INTERVAL
+        self.client_factory = client_factory
+        self.name = name
+        self.outbox_dir = outbox_dir if outbox_dir is not None else config.OUTBOX_DIR
+        self.connections = []
+        self.assignments = {}  # topic -> PooledConnection
+        self.lock = threading.Lock()
+
+    def acquire(self, topic):
+        """Return the connection that carries ``topic``, connecting it if needed."""
+        with self.lock:
+            connection = self.assignments.get(topic)
+            if connection is None:
+                if len(self.connections) < self.size:
+                    connection = PooledConnection(len(self.connections), self.client_factory(),
+                                                  self.new_outbox(len(self.connections)))
+                    self.connections.append(connection)
+                else:
+                    connection = min(self.connections, key=lambda c: len(c.topics))
+                self.assignments[topic] = connection
+            connection.topics[topic] = connection.topics.get(topic, 0) + 1
+        connection.start(self.host, self.port, self.keepalive)
+        return connection
+
+    def new_outbox(self, index):
+        if not self.outbox_dir:
+            return None
+        return Outbox(os.path.join(self.outbox_dir, f"{self.name}-{index}.g7tl"), config.OUTBOX_MAX_BYTES)
+
+    def release(self, topic):
+        """Drop one publisher's use of ``topic``; the shared client stays connected."""
+        with self.lock:
+            connection = self.assignments.get(topic)
+            if connection is None:
+                return
+            connection.topics[topic] -= 1
+            if connection.topics[topic] <= 0:
+                del connection.topics[topic]
+                del self.assignments[topic]
+
+    def wait_until_connected(self, timeout=5.0):
+        """Block until every connection has been accepted by the broker; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while not all(connection.connected for connection in self.connections):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        """Per-connection state and counters: topics, published, in flight, queue and outbox depth."""
+        return [connection.stats() for connection in self.connections]
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+shared_pool = None
+shared_pool_users = 0  # get_shared_pool() calls not yet matched by release_shared_pool()
+shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """Return the process-wide pool used by BasePublisher; pair every call with release_shared_pool()."""
+    global shared_pool, shared_pool_users
+    with shared_pool_lock:
+        if shared_pool is None:
+            shared_pool = MqttConnectionPool(config.MQTT_POOL_SIZE)
+        shared_pool_users += 1
+        return shared_pool
+
+
+def release_shared_pool():
+    """Drop one user of the process-wide pool. The last one closes it, keeping anything
+    still spooled for the next start; the next get_shared_pool() starts a fresh pool."""
+    global shared_pool, shared_pool_users
+    with shared_pool_lock:
+        shared_pool_users = max(0, shared_pool_users - 1)
+        if shared_pool_users:
+            return
+        pool, shared_pool = shared_pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from replay.group_7_traffic_log import LOG_HEADER, RECORD_HEAD, TrafficLogReader, TrafficLogWriter, TrafficRecord
+
+
+class Outbox:
+    """Bounded FIFO of messages waiting for a connection, spooled to a segment file on disk.
+
+    The segment is a traffic log (see replay/group_7_traffic_log.py), so messages
+    survive a restart of the publisher and a leftover segment can be inspected or
+    replayed with replay/group_7_traffic_replayer.py. When more than ``max_bytes``
+    are waiting the oldest messages are dropped. The file is created on the first
+    spooled message and emptied again once everything has been drained. Messages
+    drained just before a crash are still in the file, so delivery is at least once.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.writer = None
+        self.reader = None  # Binary file handle positioned independently of the writer
+        self.read_offset = LOG_HEADER.size
+        self.depth = 0  # Messages waiting
+        self.bytes = 0  # Record bytes waiting
+        self.spooled = 0
+        self.drained = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > LOG_HEADER.size:
+            # Pick up what an earlier run could not deliver
+            self.open()
+            for record in TrafficLogReader(path):
+                self.depth += 1
+                self.bytes += record_size(record.topic.encode(), record.payload)
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.writer = TrafficLogWriter(self.path)
+        self.reader = open(self.path, "rb")
+        self.read_offset = LOG_HEADER.size
+
+    def put(self, topic, payload, qos=0):
+        """Spool one message; drops the oldest ones if the outbox is full and returns how many."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self.lock:
+            if self.writer is None:
+                self.open()
+            self.writer.append(time.time_ns(), topic, payload, qos)
+            self.depth += 1
+            self.spooled += 1
+            self.bytes += record_size(topic.encode(), payload)
+            dropped = 0
+            while self.bytes > self.max_bytes and self.depth > 1:
+                self.skip(1)
+                dropped += 1
+            self.dropped += dropped
+            if self.read_offset - LOG_HEADER.size > self.max_bytes:
+                self.compact()
+            return dropped
+
+    def peek(self, count):
+        """Up to ``count`` of the oldest messages, without removing them."""
+        with self.lock:
+            if not self.depth:
+                return []
+            self.writer.flush()
+            records = []
+            offset = self.read_offset
+            for _ in range(min(count, self.depth)):
+                record, offset = self.read_record(offset)
+                records.append(record)
+            return records
+
+    def remove(self, count):
+        """Forget the ``count`` oldest messages once they have been handed to the client."""
+        with self.lock:
+            count = min(count, self.depth)
+            self.skip(count)
+            self.drained += count
+            if not self.depth:
+                # Everything is out: start the segment over instead of letting it grow
+                self.writer.flush()
+                self.writer.file.truncate(LOG_HEADER.size)
+                self.read_offset = LOG_HEADER.size
+                self.bytes = 0
+            elif self.read_offset - LOG_HEADER.size > self.max_bytes:
+                self.compact()
+
+    def read_record(self, offset):
+        self.reader.seek(offset)
+        received_ns, topic_length, payload_length, qos = RECORD_HEAD.unpack(self.reader.read(RECORD_HEAD.size))
+        topic = self.reader.read(topic_length).decode()
+        payload = self.reader.read(payload_length)
+        return TrafficRecord(received_ns, topic, payload, qos), offset + RECORD_HEAD.size + topic_length + payload_length
+
+    def skip(self, count):
+        if count and self.depth:
+            self.writer.flush()
+        for _ in range(count):
+            self.reader.seek(self.read_offset)
+            _, topic_length, payload_length, _ = RECORD_HEAD.unpack(self.reader.read(RECORD_HEAD.size))
+            length = RECORD_HEAD.size + topic_length + payload_length
+            self.read_offset += length
+            self.bytes -= length
+            self.depth -= 1
+
+    def compact(self):
+        """Rewrite the segment without the records that were dropped or drained."""
+        self.writer.flush()
+        self.reader.seek(0)
+        header = self.reader.read(LOG_HEADER.size)
+        self.reader.seek(self.read_offset)
+        waiting = self.reader.read()
+        self.writer.close()
+        self.reader.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as segment:
+            segment.write(header)
+            segment.write(waiting)
+        os.replace(temporary, self.path)
+        self.open()
+
+    def close(self):
+        """Flush what is waiting to disk, so the next run can send it (and only that)."""
+        with self.lock:
+            if self.writer is not None:
+                if self.read_offset > LOG_HEADER.size:
+                    # The next run counts every record after the header as waiting
+                    self.compact()
+                self.writer.close()
+                self.reader.close()
+                self.writer = None
+
+    def stats(self):
+        return {"depth": self.depth, "bytes": self.bytes, "spooled": self.spooled,
+                "drained": self.drained, "dropped": self.dropped}
+
+
+def record_size(topic_bytes, payload):
+    return RECORD_HEAD.size + len(topic_bytes) + len(payload)
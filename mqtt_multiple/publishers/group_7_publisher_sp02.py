@@ -1,22 +1,26 @@
-import threading
 from publishers.group_7_basepublisher import BasePublisher
 from data_generators.group_7_data_generator_sp02 import Sp02DataGenerator
+from data_generators.group_7_simulation_engine import get_shared_engine
+from Utils.group_7_payload_codec import payload_format_for
 
 class SpO2Publisher(BasePublisher):
-    def __init__(self, update_callback, logger, mqtt_topic):
-        super().__init__(update_callback, logger, mqtt_topic)
+    def __init__(self, update_callback, logger, mqtt_topic, pool=None, patient_id=None):
+        super().__init__(update_callback, logger, mqtt_topic, pool, patient_id)
         self.logger = logger
         self.active = False
-        self.topic = mqtt_topic
+        self.topic = self.mqtt_topic
         self.publish_interval = 5
         self.data_generator = Sp02DataGenerator(self.publish_data, self.publish_interval)
+        self.data_generator.payload_format = payload_format_for(self.mqtt_topic)
+        self.data_generator.blocked = self.window_full  # Backpressure from the connection's in-flight window
+        self.engine = get_shared_engine()
 
     def publish_data(self, data):
         """Callback to publish data using MQTT."""
         if self.active:
             try:
-                self.client.publish(self.topic, data)
-                self.logger.log(f"Published data: {data}", "SpO2")
+                self.send(self.topic, data)
+                self.logger.log(f"Published data (QoS {self.qos}): {data}", "SpO2")
             except Exception as e:
                 self.logger.log(f"Corrupted data detected, not published", "SpO2", tag="error")
 
@@ -27,22 +31,23 @@ class SpO2Publisher(BasePublisher):
             self.logger.log(f"Attempting to start data generation with interval: {self.publish_interval}", "SpO2")
             self.data_generator.active = True
             self.logger.log("Starting data generation and publisher...", "SpO2")
-            thread = threading.Thread(target=self.data_generator.generate_data)
-            thread.daemon = True
-            thread.start()
+            self.engine.add_device(self.data_generator)
             self.logger.log("Data generation started.", "SpO2")
 
     def stop(self):
         """Stop the data generation and publishing process."""
         self.data_generator.active = False
+        self.engine.remove_device(self.data_generator)
         self.active = False
+        if self.batcher is not None:
+            self.batcher.flush(self.topic)
         self.logger.log("Stopping data generation...", "SpO2")
 
     def send_wild_data(self):
         """Send wild data to the callback function."""
         try:
-            wild_data = self.data_generator.send_wild_data()
-            self.client.publish(self.topic, wild_data)
+            # The generator hands the wild reading to publish_data itself
+            self.data_generator.send_wild_data()
             self.logger.log(f"Publisher sent wild data", "SpO2", tag="error")
         except Exception as e:
             self.logger.log(f"Unexpected error publishing wild data: {str(e)}", "SpO2", tag="error")
@@ -0,0 +1,127 @@
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+# File layout: a 16-byte header (magic, version, reserved, creation time in epoch
+# nanoseconds), then records appended back to back. Each record is a fixed
+# 15-byte head (receive time in epoch nanoseconds, topic length, payload length,
+# QoS) followed by the UTF-8 topic and the raw payload bytes. A record cut short
+# by a crash is ignored when reading.
+LOG_MAGIC = b"G7TL"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct("<4sHHQ")
+RECORD_HEAD = struct.Struct("<QHIB")
+
+TrafficRecord = namedtuple("TrafficRecord", ["received_ns", "topic", "payload", "qos"])
+
+
+class TrafficLogWriter:
+    """Append-only writer for a traffic log; an existing log is appended to."""
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        existing = os.path.exists(path) and os.path.getsize(path) >= LOG_HEADER.size
+        if existing:
+            # Drop a record torn by an earlier crash, so new records stay aligned
+            complete = TrafficLogReader(path).complete_size()
+            if complete < os.path.getsize(path):
+                os.truncate(path, complete)
+        self.file = open(path, "ab")
+        if not existing:
+            self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, 0, time.time_ns()))
+        self.records = 0
+        self.bytes = 0
+        self.last_flush = time.monotonic()
+
+    def append(self, received_ns, topic, payload, qos=0):
+        topic_bytes = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.file.write(RECORD_HEAD.pack(received_ns, len(topic_bytes), len(payload), qos))
+        self.file.write(topic_bytes)
+        self.file.write(payload)
+        self.records += 1
+        self.bytes += RECORD_HEAD.size + len(topic_bytes) + len(payload)
+        # Buffered writes; at most flush_interval seconds of traffic is lost on a crash
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.flush()
+            self.file.close()
+
+
+def read_header(header, path):
+    if len(header) < LOG_HEADER.size:
+        raise ValueError(f"{path} is too short to be a traffic log")
+    magic, version, _, created_ns = LOG_HEADER.unpack(header)
+    if magic != LOG_MAGIC:
+        raise ValueError(f"{path} is not a traffic log")
+    if version != LOG_VERSION:
+        raise ValueError(f"{path} has unsupported traffic log version {version}")
+    return created_ns
+
+
+class TrafficLogReader:
+    """Reads the records of a traffic log in file order through a memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as log:
+            self.created_ns = read_header(log.read(LOG_HEADER.size), path)
+
+    def __iter__(self):
+        with open(self.path, "rb") as log:
+            size = os.fstat(log.fileno()).st_size
+            if size <= LOG_HEADER.size:
+                return
+            with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                topics = {}  # Topic bytes -> str, decoded once per distinct topic
+                offset = LOG_HEADER.size
+                while offset + RECORD_HEAD.size <= size:
+                    received_ns, topic_length, payload_length, qos = RECORD_HEAD.unpack_from(data, offset)
+                    start = offset + RECORD_HEAD.size
+                    end = start + topic_length + payload_length
+                    if end > size:
+                        break  # Torn final record
+                    raw_topic = data[start:start + topic_length]
+                    topic = topics.get(raw_topic)
+                    if topic is None:
+                        topic = topics[raw_topic] = raw_topic.decode()
+                    yield TrafficRecord(received_ns, topic, data[start + topic_length:end], qos)
+                    offset = end
+
+    def complete_size(self):
+        """Bytes up to the end of the last complete record."""
+        with open(self.path, "rb") as log:
+            size = os.fstat(log.fileno()).st_size
+            offset = LOG_HEADER.size
+            while offset + RECORD_HEAD.size <= size:
+                log.seek(offset)
+                _, topic_length, payload_length, _ = RECORD_HEAD.unpack(log.read(RECORD_HEAD.size))
+                end = offset + RECORD_HEAD.size + topic_length + payload_length
+                if end > size:
+                    break
+                offset = end
+            return min(offset, size)
+
+    def summary(self):
+        """Record count, distinct topics, first and last receive time (ns) and total payload bytes."""
+        count, payload_bytes, first, last = 0, 0, None, None
+        topics = set()
+        for record in self:
+            count += 1
+            payload_bytes += len(record.payload)
+            topics.add(record.topic)
+            first = record.received_ns if first is None else first
+            last = record.received_ns
+        return {"records": count, "topics": sorted(topics), "first_ns": first, "last_ns": last,
+                "payload_bytes": payload_bytes}
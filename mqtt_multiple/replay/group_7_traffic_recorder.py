@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from paho.mqtt import client as mqtt_client
+
+# Run from anywhere: the modules below import each other relative to mqtt_multiple/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Utils.group_7_config as config
+from replay.group_7_traffic_log import TrafficLogWriter
+
+
+class TrafficRecorder:
+    """Subscribes to topic filters and appends every message, with its receive time, to a traffic log."""
+
+    def __init__(self, path, filters=("health/#",), host=None, port=None, client_factory=mqtt_client.Client):
+        self.writer = TrafficLogWriter(path)
+        self.filters = list(filters)
+        self.host = host if host is not None else config.MQTT_BROKER_URL
+        self.port = port if port is not None else config.MQTT_BROKER_PORT
+        self.client = client_factory()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.lock = threading.Lock()  # paho's thread appends while stop() closes the log
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        if rc != 0:
+            print(f"Failed to connect, return code {rc}")
+            return
+        for topic_filter in self.filters:
+            client.subscribe(topic_filter)
+
+    def on_message(self, client, userdata, msg):
+        received_ns = time.time_ns()
+        with self.lock:
+            if not self.writer.file.closed:
+                self.writer.append(received_ns, msg.topic, msg.payload, msg.qos)
+
+    def start(self):
+        self.client.connect(self.host, self.port, config.MQTT_KEEP_ALIVE_INTERVAL)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+        with self.lock:
+            self.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record MQTT traffic to an append-only binary log.")
+    parser.add_argument("output", help="Traffic log to write (appended to if it exists)")
+    parser.add_argument("--filter", action="append", dest="filters",
+                        help="Topic filter to record (repeatable, default health/#)")
+    parser.add_argument("--broker", default=config.MQTT_BROKER_URL, help="Broker host")
+    parser.add_argument("--port", type=int, default=config.MQTT_BROKER_PORT, help="Broker port")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0: until Ctrl+C)")
+    args = parser.parse_args(argv)
+
+    recorder = TrafficRecorder(args.output, args.filters or ["health/#"], args.broker, args.port)
+    recorder.start()
+    print(f"Recording {', '.join(recorder.filters)} to {args.output}")
+    started = time.monotonic()
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(min(1.0, args.duration or 1.0))
+            print(f"{recorder.writer.records} messages, {recorder.writer.bytes / 1e6:.1f} MB", end="\r")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+    print(f"\nRecorded {recorder.writer.records} messages ({recorder.writer.bytes / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+# Run from anywhere: the modules below import each other relative to mqtt_multiple/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Utils.group_7_config as config
+from Utils.group_7_topics import metric_topic, patient_id_for, patient_topic
+from publishers.group_7_connection_pool import MqttConnectionPool
+from replay.group_7_traffic_log import TrafficLogReader
+
+# Waits shorter than this are skipped: sleeping that briefly overshoots anyway,
+# and a recorded burst should go out as a burst
+MIN_SLEEP = 0.001
+
+
+class TrafficReplayer:
+    """Republishes recorded traffic with its original timing, scaled by ``speed``.
+
+    ``speed`` 1 replays in real time, N replays N times faster and 0 publishes
+    as fast as possible. With ``patients`` > 0 every record is published once
+    per synthetic patient, on health/<patient_id>/<metric> (see
+    Utils/group_7_topics.py), so one recording can load many patient streams.
+    Payloads are sent byte for byte as recorded, so two replays of a log are
+    the same input. ``loops`` replays the log several times back to back.
+    """
+
+    def __init__(self, records, publish, speed=1.0, patients=0, loops=1):
+        self.records = records  # Re-iterable, e.g. a TrafficLogReader
+        self.publish = publish  # callable(topic, payload, qos)
+        self.speed = speed
+        self.patients = patients
+        self.loops = loops
+        self.fanned_topics = {}  # topic -> topics it is published on
+        self.stats = {"records": 0, "published": 0, "seconds": 0.0, "max_lag_ms": 0.0}
+
+    def topics_for(self, topic):
+        topics = self.fanned_topics.get(topic)
+        if topics is None:
+            if self.patients > 0:
+                # A recorded per-patient topic is fanned out from its metric topic, not nested
+                metric = metric_topic(topic)
+                topics = [patient_topic(metric, patient_id_for(index)) for index in range(self.patients)]
+            else:
+                topics = [topic]
+            self.fanned_topics[topic] = topics
+        return topics
+
+    def run(self, stop=None):
+        """Replay until done or ``stop`` (a threading.Event) is set; returns the stats."""
+        stop = stop if stop is not None else threading.Event()
+        started = time.perf_counter()
+        loop_offset_ns = 0
+        for _ in range(self.loops):
+            first_ns = last_ns = None
+            for record in self.records:
+                if stop.is_set():
+                    break
+                if first_ns is None:
+                    first_ns = record.received_ns
+                last_ns = record.received_ns
+                if self.speed:
+                    due = (loop_offset_ns + record.received_ns - first_ns) / 1e9 / self.speed
+                    wait = due - (time.perf_counter() - started)
+                    if wait > MIN_SLEEP:
+                        time.sleep(wait)
+                    elif wait < 0:
+                        self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], -wait * 1000)
+                for topic in self.topics_for(record.topic):
+                    self.publish(topic, record.payload, record.qos)
+                    self.stats["published"] += 1
+                self.stats["records"] += 1
+            if first_ns is None or stop.is_set():
+                break
+            loop_offset_ns += last_ns - first_ns
+        self.stats["seconds"] = time.perf_counter() - started
+        return self.stats
+
+
+def parse_speed(text):
+    """"max" (or 0) for as fast as possible, otherwise a multiple of real time such as 1, 10 or 0.5."""
+    if text.lower() in ("max", "0"):
+        return 0.0
+    speed = float(text.lower().rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive, or 'max'")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Republish a recorded traffic log.")
+    parser.add_argument("log", help="Traffic log written by replay/group_7_traffic_recorder.py")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1 (real time), N or Nx, or max")
+    parser.add_argument("--patients", type=int, default=0,
+                        help="Fan every record out to this many synthetic patient topics (0: original topics)")
+    parser.add_argument("--loops", type=int, default=1, help="Replay the log this many times")
+    parser.add_argument("--broker", default=config.MQTT_BROKER_URL, help="Broker host")
+    parser.add_argument("--port", type=int, default=config.MQTT_BROKER_PORT, help="Broker port")
+    parser.add_argument("--pool-size", type=int, default=config.MQTT_POOL_SIZE, help="MQTT connections to publish on")
+    args = parser.parse_args(argv)
+
+    reader = TrafficLogReader(args.log)
+    summary = reader.summary()
+    if not summary["records"]:
+        print(f"{args.log} holds no records")
+        return
+    span = (summary["last_ns"] - summary["first_ns"]) / 1e9
+    print(f"{summary['records']} records over {span:.1f} s on {len(summary['topics'])} topics")
+
+    # A replay is a fresh input: no outbox, so nothing is throttled through the spool or left over for the next run
+    pool = MqttConnectionPool(args.pool_size, host=args.broker, port=args.port, name="replayer", outbox_dir="")
+    connections = {}
+
+    def publish(topic, payload, qos):
+        connection = connections.get(topic)
+        if connection is None:
+            connection = connections[topic] = pool.acquire(topic)
+        connection.publish(topic, payload, qos)
+
+    replayer = TrafficReplayer(reader, publish, args.speed, args.patients, args.loops)
+    # Open every connection before the clock starts
+    for topic in summary["topics"]:
+        for fanned in replayer.topics_for(topic):
+            connections[fanned] = pool.acquire(fanned)
+    if not pool.wait_until_connected():
+        print(f"Could not connect to {args.broker}:{args.port}")
+        pool.close()
+        return
+    stop = threading.Event()
+    started = time.perf_counter()
+    try:
+        stats = replayer.run(stop)
+    except KeyboardInterrupt:
+        stop.set()
+        stats = replayer.stats
+    finally:
+        # Wait until the network threads have written out (QoS 0) or had acknowledged (QoS 1/2) every message
+        deadline = time.monotonic() + 10
+        while any(c["queue_depth"] or c["in_flight"] for c in pool.stats()) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        delivered_seconds = time.perf_counter() - started
+        pool.close()
+    rate = stats["published"] / delivered_seconds if delivered_seconds else 0.0
+    print(f"Delivered {stats['published']} messages from {stats['records']} records in {delivered_seconds:.2f} s "
+          f"({rate:.0f} msgs/s; handed to the client in {stats['seconds']:.2f} s, max lag {stats['max_lag_ms']:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import math
+import time
+import numpy as np
+
+# Batches up to this size are checked value by value: numpy's per-call overhead
+# outweighs vectorising a handful of samples
+SCALAR_BATCH_LIMIT = 8
+
+
+class ThresholdRule:
+    """Flags values below ``below`` or above ``above`` (either may be omitted)."""
+
+    kind = "threshold"
+
+    def __init__(self, name, field, below=None, above=None):
+        self.name = name
+        self.field = field
+        self.below = -np.inf if below is None else below
+        self.above = np.inf if above is None else above
+
+    def evaluate(self, values, previous_values, elapsed, streams):
+        return (values < self.below) | (values > self.above)
+
+    def check(self, value, previous_value, elapsed, stream):
+        return value < self.below or value > self.above
+
+    def update(self, values, streams):
+        pass
+
+    def update_one(self, value, stream):
+        pass
+
+
+class RateOfChangeRule:
+    """Flags a change of more than ``max_change`` per second since the stream's previous sample."""
+
+    kind = "rate"
+
+    def __init__(self, name, field, max_change):
+        self.name = name
+        self.field = field
+        self.max_change = max_change
+
+    def evaluate(self, values, previous_values, elapsed, streams):
+        # Samples that arrive together are compared as if one second apart
+        rate = np.abs(values - previous_values) / np.where(elapsed > 0, elapsed, 1.0)
+        return rate > self.max_change  # NaN (no previous sample) compares False
+
+    def check(self, value, previous_value, elapsed, stream):
+        return abs(value - previous_value) / (elapsed if elapsed > 0 else 1.0) > self.max_change
+
+    def update(self, values, streams):
+        pass
+
+    def update_one(self, value, stream):
+        pass
+
+
+class ZScoreRule:
+    """Flags values more than ``threshold`` standard deviations from the stream's own baseline.
+
+    The baseline is an exponentially weighted mean and variance over roughly the
+    last ``window`` accepted samples of each stream, so every patient is judged
+    against their own normal. Nothing is flagged until a stream has ``min_samples``.
+    """
+
+    kind = "zscore"
+
+    def __init__(self, name, field, threshold=4.0, window=300, min_samples=30):
+        self.name = name
+        self.field = field
+        self.threshold = threshold
+        self.decay = 1.0 - 1.0 / window
+        self.min_samples = min_samples
+        self.weight = np.zeros(0)
+        self.total = np.zeros(0)
+        self.total_squares = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+
+    def grow(self, stream_count):
+        extra = stream_count - len(self.weight)
+        if extra > 0:
+            self.weight = np.concatenate([self.weight, np.zeros(extra)])
+            self.total = np.concatenate([self.total, np.zeros(extra)])
+            self.total_squares = np.concatenate([self.total_squares, np.zeros(extra)])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+
+    def evaluate(self, values, previous_values, elapsed, streams):
+        weight = self.weight[streams]
+        ready = (self.count[streams] >= self.min_samples) & (weight > 0)
+        safe_weight = np.where(ready, weight, 1.0)
+        mean = self.total[streams] / safe_weight
+        variance = np.maximum(self.total_squares[streams] / safe_weight - mean ** 2, 1e-9)
+        return ready & (np.abs(values - mean) > self.threshold * np.sqrt(variance))
+
+    def check(self, value, previous_value, elapsed, stream):
+        weight = self.weight[stream]
+        if self.count[stream] < self.min_samples or weight <= 0:
+            return False
+        mean = self.total[stream] / weight
+        variance = max(self.total_squares[stream] / weight - mean * mean, 1e-9)
+        return abs(value - mean) > self.threshold * math.sqrt(variance)
+
+    def update_one(self, value, stream):
+        self.weight[stream] = self.weight[stream] * self.decay + 1.0
+        self.total[stream] = self.total[stream] * self.decay + value
+        self.total_squares[stream] = self.total_squares[stream] * self.decay + value * value
+        self.count[stream] += 1
+
+    def update(self, values, streams):
+        """Fold accepted samples, at most one per stream, into each stream's baseline."""
+        self.weight[streams] = self.weight[streams] * self.decay + 1.0
+        self.total[streams] = self.total[streams] * self.decay + values
+        self.total_squares[streams] = self.total_squares[streams] * self.decay + values ** 2
+        self.count[streams] += 1
+
+
+RULE_KINDS = {
+    "threshold": ThresholdRule,
+    "rate": RateOfChangeRule,
+    "zscore": ZScoreRule,
+}
+
+
+def compile_rule(spec):
+    """Build a rule from one config entry, e.g. {"name": ..., "kind": "threshold", "field": ..., "above": 100}."""
+    options = dict(spec)
+    kind = options.pop("kind", "threshold")
+    if kind not in RULE_KINDS:
+        raise ValueError(f"Unknown anomaly rule kind '{kind}' in rule {spec.get('name')}")
+    return RULE_KINDS[kind](**options)
+
+
+class AnomalyRuleEngine:
+    """Evaluates a table of anomaly rules over batches of samples at once.
+
+    A sample is (stream, field, value, time in seconds): the stream identifies
+    the patient or device the value belongs to, the field which vital it is
+    (``heart_rate``, ``systolic``...). Rules are compiled once; each batch is
+    turned into arrays and every rule runs as one vectorised expression over the
+    samples of its field; when a stream has several samples in the batch, the
+    k-th sample of every stream is checked in round k. Rate-of-change and z-score
+    rules compare against state kept per (stream, field), which only accepted
+    samples update, so wild data never drags a baseline along with it and a
+    sample is flagged the same whatever batch it arrives in.
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule if hasattr(rule, "evaluate") else compile_rule(rule) for rule in rules]
+        self.fields = sorted({rule.field for rule in self.rules})
+        self.field_rules = {field: [index for index, rule in enumerate(self.rules) if rule.field == field]
+                            for field in self.fields}
+        self.stream_ids = {}  # (stream, field) -> index into the state arrays
+        self.last_value = np.zeros(0)
+        self.last_time = np.zeros(0)
+        self.hits = np.zeros(len(self.rules), dtype=np.int64)
+        self.evaluated = np.zeros(len(self.rules), dtype=np.int64)
+        self.cost_ns = np.zeros(len(self.rules), dtype=np.int64)
+        self.batches = 0
+        self.samples = 0
+
+    def stream_index(self, stream, field):
+        key = (stream, field)
+        index = self.stream_ids.get(key)
+        if index is None:
+            index = self.stream_ids[key] = len(self.stream_ids)
+        return index
+
+    def grow(self):
+        extra = len(self.stream_ids) - len(self.last_value)
+        if extra > 0:
+            self.last_value = np.concatenate([self.last_value, np.full(extra, np.nan)])
+            self.last_time = np.concatenate([self.last_time, np.full(extra, np.nan)])
+        for rule in self.rules:
+            if hasattr(rule, "grow"):
+                rule.grow(len(self.stream_ids))
+
+    def evaluate(self, samples):
+        """Flag a batch of (stream, field, value, time) samples.
+
+        Returns an (n_samples, n_rules) boolean array of rule hits; fields without
+        rules are never flagged. Samples of one stream must be in time order.
+        """
+        count = len(samples)
+        hits = np.zeros((count, len(self.rules)), dtype=bool)
+        if not count:
+            return hits
+        stream_list = []
+        by_field = {}
+        for position, (stream, field, _, _) in enumerate(samples):
+            stream_list.append(self.stream_index(stream, field))
+            by_field.setdefault(field, []).append(position)
+        self.grow()
+        if count <= SCALAR_BATCH_LIMIT:
+            self.evaluate_scalar(samples, stream_list, hits)
+            return hits
+        streams = np.array(stream_list, dtype=np.int64)
+        values = np.array([sample[2] for sample in samples], dtype=float)
+        times = np.array([sample[3] for sample in samples], dtype=float)
+        if len(set(stream_list)) == count:
+            self.evaluate_round(np.arange(count), by_field, streams, values, times, hits)
+        else:
+            # A sample is judged against the previous *accepted* sample of its stream, so the
+            # k-th sample of every stream is evaluated in round k, after the earlier ones updated the state
+            order = np.argsort(streams, kind='stable')
+            _, starts, counts = np.unique(streams[order], return_index=True, return_counts=True)
+            rounds = int(counts.max())
+            if rounds * SCALAR_BATCH_LIMIT > count:
+                # Rounds this small cost more in numpy overhead than checking value by value
+                self.evaluate_scalar(samples, stream_list, hits)
+                return hits
+            rank = np.empty(count, dtype=np.int64)
+            rank[order] = np.arange(count) - np.repeat(starts, counts)
+            fields = [sample[1] for sample in samples]
+            for round_number in range(rounds):
+                positions = np.flatnonzero(rank == round_number)
+                round_fields = {}
+                for position in positions.tolist():
+                    round_fields.setdefault(fields[position], []).append(position)
+                self.evaluate_round(positions, round_fields, streams, values, times, hits)
+        self.batches += 1
+        self.samples += count
+        return hits
+
+    def evaluate_round(self, positions, by_field, streams, values, times, hits):
+        """Vectorised checks of samples at ``positions``, which belong to distinct streams."""
+        for field, field_positions in by_field.items():
+            rule_indexes = self.field_rules.get(field)
+            if not rule_indexes:
+                continue
+            selected = positions if len(field_positions) == len(positions) else np.array(field_positions)
+            field_values, field_times, field_streams = values[selected], times[selected], streams[selected]
+            field_previous = self.last_value[field_streams]
+            field_elapsed = field_times - self.last_time[field_streams]
+            for index in rule_indexes:
+                started = time.perf_counter_ns()
+                rule_hits = self.rules[index].evaluate(field_values, field_previous, field_elapsed, field_streams)
+                hits[selected, index] = rule_hits
+                self.cost_ns[index] += time.perf_counter_ns() - started
+                self.evaluated[index] += len(field_positions)
+                self.hits[index] += int(np.count_nonzero(rule_hits))
+            keep = ~hits[selected].any(axis=1)
+            for index in rule_indexes:
+                self.rules[index].update(field_values[keep], field_streams[keep])
+            # The accepted sample becomes the stream's reference for rate-of-change
+            self.last_value[field_streams[keep]] = field_values[keep]
+            self.last_time[field_streams[keep]] = field_times[keep]
+
+    def evaluate_scalar(self, samples, streams, hits):
+        """Same checks as evaluate(), one sample at a time in arrival order."""
+        for position, ((_, field, value, timestamp), stream) in enumerate(zip(samples, streams)):
+            rule_indexes = self.field_rules.get(field)
+            if not rule_indexes:
+                continue
+            previous_value = self.last_value[stream]
+            elapsed = timestamp - self.last_time[stream]
+            wild = False
+            for index in rule_indexes:
+                started = time.perf_counter_ns()
+                hit = self.rules[index].check(value, previous_value, elapsed, stream)
+                self.cost_ns[index] += time.perf_counter_ns() - started
+                self.evaluated[index] += 1
+                if hit:
+                    hits[position, index] = True
+                    self.hits[index] += 1
+                    wild = True
+            if not wild:
+                for index in rule_indexes:
+                    self.rules[index].update_one(value, stream)
+                self.last_value[stream] = value
+                self.last_time[stream] = timestamp
+        self.batches += 1
+        self.samples += len(samples)
+
+    def rule_names(self, hit_row):
+        return [rule.name for rule, hit in zip(self.rules, hit_row) if hit]
+
+    def stats(self):
+        """Per-rule counters: samples evaluated, hits and evaluation cost."""
+        return [{
+            "name": rule.name,
+            "kind": rule.kind,
+            "field": rule.field,
+            "evaluated": int(self.evaluated[index]),
+            "hits": int(self.hits[index]),
+            "cost_ms": self.cost_ns[index] / 1e6,
+            "ns_per_sample": self.cost_ns[index] / self.evaluated[index] if self.evaluated[index] else 0.0,
+        } for index, rule in enumerate(self.rules)]
@@ -0,0 +1,125 @@
+import math
+import threading
+
+
+class DeadlineTracker:
+    """Missed-transmission detector built on a hashed timer wheel.
+
+    Every stream (a topic, or a patient's topic) has one pending deadline: its
+    last arrival plus the expected interval plus a grace period. Deadlines live
+    in ``slots`` buckets of ``tick`` seconds, keyed by stream, so observe() moves
+    a stream's deadline in O(1) and advance() only looks at the buckets whose
+    time has come, however many streams are tracked. When a deadline passes,
+    ``on_missed(stream, expected_at, missed_count)`` is called and the next
+    deadline is one interval later, so a silent stream reports once per interval.
+    If advance() falls behind by several intervals, each stream reports once,
+    with a missed_count covering every interval it skipped.
+
+    Intervals come from ``intervals`` (stream -> seconds) when configured and are
+    otherwise learned per stream as an exponentially weighted average of the gaps
+    between arrivals. Gaps that contained a miss are not learned from, unless
+    ``relearn_after`` misses in a row suggest the publisher really slowed down.
+    """
+
+    def __init__(self, on_missed, intervals=None, grace_fraction=0.5, min_grace=1.0, tick=0.1, slots=1024,
+                 alpha=0.2, relearn_after=3):
+        self.on_missed = on_missed
+        self.configured = dict(intervals or {})
+        self.grace_fraction = grace_fraction
+        self.min_grace = min_grace
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]  # stream -> due tick
+        self.alpha = alpha
+        self.relearn_after = relearn_after
+        self.lock = threading.Lock()
+        self.intervals = {}  # stream -> interval in use (configured or learned)
+        self.last_seen = {}  # stream -> last arrival time
+        self.due = {}  # stream -> (due tick, expected arrival time)
+        self.misses = {}  # stream -> misses since the last arrival
+        self.current_tick = None
+        self.stats = {"observed": 0, "missed": 0, "tracked": 0}
+
+    def grace(self, interval):
+        return max(self.min_grace, interval * self.grace_fraction)
+
+    def observe(self, stream, arrived_at):
+        """Record an arrival and push the stream's deadline forward. O(1)."""
+        with self.lock:
+            self.stats["observed"] += 1
+            previous = self.last_seen.get(stream)
+            self.last_seen[stream] = arrived_at
+            misses = self.misses.pop(stream, 0)
+            interval = self.configured.get(stream)
+            if interval is None and previous is not None:
+                gap = arrived_at - previous
+                learned = self.intervals.get(stream)
+                if learned is None or misses >= self.relearn_after:
+                    interval = gap
+                elif misses:
+                    interval = learned  # The gap includes missed transmissions
+                else:
+                    interval = learned + self.alpha * (gap - learned)
+            elif interval is None:
+                return  # Needs a second arrival before an interval is known
+            if interval <= 0:
+                return
+            self.intervals[stream] = interval
+            self.schedule(stream, arrived_at + interval)
+
+    def schedule(self, stream, expected_at):
+        self.unschedule(stream)
+        due_tick = math.ceil((expected_at + self.grace(self.intervals[stream])) / self.tick)
+        if self.current_tick is not None and due_tick <= self.current_tick:
+            due_tick = self.current_tick + 1
+        self.slots[due_tick % len(self.slots)][stream] = due_tick
+        self.due[stream] = (due_tick, expected_at)
+
+    def unschedule(self, stream):
+        entry = self.due.pop(stream, None)
+        if entry is not None:
+            self.slots[entry[0] % len(self.slots)].pop(stream, None)
+
+    def forget(self, stream):
+        """Stop tracking a stream, e.g. after unsubscribing from it."""
+        with self.lock:
+            self.unschedule(stream)
+            self.last_seen.pop(stream, None)
+            self.misses.pop(stream, None)
+            if stream not in self.configured:
+                self.intervals.pop(stream, None)
+
+    def streams(self):
+        with self.lock:
+            return list(self.last_seen)
+
+    def advance(self, now):
+        """Fire every deadline up to ``now``; returns the number of misses reported."""
+        missed = []
+        with self.lock:
+            now_tick = math.floor(now / self.tick)
+            if self.current_tick is None:
+                self.current_tick = now_tick - 1
+            # Past one revolution every slot gets visited, so later ticks add nothing
+            first_tick = max(self.current_tick + 1, now_tick - len(self.slots) + 1)
+            for tick in range(first_tick, now_tick + 1):
+                self.current_tick = tick  # Rescheduled deadlines land after the tick being processed
+                slot = self.slots[tick % len(self.slots)]
+                if not slot:
+                    continue
+                for stream in [stream for stream, due_tick in slot.items() if due_tick <= now_tick]:
+                    expected_at = self.due[stream][1]
+                    interval = self.intervals[stream]
+                    # Every expected arrival whose deadline has passed by now counts as missed
+                    overdue = now - self.grace(interval) - expected_at
+                    skipped = 1 + max(0, math.floor(overdue / interval))
+                    count = self.misses.get(stream, 0) + skipped
+                    self.misses[stream] = count
+                    missed.append((stream, expected_at, count))
+                    self.schedule(stream, expected_at + skipped * interval)
+            self.current_tick = max(self.current_tick, now_tick)
+            self.stats["missed"] += len(missed)
+            self.stats["tracked"] = len(self.due)
+        # Callbacks run outside the lock so they may call observe() or forget()
+        for stream, expected_at, count in missed:
+            self.on_missed(stream, expected_at, count)
+        return len(missed)
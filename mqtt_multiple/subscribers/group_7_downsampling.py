@@ -0,0 +1,192 @@
+import numpy as np
+
+
+def bucket_extremes(x, y, size):
+    """(x of min, min, x of max, max) for consecutive buckets of ``size`` points.
+
+    The last bucket may be short. NaN samples (missed transmissions) are ignored
+    unless a whole bucket is NaN, in which case the bucket stays NaN so the gap
+    is still drawn.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    buckets = -(-len(y) // size)
+    padding = buckets * size - len(y)
+    if padding:
+        x = np.concatenate([x, np.full(padding, x[-1])])
+        y = np.concatenate([y, np.full(padding, np.nan)])
+    x = x.reshape(buckets, size)
+    y = y.reshape(buckets, size)
+    missing = np.isnan(y)
+    rows = np.arange(buckets)
+    low = np.where(missing, np.inf, y).argmin(axis=1)
+    high = np.where(missing, -np.inf, y).argmax(axis=1)
+    empty = missing.all(axis=1)
+    y_min = np.where(empty, np.nan, y[rows, low])
+    y_max = np.where(empty, np.nan, y[rows, high])
+    return x[rows, low], y_min, x[rows, high], y_max
+
+
+def interleave_extremes(x_min, y_min, x_max, y_max):
+    """Flatten per-bucket extremes into one line, each bucket's two points in x order."""
+    min_first = x_min <= x_max
+    x = np.column_stack([np.where(min_first, x_min, x_max), np.where(min_first, x_max, x_min)]).ravel()
+    y = np.column_stack([np.where(min_first, y_min, y_max), np.where(min_first, y_max, y_min)]).ravel()
+    return x, y
+
+
+def minmax_decimate(x, y, buckets):
+    """Reduce a line to at most ``2 * buckets`` points, keeping every bucket's min and max.
+
+    Spikes survive decimation, which matters for anomaly-prone vitals.
+    """
+    if len(y) <= 2 * buckets:
+        return np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    size = -(-len(y) // buckets)
+    return interleave_extremes(*bucket_extremes(x, y, size))
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: pick ``threshold`` points that keep the line's visual shape."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # The next bucket is represented by its average point
+        next_x = x[end:next_end].mean()
+        next_y = np.nanmean(y[end:next_end]) if not np.isnan(y[end:next_end]).all() else y[previous]
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.where(np.isnan(area), -1.0, area).argmax())
+        selected[bucket + 1] = previous
+    return x[selected], y[selected]
+
+
+class Column:
+    """Append-only float64 array with amortised growth."""
+
+    def __init__(self, capacity=1024):
+        self.data = np.empty(capacity)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=float)
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data)))
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class DecimationPyramid:
+    """Decimated views of a growing series, backed by cached min/max summaries.
+
+    Level 1 holds the min and max of every ``fanout`` raw points, level 2 of
+    every ``fanout`` level-1 buckets, and so on. Summaries are only computed for
+    complete buckets, once, the next time a view is requested after new data.
+    view() answers from the coarsest level that still has about two points per
+    pixel, so zooming or panning over millions of points touches a few thousand
+    values. ``x`` must be non-decreasing (receive times or sample indices).
+    """
+
+    def __init__(self, fanout=8):
+        self.fanout = fanout
+        self.x = Column()
+        self.y = Column()
+        self.levels = []  # [x of min, min, x of max, max] columns per level
+
+    def __len__(self):
+        return self.x.size
+
+    def append(self, x, y):
+        self.x.extend([x])
+        self.y.extend([y])
+
+    def extend(self, x, y):
+        self.x.extend(x)
+        self.y.extend(y)
+
+    def bounds(self):
+        """(first x, last x), or None while empty."""
+        if not self.x.size:
+            return None
+        x = self.x.view()
+        return x[0], x[-1]
+
+    def update_levels(self):
+        """Summarise any buckets that became complete since the last call."""
+        below = (self.x.view(), self.y.view(), self.x.view(), self.y.view())
+        size = 1
+        for level in range(64):
+            size *= self.fanout
+            complete = self.x.size // size
+            if complete == 0:
+                break
+            if level == len(self.levels):
+                self.levels.append([Column() for _ in range(4)])
+            columns = self.levels[level]
+            done = columns[0].size
+            if complete > done:
+                start, end = done * self.fanout, complete * self.fanout
+                extremes = self.merge(*(part[start:end] for part in below))
+                for column, values in zip(columns, extremes):
+                    column.extend(values)
+            below = tuple(column.view() for column in columns)
+
+    def merge(self, x_min, y_min, x_max, y_max):
+        """Combine groups of ``fanout`` buckets from the level below."""
+        low_x, low, _, _ = bucket_extremes(x_min, y_min, self.fanout)
+        _, _, high_x, high = bucket_extremes(x_max, y_max, self.fanout)
+        return low_x, low, high_x, high
+
+    def view(self, x_start, x_end, pixels, method="minmax"):
+        """(x, y) covering [x_start, x_end] with roughly two points per pixel.
+
+        ``method`` is "minmax" (keeps every spike) or "lttb" (smoother shape).
+        """
+        x, y = self.x.view(), self.y.view()
+        # One point beyond each edge, so the line runs to the axes border
+        first = max(int(np.searchsorted(x, x_start, 'left')) - 1, 0)
+        last = min(int(np.searchsorted(x, x_end, 'right')) + 1, len(x))
+        count = last - first
+        buckets = max(int(pixels), 1)
+        if count <= 2 * buckets:
+            return x[first:last], y[first:last]
+
+        self.update_levels()
+        level, size = 0, 1
+        while level < len(self.levels) and count // (size * self.fanout) >= buckets:
+            level, size = level + 1, size * self.fanout
+        if level == 0:
+            candidates_x, candidates_y = x[first:last], y[first:last]
+        else:
+            columns = self.levels[level - 1]
+            start = first // size
+            end = min(-(-last // size), columns[0].size)
+            parts_x, parts_y = [], []
+            if end > start:
+                summary_x, summary_y = interleave_extremes(*(column.view()[start:end] for column in columns))
+                parts_x.append(summary_x)
+                parts_y.append(summary_y)
+            # Raw points after the last complete bucket
+            tail = max(end * size, first)
+            parts_x.append(x[tail:last])
+            parts_y.append(y[tail:last])
+            candidates_x, candidates_y = np.concatenate(parts_x), np.concatenate(parts_y)
+
+        if method == "lttb":
+            return lttb(candidates_x, candidates_y, 2 * buckets)
+        return minmax_decimate(candidates_x, candidates_y, buckets)
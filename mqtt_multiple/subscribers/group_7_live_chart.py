@@ -0,0 +1,99 @@
+import time
+import numpy as np
+
+
+class LiveChartRenderer:
+    """Frame-rate-capped renderer for a matplotlib chart embedded in Tk.
+
+    New data is only recorded when it arrives; at most ``max_fps`` times a second
+    the line artists are pushed to the canvas. Lines are marked animated and
+    blitted over a cached background, so a frame only re-renders the lines. A
+    full redraw (axes, ticks, legend) happens only when data leaves the current
+    limits or the canvas is resized.
+    """
+
+    def __init__(self, widget, canvas, ax, lines, max_fps=10, margin=0.1):
+        self.widget = widget  # any Tk widget, used for after() scheduling
+        self.canvas = canvas
+        self.ax = ax
+        self.lines = lines  # key -> Line2D
+        self.frame_interval = 1.0 / max_fps
+        self.margin = margin
+        self.pending = {}  # key -> (x, y) waiting for the next frame
+        self.background = None
+        self.scheduled = False
+        self.last_frame = 0.0
+        self.frames = 0
+        self.full_redraws = 0
+        for line in self.lines.values():
+            line.set_animated(True)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def set_data(self, key, x_data, y_data):
+        """Record new data for one line; it is drawn on the next frame."""
+        self.pending[key] = (x_data, y_data)
+        self.request_frame()
+
+    def request_frame(self):
+        if self.scheduled:
+            return
+        self.scheduled = True
+        delay = max(0.0, self.last_frame + self.frame_interval - time.monotonic())
+        self.widget.after(int(delay * 1000), self.render)
+
+    def on_draw(self, event):
+        # A full draw just happened (ours, a resize, or a toolbar action): cache the
+        # background without the animated lines, then put the lines back on top
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def render(self):
+        self.scheduled = False
+        self.last_frame = time.monotonic()
+        for key, (x_data, y_data) in self.pending.items():
+            self.lines[key].set_data(x_data, y_data)
+        self.pending.clear()
+
+        if self.rescale_if_needed() or self.background is None:
+            self.canvas.draw()
+            self.full_redraws += 1
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.ax.bbox)
+        self.frames += 1
+
+    def rescale_if_needed(self):
+        """Widen the axes limits if any line left them. Returns True if they changed."""
+        x_min = y_min = np.inf
+        x_max = y_max = -np.inf
+        for line in self.lines.values():
+            x_data = np.asarray(line.get_xdata(), dtype=float)
+            y_data = np.asarray(line.get_ydata(), dtype=float)
+            if x_data.size == 0 or np.all(np.isnan(y_data)):
+                continue
+            x_min, x_max = min(x_min, np.nanmin(x_data)), max(x_max, np.nanmax(x_data))
+            y_min, y_max = min(y_min, np.nanmin(y_data)), max(y_max, np.nanmax(y_data))
+        if not np.isfinite([x_min, x_max, y_min, y_max]).all():
+            return False
+
+        changed = False
+        left, right = self.ax.get_xlim()
+        if x_min < left or x_max > right:
+            span = max(x_max - x_min, 1.0)
+            self.ax.set_xlim(x_min, x_max + span * self.margin)
+            changed = True
+        bottom, top = self.ax.get_ylim()
+        if y_min < bottom or y_max > top:
+            span = max(y_max - y_min, 1.0)
+            if y_min < bottom:
+                bottom = y_min - span * self.margin
+            if y_max > top:
+                top = y_max + span * self.margin
+            self.ax.set_ylim(bottom, top)
+            changed = True
+        return changed
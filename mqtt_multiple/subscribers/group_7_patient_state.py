@@ -0,0 +1,159 @@
+import math
+from array import array
+
+VITALS = ("heart_rate", "systolic", "diastolic", "spo2")
+# Reading field -> vital column; mqtt-single calls SpO2 oxygen_saturation
+VITAL_COLUMNS = {"heart_rate": 0, "systolic": 1, "diastolic": 2, "spo2": 3, "oxygen_saturation": 3}
+
+
+def reading_layout(fields):
+    """(columns, anomaly mask) of a reading record's fields after the timestamp; unknown fields get None."""
+    columns = tuple(VITAL_COLUMNS.get(field) for field in fields[1:])
+    mask = 0
+    for column in columns:
+        if column is not None:
+            mask |= 1 << column
+    return columns, mask
+
+
+class PatientTable:
+    """State of every patient the subscriber has heard from, one row per patient.
+
+    Every column is a flat typed array (the array module) with one slot per
+    patient, or per patient and vital, so a patient costs about 330 bytes with
+    the default 16 readings per vital (some 17 MB for 50k patients) instead of a
+    handful of Python objects each. ``rows`` maps the patient id to its row, so
+    lookups stay O(1). Per vital the table keeps the latest accepted value and
+    its receive time and the last ``history`` accepted values in a ring buffer;
+    per patient, which vitals' latest reading was flagged as an anomaly (wild
+    readings are counted, not stored, as in the time-series store).
+    patient() returns a small view of one row.
+    """
+
+    def __init__(self, history=16):
+        self.history = history
+        self.rows = {}  # patient id -> row
+        self.patient_ids = []  # row -> patient id
+        self.layouts = {}  # reading record type -> (columns, anomaly mask)
+        vitals = len(VITALS)
+        self.last_values = array('f')  # row * vitals + column
+        self.last_times = array('d')  # row * vitals + column
+        self.rings = array('f')  # (row * vitals + column) * history + slot
+        self.counts = array('I')  # Accepted readings per vital; count % history is the next ring slot
+        self.anomalies = bytearray()  # Bit per vital whose latest reading was wild
+        self.anomaly_counts = array('I')
+        self.last_anomaly_times = array('d')
+        # Appended for every new patient
+        self.empty_values = array('f', [math.nan] * vitals)
+        self.empty_times = array('d', [0.0] * vitals)
+        self.empty_ring = array('f', [math.nan] * (vitals * history))
+        self.empty_counts = array('I', [0] * vitals)
+
+    def row_for(self, patient_id):
+        row = self.rows.get(patient_id)
+        if row is None:
+            row = self.rows[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+            self.last_values.extend(self.empty_values)
+            self.last_times.extend(self.empty_times)
+            self.rings.extend(self.empty_ring)
+            self.counts.extend(self.empty_counts)
+            self.anomalies.append(0)
+            self.anomaly_counts.append(0)
+            self.last_anomaly_times.append(0.0)
+        return row
+
+    def observe(self, patient_id, reading, received_at, wild=False):
+        """Fold one reading (a record from Utils/group_7_payload_codec.py) into the patient's row."""
+        row = self.row_for(patient_id)
+        layout = self.layouts.get(type(reading))
+        if layout is None:
+            layout = self.layouts[type(reading)] = reading_layout(reading._fields)
+        columns, mask = layout
+        if wild:
+            self.anomalies[row] |= mask
+            self.anomaly_counts[row] += 1
+            self.last_anomaly_times[row] = received_at
+            return
+        if self.anomalies[row] & mask:
+            self.anomalies[row] &= ~mask & 0xFF
+        base = row * len(VITALS)
+        history = self.history
+        for column, value in zip(columns, reading[1:]):
+            if column is None:
+                continue
+            cell = base + column
+            self.last_values[cell] = value
+            self.last_times[cell] = received_at
+            count = self.counts[cell]
+            self.rings[cell * history + count % history] = value
+            self.counts[cell] = count + 1
+
+    def patient(self, patient_id):
+        """View of one patient's state, or None if nothing was received from them."""
+        row = self.rows.get(patient_id)
+        return None if row is None else PatientView(self, patient_id, row)
+
+    def anomalous_count(self):
+        """Patients whose latest reading of some vital was flagged."""
+        return len(self.anomalies) - self.anomalies.count(0)
+
+    def nbytes(self):
+        """Bytes held by the state columns (the id index is not included)."""
+        return sum(len(column) * column.itemsize
+                   for column in (self.last_values, self.last_times, self.rings, self.counts,
+                                  self.anomaly_counts, self.last_anomaly_times)) + len(self.anomalies)
+
+    def __len__(self):
+        return len(self.patient_ids)
+
+    def __contains__(self, patient_id):
+        return patient_id in self.rows
+
+
+class PatientView:
+    """One row of a PatientTable, read on demand."""
+
+    __slots__ = ("table", "patient_id", "row")
+
+    def __init__(self, table, patient_id, row):
+        self.table = table
+        self.patient_id = patient_id
+        self.row = row
+
+    def cell(self, vital):
+        return self.row * len(VITALS) + VITAL_COLUMNS[vital]
+
+    def last(self, vital):
+        """Latest accepted value of a vital, or None."""
+        value = self.table.last_values[self.cell(vital)]
+        return None if math.isnan(value) else value
+
+    def last_time(self, vital):
+        return self.table.last_times[self.cell(vital)] or None
+
+    def history(self, vital):
+        """Up to ``history`` most recent accepted values of a vital, oldest first."""
+        table, cell = self.table, self.cell(vital)
+        count, history = table.counts[cell], table.history
+        ring = table.rings[cell * history:(cell + 1) * history]
+        start = count % history
+        return [value for value in ring[start:] + ring[:start] if not math.isnan(value)]
+
+    def anomalous_vitals(self):
+        """Vitals whose latest reading was flagged."""
+        bits = self.table.anomalies[self.row]
+        return [vital for column, vital in enumerate(VITALS) if bits & (1 << column)]
+
+    def anomaly_count(self):
+        return self.table.anomaly_counts[self.row]
+
+    def summary(self):
+        values = []
+        for vital in VITALS:
+            value = self.last(vital)
+            values.append(f"{vital} {'-' if value is None else f'{value:g}'}")
+        flagged = self.anomalous_vitals()
+        return (f"{self.patient_id}: {', '.join(values)} | "
+                f"{'anomalous ' + ', '.join(flagged) if flagged else 'no current anomaly'} "
+                f"({self.anomaly_count()} flagged readings)")
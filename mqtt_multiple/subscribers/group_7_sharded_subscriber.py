@@ -0,0 +1,371 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+import Utils.group_7_config as config
+from subscribers.group_7_deadline_tracker import DeadlineTracker
+from subscribers.group_7_patient_state import PatientTable
+from Utils.group_7_topic_dispatch import TopicDispatcher
+from Utils.group_7_topics import split_patient_topic
+from subscribers.group_7_subscriber_engine import SubscriberEngine, series_values
+from subscribers.group_7_timeseries_store import TimeSeriesStore
+
+SHARD_MODES = ("shared", "hash")
+ALERT_LIMIT = 1000  # Alerts a worker sends per report; the rest are only counted
+
+
+def shard_for(topic, shard_count):
+    """Stable shard index for a topic (the same in every process, unlike hash())."""
+    return zlib.crc32(topic.encode()) % shard_count
+
+
+class ShardReportSink:
+    """Collects what one worker has to tell the coordinator between two reports."""
+
+    def __init__(self, history):
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        self.samples = {}  # series -> newest (value, receive time) pairs, at most `history`
+        self.last_values = {}  # topic -> (reading, receive time)
+        self.aggregates = {}  # series -> [count, total, min, max]
+        self.alerts = []  # (sink event, args)
+        self.dropped_alerts = 0
+
+    def on_sample(self, topic, reading, received_at):
+        self.last_values[topic] = (reading, received_at)
+        if split_patient_topic(topic)[0] is not None:
+            return  # Per-patient history stays in the worker's patient table
+        for series, value in series_values(topic, reading):
+            tail = self.samples.get(series)
+            if tail is None:
+                tail = self.samples[series] = deque(maxlen=self.history)
+            tail.append((value, received_at))
+            aggregate = self.aggregates.get(series)
+            if aggregate is None:
+                self.aggregates[series] = [1, value, value, value]
+            else:
+                aggregate[0] += 1
+                aggregate[1] += value
+                aggregate[2] = min(aggregate[2], value)
+                aggregate[3] = max(aggregate[3], value)
+
+    def alert(self, event, *args):
+        if len(self.alerts) < ALERT_LIMIT:
+            self.alerts.append((event, args))
+        else:
+            self.dropped_alerts += 1
+
+    def on_anomaly(self, topic, reading, received_at):
+        self.alert("on_anomaly", topic, reading, received_at)
+
+    def on_missed(self, topic, expected_at, missed_count):
+        self.alert("on_missed", topic, expected_at, missed_count)
+
+    def on_error(self, topic, message):
+        self.alert("on_error", topic, message)
+
+    def on_status(self, message):
+        self.alert("on_status", message)
+
+    def report(self, shard, engine):
+        report = {
+            "shard": shard,
+            "stats": dict(engine.stats),
+            "rules": engine.rule_stats(),
+            "schemas": engine.schema_stats(),
+            "samples": {series: list(tail) for series, tail in self.samples.items()},
+            "last_values": self.last_values,
+            "aggregates": self.aggregates,
+            "alerts": self.alerts,
+            "dropped_alerts": self.dropped_alerts,
+        }
+        self.reset()
+        return report
+
+
+def run_shard(shard, shard_count, mode, group, host, port, history, store_dir, commands, reports, stop,
+              report_interval):
+    """Worker process: one SubscriberEngine whose results go to the coordinator every report_interval."""
+    sink = ShardReportSink(history)
+    store = None
+    if store_dir:
+        store = TimeSeriesStore(os.path.join(store_dir, f"shard-{shard}"), window=history,
+                                segment_samples=config.TIMESERIES_SEGMENT_SAMPLES,
+                                retention_seconds=config.TIMESERIES_RETENTION_DAYS * 24 * 3600)
+    engine = SubscriberEngine([sink], history=history, host=host, port=port, store=store)
+    lock = threading.Lock()  # paho's thread ingests while this one reports
+
+    def on_message(client, userdata, msg):
+        # Hash partitioning: every worker receives every topic but only decodes its own
+        if mode == "hash" and shard_for(msg.topic, shard_count) != shard:
+            return
+        received_at = time.time()
+        with lock:
+            engine.ingest(msg.topic, msg.payload, received_at)
+
+    engine.connect(on_message=on_message)
+    engine.start()
+    try:
+        while True:
+            while True:
+                try:
+                    command, topic = commands.get_nowait()
+                except queue.Empty:
+                    break
+                # Each shared subscription hands a message to one member of the group
+                subscription = f"$share/{group}/{topic}" if mode == "shared" else topic
+                with lock:
+                    if command == "subscribe":
+                        engine.subscribe(subscription)
+                    else:
+                        engine.unsubscribe(subscription)
+            with lock:
+                if mode == "hash":
+                    engine.check_deadlines()  # Every stream lives on exactly one worker
+                reports.put(sink.report(shard, engine))
+            if stop.wait(report_interval):
+                break
+    finally:
+        with lock:
+            engine.close()
+            reports.put(sink.report(shard, engine))
+
+
+class ShardedSubscriber:
+    """Runs the subscriber pipeline in worker processes and merges their results.
+
+    Each worker is a SubscriberEngine in its own process, so decoding, anomaly
+    rules and storage use one core per worker. ``mode`` picks how messages are
+    split:
+
+    - "shared": workers join the MQTT shared subscription ``$share/<group>/<topic>``
+      and the broker hands each message to one of them. Load is balanced by the
+      broker, but a stream's messages are spread over workers, so per-stream
+      rule baselines are per worker and missed transmissions are tracked here.
+    - "hash": every worker subscribes to every topic and only decodes the topics
+      whose CRC32 falls in its partition, so all of a stream's state lives on
+      one worker.
+
+    Every ``report_interval`` each worker sends its counters, rule statistics,
+    the newest samples of each series, per-series aggregates, the last value of
+    each topic and its alerts. poll() merges them and forwards them to the sinks
+    (one on_sample per topic per report, with the latest value), and exposes the
+    same data_queues/series()/stats/rule_stats() surface as SubscriberEngine, so
+    the GUI can read either. Worker stores go to ``store_dir/shard-<n>``.
+    Per-patient topics only send their latest reading, which updates the
+    coordinator's ``patients`` table at report granularity.
+    """
+
+    def __init__(self, sinks=(), workers=2, mode="shared", group="health", history=50, host=None, port=None,
+                 store_dir=None, report_interval=0.5, intervals=None):
+        if mode not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode '{mode}', expected one of {', '.join(SHARD_MODES)}")
+        self.sinks = list(sinks)
+        self.workers = workers
+        self.mode = mode
+        self.group = group
+        self.history = history
+        self.host = host if host is not None else config.MQTT_BROKER_URL
+        self.port = port if port is not None else config.MQTT_BROKER_PORT
+        self.store_dir = store_dir
+        self.report_interval = report_interval
+        # Spawn, not fork: the parent may already run Tk, paho or the publisher threads
+        self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.commands = [self.context.Queue() for _ in range(workers)]
+        self.processes = []
+        self.client = None  # Messages never reach this process
+        self.active_subscriptions = set()
+        self.subscriptions = TopicDispatcher()  # Active filter -> itself
+        self.store = TimeSeriesStore(window=history, max_segments=2)
+        self.data_queues = {}
+        self.topic_series = {}
+        self.last_values = {}  # topic -> (reading, receive time), newest across workers
+        self.patients = PatientTable(config.PATIENT_HISTORY)  # Fed with the newest reading per report
+        self.aggregates = {}  # series -> [count, total, min, max] since start
+        self.shard_stats = {}  # shard -> latest cumulative counters
+        self.shard_rules = {}  # shard -> latest rule statistics
+        self.shard_schemas = {}  # shard -> latest per-topic decode counts
+        self.dropped_alerts = 0
+        self.missed = 0
+        self.stats = {"received": 0, "rejected": 0, "wild": 0, "stored": 0, "missed": 0}
+        self.deadlines = None
+        if mode == "shared":
+            self.deadlines = DeadlineTracker(self.on_deadline_missed,
+                                             intervals if intervals is not None else config.EXPECTED_INTERVALS,
+                                             grace_fraction=config.MISSED_GRACE_FRACTION,
+                                             min_grace=config.MISSED_MIN_GRACE)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def notify(self, event, *args):
+        for sink in self.sinks:
+            handler = getattr(sink, event, None)
+            if handler is not None:
+                handler(*args)
+
+    # Workers
+
+    def connect(self, on_message=None):
+        """Nothing to do here: every worker opens its own MQTT connection in start()."""
+
+    def start(self):
+        for shard in range(self.workers):
+            process = self.context.Process(
+                target=run_shard, name=f"subscriber-shard-{shard}", daemon=True,
+                args=(shard, self.workers, self.mode, self.group, self.host, self.port, self.history,
+                      self.store_dir, self.commands[shard], self.reports, self.stop_event, self.report_interval))
+            process.start()
+            self.processes.append(process)
+
+    def wait_until_ready(self, timeout=30.0):
+        """Poll until every worker has reported at least once; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while len(self.shard_stats) < self.workers:
+            if time.monotonic() > deadline:
+                return False
+            self.poll()
+            time.sleep(0.05)
+        return True
+
+    def subscribe(self, topic):
+        if topic not in self.active_subscriptions:
+            self.active_subscriptions.add(topic)
+            self.subscriptions.register(topic, topic)
+        for commands in self.commands:
+            commands.put(("subscribe", topic))
+
+    def unsubscribe(self, topic):
+        self.active_subscriptions.discard(topic)
+        self.subscriptions.unregister(topic, topic)  # Only this filter: "$share/<group>/<f>" and "<f>" share a trie path
+        for commands in self.commands:
+            commands.put(("unsubscribe", topic))
+        if self.deadlines is not None:
+            for stream in self.deadlines.streams():
+                if not self.subscriptions.matches(stream):
+                    self.deadlines.forget(stream)
+
+    def close(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.poll()
+        self.notify("close")
+        self.store.close()
+
+    # Merging
+
+    def poll(self):
+        """Merge every report waiting from the workers; returns how many were merged."""
+        merged = 0
+        while True:
+            try:
+                report = self.reports.get_nowait()
+            except queue.Empty:
+                break
+            self.merge(report)
+            merged += 1
+        if merged:
+            self.stats = {key: sum(stats.get(key, 0) for stats in self.shard_stats.values())
+                          for key in ("received", "rejected", "wild", "stored", "missed")}
+            self.stats["missed"] += self.missed
+        return merged
+
+    def merge(self, report):
+        self.shard_stats[report["shard"]] = report["stats"]
+        self.shard_rules[report["shard"]] = report["rules"]
+        self.shard_schemas[report["shard"]] = report["schemas"]
+        self.dropped_alerts += report["dropped_alerts"]
+
+        for series, samples in report["samples"].items():
+            log = self.series(series)
+            for sample in samples:
+                log.append(sample)
+        for series, (count, total, low, high) in report["aggregates"].items():
+            aggregate = self.aggregates.get(series)
+            if aggregate is None:
+                self.aggregates[series] = [count, total, low, high]
+            else:
+                aggregate[0] += count
+                aggregate[1] += total
+                aggregate[2] = min(aggregate[2], low)
+                aggregate[3] = max(aggregate[3], high)
+
+        for topic, (reading, received_at) in report["last_values"].items():
+            patient_id, _ = split_patient_topic(topic)
+            if patient_id is not None:
+                self.patients.observe(patient_id, reading, received_at)
+            elif topic not in self.topic_series:
+                self.topic_series[topic] = [series for series, _ in series_values(topic, reading)]
+            if self.deadlines is not None:
+                self.deadlines.observe(topic, received_at)
+            previous = self.last_values.get(topic)
+            if previous is None or previous[1] <= received_at:
+                self.last_values[topic] = (reading, received_at)
+                self.notify("on_sample", topic, reading, received_at)
+
+        for event, args in report["alerts"]:
+            if event == "on_missed":
+                self.mark_gap(args[0], args[1])
+            elif event == "on_anomaly":
+                patient_id, _ = split_patient_topic(args[0])
+                if patient_id is not None:
+                    self.patients.observe(patient_id, args[1], args[2], wild=True)
+            self.notify(event, *args)
+
+    def series(self, name):
+        log = self.data_queues.get(name)
+        if log is None:
+            log = self.data_queues[name] = self.store.series(name)
+        return log
+
+    def mark_gap(self, topic, expected_at):
+        for series in self.topic_series.get(topic, []):
+            self.series(series).append((None, expected_at))
+
+    def check_deadlines(self, now=None):
+        """Shared mode tracks deadlines here; in hash mode the workers do it themselves."""
+        if self.deadlines is None:
+            return 0
+        return self.deadlines.advance(time.time() if now is None else now)
+
+    def on_deadline_missed(self, topic, expected_at, missed_count):
+        self.missed += 1
+        self.stats["missed"] += 1
+        self.mark_gap(topic, expected_at)
+        self.notify("on_missed", topic, expected_at, missed_count)
+
+    def schema_stats(self):
+        """Accepted and rejected messages per topic, summed over every worker."""
+        merged = {}
+        for schemas in self.shard_schemas.values():
+            for topic, counts in schemas.items():
+                total = merged.setdefault(topic, {"accepted": 0, "rejected": 0, "last_error": None})
+                total["accepted"] += counts["accepted"]
+                total["rejected"] += counts["rejected"]
+                total["last_error"] = counts["last_error"] or total["last_error"]
+        return dict(sorted(merged.items()))
+
+    def rule_stats(self):
+        """Rule statistics summed over every worker."""
+        merged = {}
+        for rules in self.shard_rules.values():
+            for rule in rules:
+                total = merged.get(rule["name"])
+                if total is None:
+                    merged[rule["name"]] = dict(rule)
+                else:
+                    for key in ("evaluated", "hits", "cost_ms"):
+                        total[key] += rule[key]
+        for rule in merged.values():
+            rule["ns_per_sample"] = rule["cost_ms"] * 1e6 / rule["evaluated"] if rule["evaluated"] else 0.0
+        return list(merged.values())
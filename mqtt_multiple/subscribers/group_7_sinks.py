@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+
+class Sink:
+    """Base class for subscriber sinks. Every hook is optional and does nothing here."""
+
+    def on_sample(self, topic, reading, received_at):
+        pass
+
+    def on_anomaly(self, topic, reading, received_at):
+        pass
+
+    def on_missed(self, topic, expected_at, missed_count):
+        pass
+
+    def on_error(self, topic, message):
+        pass
+
+    def on_status(self, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def reading_fields(reading):
+    """Reading record as a plain mapping, including its type name."""
+    fields = {"type": type(reading).__name__}
+    fields.update(zip(reading._fields, reading))
+    return fields
+
+
+class StdoutSink(Sink):
+    """Print every event, one line each."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, line):
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def on_sample(self, topic, reading, received_at):
+        self.write(f"[{datetime.fromtimestamp(received_at)}] {topic}: {reading}")
+
+    def on_anomaly(self, topic, reading, received_at):
+        self.write(f"[{datetime.fromtimestamp(received_at)}] WILD {topic}: {reading}")
+
+    def on_missed(self, topic, expected_at, missed_count):
+        self.write(f"[{datetime.fromtimestamp(expected_at)}] MISSED {topic} ({missed_count} in a row)")
+
+    def on_error(self, topic, message):
+        self.write(f"ERROR {topic}: {message}")
+
+    def on_status(self, message):
+        self.write(message)
+
+
+class FileSink(Sink):
+    """Append samples and anomalies to a file as JSON lines."""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, kind, topic, reading, received_at):
+        record = {"kind": kind, "topic": topic, "received_at": received_at}
+        record.update(reading_fields(reading))
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+
+    def on_sample(self, topic, reading, received_at):
+        self.write("sample", topic, reading, received_at)
+
+    def on_anomaly(self, topic, reading, received_at):
+        self.write("anomaly", topic, reading, received_at)
+
+    def on_missed(self, topic, expected_at, missed_count):
+        record = {"kind": "missed", "topic": topic, "expected_at": expected_at, "missed_count": missed_count}
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class SQLiteSink(Sink):
+    """Store samples and anomalies in a SQLite table, committing in batches."""
+
+    def __init__(self, path, commit_every=500):
+        # Sinks may be called from paho's network thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS readings ("
+            "topic TEXT, kind TEXT, received_at REAL, timestamp_ns INTEGER, "
+            "reading_type TEXT, value1 REAL, value2 REAL)")
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+
+    def write(self, kind, topic, reading, received_at):
+        values = list(reading[1:]) + [None]
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (topic, kind, received_at, reading[0], type(reading).__name__, values[0], values[1]))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def on_sample(self, topic, reading, received_at):
+        self.write("sample", topic, reading, received_at)
+
+    def on_anomaly(self, topic, reading, received_at):
+        self.write("anomaly", topic, reading, received_at)
+
+    def on_missed(self, topic, expected_at, missed_count):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (topic, "missed", expected_at, None, None, missed_count, None))
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+def sink_from_spec(spec):
+    """Build a sink from a CLI spec: ``stdout``, ``file:PATH`` or ``sqlite:PATH``."""
+    kind, _, path = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file" and path:
+        return FileSink(path)
+    if kind == "sqlite" and path:
+        return SQLiteSink(path)
+    raise ValueError(f"Unknown sink '{spec}', expected stdout, file:PATH or sqlite:PATH")
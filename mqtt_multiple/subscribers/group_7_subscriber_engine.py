@@ -0,0 +1,313 @@
+import struct
+import threading
+import time
+from paho.mqtt import client as mqtt_client
+import Utils.group_7_config as config
+from Utils.group_7_metrics import get_registry
+from Utils.group_7_payload_codec import BloodPressureReading, is_batch, split_batch
+from Utils.group_7_schema_registry import SchemaError, default_registry
+from Utils.group_7_topic_dispatch import TopicDispatcher
+from Utils.group_7_topics import metric_topic, split_patient_topic
+from subscribers.group_7_anomaly_rules import AnomalyRuleEngine
+from subscribers.group_7_deadline_tracker import DeadlineTracker
+from subscribers.group_7_patient_state import PatientTable
+from subscribers.group_7_timeseries_store import TimeSeriesStore
+METRICS = get_registry()
+RECEIVED = METRICS.counter("subscriber_messages_received_total", "Samples decoded or rejected", ["topic"])
+REJECTED = METRICS.counter("subscriber_messages_rejected_total", "Samples that failed to decode", ["topic"])
+WILD = METRICS.counter("subscriber_messages_wild_total", "Samples flagged by the anomaly rules", ["topic"])
+STORED = METRICS.counter("subscriber_messages_stored_total", "Samples written to the time-series store")
+MISSED = METRICS.counter("subscriber_transmissions_missed_total", "Overdue transmissions reported", ["topic"])
+CONNECTED = METRICS.gauge("subscriber_connection_up", "1 while the subscriber's MQTT client is connected")
+DECODE_SECONDS = METRICS.histogram("subscriber_decode_seconds", "Time to decode one MQTT message (a batch counts once)")
+HANDLE_SECONDS = METRICS.histogram("subscriber_handle_seconds",
+                                   "Time for anomaly rules, storage and sinks over one handle_batch() call")
+
+
+def series_values(topic, reading):
+    """Split a reading into (series name, value) pairs; blood pressure yields two series."""
+    if isinstance(reading, BloodPressureReading):
+        return [(topic + '_systolic', reading.systolic), (topic + '_diastolic', reading.diastolic)]
+    return [(topic, reading[1])]
+
+
+def anomaly_samples(stream, reading):
+    """(stream, field, value, time) samples of one reading, as the anomaly rules take them."""
+    timestamp = reading.timestamp_ns / 1e9
+    return [(stream, field, value, timestamp) for field, value in zip(reading._fields[1:], reading[1:])]
+
+
+class SubscriberEngine:
+    """GUI-free subscriber pipeline: decode, validate, anomaly check, store, fan out to sinks.
+
+    Sinks are plain objects with any of ``on_sample(topic, reading, received_at)``,
+    ``on_anomaly(topic, reading, received_at)``, ``on_missed(topic, expected_at,
+    missed_count)``, ``on_error(topic, message)``, ``on_status(message)`` and
+    ``close()`` (see subscribers/group_7_sinks.py).
+    Sink callbacks run on whichever thread calls handle(): paho's network thread
+    when the engine is driven directly, or the Tk thread when the GUI drains its
+    own queue.
+
+    Payloads are decoded and validated by the schema registered for their topic
+    in ``schemas`` (Utils/group_7_schema_registry.py, the three configured topics
+    by default), which also counts rejections per topic.
+    Stored samples go to ``store`` (subscribers/group_7_timeseries_store.py); the
+    default keeps two in-memory segments per series and persists nothing.
+    Anomalies are whatever the ``rules`` table flags (config.ANOMALY_RULES by
+    default, see subscribers/group_7_anomaly_rules.py). Missed transmissions are
+    detected against ``intervals`` (config.EXPECTED_INTERVALS by default; other
+    topics are learned) whenever check_deadlines() runs.
+    Readings on per-patient topics (health/<patient_id>/<metric>) update that
+    patient's row in ``patients`` (subscribers/group_7_patient_state.py) instead
+    of getting series of their own in the store; the global topics keep theirs.
+    Whether a topic is subscribed to is looked up in a TopicDispatcher
+    (Utils/group_7_topic_dispatch.py) of the active filters, so the check costs
+    the same with thousands of patient topics as with three.
+    """
+
+    def __init__(self, sinks=(), history=50, host=None, port=None, client_factory=mqtt_client.Client,
+                 store=None, rules=None, intervals=None, schemas=None):
+        self.sinks = list(sinks)
+        self.schemas = schemas if schemas is not None else default_registry()
+        self.history = history
+        self.store = store if store is not None else TimeSeriesStore(window=history, max_segments=2)
+        self.host = host if host is not None else config.MQTT_BROKER_URL
+        self.port = port if port is not None else config.MQTT_BROKER_PORT
+        self.client_factory = client_factory
+        self.anomaly_rules = AnomalyRuleEngine(rules if rules is not None else config.ANOMALY_RULES)
+        self.deadlines = DeadlineTracker(self.on_deadline_missed,
+                                         intervals if intervals is not None else config.EXPECTED_INTERVALS,
+                                         grace_fraction=config.MISSED_GRACE_FRACTION,
+                                         min_grace=config.MISSED_MIN_GRACE)
+        self.topic_series = {}  # topic -> series it stores, so a missed transmission can mark a gap in each
+        self.patients = PatientTable(config.PATIENT_HISTORY)
+        self.watcher_stop = threading.Event()
+        self.client = None
+        self.active_subscriptions = set()  # Topic filters, as passed to subscribe()
+        self.subscriptions = TopicDispatcher()  # Active filter -> itself, to match topics against
+        # series -> SeriesLog of (value, receive time); series already on disk are available straight away
+        self.data_queues = {name: self.store.series(name) for name in self.store.names()}
+        self.stats = {"received": 0, "rejected": 0, "wild": 0, "stored": 0, "missed": 0}
+        self.topic_counters = {}  # topic -> (received, rejected, wild) metric children
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def notify(self, event, *args):
+        for sink in self.sinks:
+            handler = getattr(sink, event, None)
+            if handler is not None:
+                handler(*args)
+
+    # MQTT plumbing
+
+    def connect(self, on_message=None):
+        """Create the client and connect; call start() or run_forever() afterwards.
+
+        By default every message runs through the whole pipeline on the network
+        thread; pass ``on_message`` to take over delivery (the GUI uses this to
+        decode there and handle samples on the Tk thread).
+        """
+        self.client = self.client_factory()
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = on_message if on_message is not None else self.on_message
+        self.client.connect(self.host, self.port, config.MQTT_KEEP_ALIVE_INTERVAL)
+
+    def start(self):
+        """Run paho's network loop on a background thread."""
+        self.client.loop_start()
+
+    def run_forever(self):
+        """Run paho's network loop on the calling thread (headless use)."""
+        self.client.loop_forever()
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        CONNECTED.set(int(rc == 0))
+        if rc == 0:
+            message = "Connected successfully to MQTT broker."
+            # Restore subscriptions after a reconnect
+            for topic in self.active_subscriptions:
+                client.subscribe(topic)
+        else:
+            message = f"Failed to connect, return code {rc}"
+        self.notify("on_status", message)
+
+    def on_disconnect(self, client, userdata, *args):
+        CONNECTED.set(0)
+
+    def on_message(self, client, userdata, msg):
+        self.ingest(msg.topic, msg.payload, time.time())
+
+    def subscribe(self, topic):
+        if topic not in self.active_subscriptions:
+            self.active_subscriptions.add(topic)
+            self.subscriptions.register(topic, topic)
+        if self.client is not None:
+            self.client.subscribe(topic)
+
+    def unsubscribe(self, topic):
+        self.active_subscriptions.discard(topic)
+        self.subscriptions.unregister(topic, topic)  # Only this filter: "$share/<group>/<f>" and "<f>" share a trie path
+        if self.client is not None:
+            self.client.unsubscribe(topic)
+        # Silence is expected from here on
+        for stream in self.deadlines.streams():
+            if not self.is_subscribed(stream):
+                self.deadlines.forget(stream)
+
+    def is_subscribed(self, topic):
+        return self.subscriptions.matches(topic)
+
+    def close(self):
+        self.watcher_stop.set()
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+        self.notify("close")
+        self.store.close()
+
+    # Pipeline stages
+
+    def ingest(self, topic, payload, received_at):
+        """Run a raw MQTT payload (single sample or batch) through every stage."""
+        self.handle_batch(self.decode(topic, payload, received_at))
+
+    def decode(self, topic, payload, received_at):
+        """Decode stage. Returns a list of (topic, reading, receive time, error message)."""
+        started = time.perf_counter()
+        if is_batch(payload):
+            try:
+                payloads = split_batch(payload)
+            except (ValueError, struct.error) as e:
+                message = f"Error unpacking batch on {topic}: {str(e)}"
+                self.schemas.reject(topic, message)
+                return [(topic, None, received_at, message)]
+        else:
+            payloads = [payload]
+        entries = [self.decode_sample(topic, sample, received_at) for sample in payloads]
+        DECODE_SECONDS.observe(time.perf_counter() - started)
+        return entries
+
+    def decode_sample(self, topic, payload, received_at):
+        try:
+            # The topic's schema decodes binary or JSON straight into a typed reading record
+            return (topic, self.schemas.decode(topic, payload), received_at, None)
+        except SchemaError as e:
+            return (topic, None, received_at, str(e))
+
+    def handle(self, topic, reading, received_at, error=None):
+        """Validate, check for anomalies, store and fan out one decoded sample."""
+        self.handle_batch([(topic, reading, received_at, error)])
+
+    def handle_batch(self, entries):
+        """Check for anomalies, store and fan out decoded samples; report the ones that failed to decode.
+
+        The anomaly rules run once over every valid sample in the batch.
+        """
+        started = time.perf_counter()
+        valid = []
+        for topic, reading, received_at, error in entries:
+            counters = self.counters_for(topic)
+            self.stats["received"] += 1
+            counters[0].inc()
+            if error is not None:
+                self.stats["rejected"] += 1
+                counters[1].inc()
+                self.notify("on_error", topic, error)
+                continue
+            # Only process messages for topics that are actively subscribed to
+            if not self.is_subscribed(topic):
+                continue
+            valid.append((topic, reading, received_at))
+            # Wild or not, the transmission arrived
+            self.deadlines.observe(topic, received_at)
+
+        for (topic, reading, received_at), wild in zip(valid, self.find_anomalies(valid)):
+            if wild:
+                self.stats["wild"] += 1
+                self.counters_for(topic)[2].inc()
+                patient_id, _ = split_patient_topic(topic)
+                if patient_id is not None:
+                    self.patients.observe(patient_id, reading, received_at, wild=True)
+                self.notify("on_anomaly", topic, reading, received_at)
+                continue  # Wild data is excluded from storage
+            self.store_reading(topic, reading, received_at)
+            self.notify("on_sample", topic, reading, received_at)
+        HANDLE_SECONDS.observe(time.perf_counter() - started)
+
+    def counters_for(self, topic):
+        counters = self.topic_counters.get(topic)
+        if counters is None:
+            # Per-patient topics count under their metric, so the metrics do not grow a series per patient
+            metric = metric_topic(topic)
+            counters = self.topic_counters[topic] = (RECEIVED.labels(metric), REJECTED.labels(metric), WILD.labels(metric))
+        return counters
+
+    def rule_stats(self):
+        return self.anomaly_rules.stats()
+
+    def schema_stats(self):
+        """Accepted and rejected messages per topic (see SchemaRegistry.stats)."""
+        return self.schemas.stats()
+
+    def find_anomalies(self, entries):
+        """One flag per (topic, reading, receive time) entry: True if any rule fired on any of its values."""
+        samples = []
+        owners = []
+        for position, (topic, reading, _) in enumerate(entries):
+            values = anomaly_samples(topic, reading)
+            samples.extend(values)
+            owners.extend([position] * len(values))
+        wild = [False] * len(entries)
+        if samples:
+            for owner, hit in zip(owners, self.anomaly_rules.evaluate(samples).any(axis=1).tolist()):
+                if hit:
+                    wild[owner] = True
+        return wild
+
+    def series(self, name):
+        """The stored log for one series, created on first use."""
+        log = self.data_queues.get(name)
+        if log is None:
+            log = self.data_queues[name] = self.store.series(name)
+        return log
+
+    def store_reading(self, topic, reading, received_at):
+        patient_id, _ = split_patient_topic(topic)
+        if patient_id is not None:
+            self.patients.observe(patient_id, reading, received_at)
+            self.stats["stored"] += 1
+            STORED.inc()
+            return
+        pairs = series_values(topic, reading)
+        if topic not in self.topic_series:
+            self.topic_series[topic] = [series for series, _ in pairs]
+        for series, value in pairs:
+            self.series(series).append((value, received_at))
+        self.stats["stored"] += 1
+        STORED.inc()
+
+    # Missed transmissions
+
+    def check_deadlines(self, now=None):
+        """Report every stream whose next transmission is overdue. Call this regularly."""
+        return self.deadlines.advance(time.time() if now is None else now)
+
+    def watch_deadlines(self, period=0.5):
+        """Call check_deadlines() every ``period`` seconds on a background thread (headless use).
+
+        Sinks then receive on_missed on that thread.
+        """
+        def watch():
+            while not self.watcher_stop.wait(period):
+                self.check_deadlines()
+        threading.Thread(target=watch, daemon=True).start()
+
+    def on_deadline_missed(self, topic, expected_at, missed_count):
+        self.stats["missed"] += 1
+        MISSED.labels(metric_topic(topic)).inc()
+        # A None value is stored as a gap, so charts show the hole
+        for series in self.topic_series.get(topic, []):
+            self.series(series).append((None, expected_at))
+        self.notify("on_missed", topic, expected_at, missed_count)
@@ -0,0 +1,273 @@
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from urllib.parse import quote, unquote
+import numpy as np
+
+# Segment file layout: a 64-byte header, then `capacity` int64 receive times (ns)
+# followed by `capacity` float64 values. Both columns are 8-byte aligned.
+SEGMENT_MAGIC = b'G7TS'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('<4sHHIIQ')  # magic, version, reserved, capacity, carried, count
+HEADER_SIZE = 64
+CARRIED_OFFSET = 12
+COUNT_OFFSET = 16
+SEGMENT_SUFFIX = '.seg'
+
+
+class Segment:
+    """One fixed-capacity segment of a series, memory-mapped.
+
+    The first ``carried`` samples are a copy of the previous segment's tail, so a
+    live tail slice never has to span two segments; history reads skip them.
+    ``path`` None maps anonymous memory instead of a file.
+    """
+
+    def __init__(self, path, sequence, capacity):
+        self.path = path
+        self.sequence = sequence
+        if path is None:
+            self.map = mmap.mmap(-1, HEADER_SIZE + capacity * 16)
+            SEGMENT_HEADER.pack_into(self.map, 0, SEGMENT_MAGIC, SEGMENT_VERSION, 0, capacity, 0, 0)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT)
+            try:
+                is_new = os.fstat(fd).st_size == 0
+                if is_new:
+                    os.ftruncate(fd, HEADER_SIZE + capacity * 16)
+                self.map = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+            if is_new:
+                SEGMENT_HEADER.pack_into(self.map, 0, SEGMENT_MAGIC, SEGMENT_VERSION, 0, capacity, 0, 0)
+
+        magic, version, _, capacity, carried, count = SEGMENT_HEADER.unpack_from(self.map, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {SEGMENT_VERSION} time-series segment")
+        self.capacity = capacity
+        self.carried = carried
+        self.count = min(count, capacity)
+        self.times = np.frombuffer(self.map, dtype='<i8', count=capacity, offset=HEADER_SIZE)
+        self.values = np.frombuffer(self.map, dtype='<f8', count=capacity, offset=HEADER_SIZE + capacity * 8)
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def append(self, timestamp_ns, value):
+        index = self.count
+        self.times[index] = timestamp_ns
+        self.values[index] = value
+        # The count is written last, so a torn write is never visible after a restart
+        self.count = index + 1
+        struct.pack_into('<Q', self.map, COUNT_OFFSET, self.count)
+
+    def carry_from(self, previous, samples):
+        """Start this segment with the last ``samples`` samples of ``previous``."""
+        samples = min(samples, previous.count)
+        self.times[:samples] = previous.times[previous.count - samples:previous.count]
+        self.values[:samples] = previous.values[previous.count - samples:previous.count]
+        self.carried = self.count = samples
+        struct.pack_into('<IQ', self.map, CARRIED_OFFSET, self.carried, self.count)
+
+    def tail(self, samples):
+        """Zero-copy (times, values) views of the last ``samples`` samples."""
+        start = max(0, self.count - samples)
+        return self.times[start:self.count], self.values[start:self.count]
+
+    def history(self):
+        """Zero-copy (times, values) views of the samples that belong to this segment."""
+        return self.times[self.carried:self.count], self.values[self.carried:self.count]
+
+    def last_time_ns(self):
+        return int(self.times[self.count - 1]) if self.count else None
+
+    def flush(self):
+        if self.path is not None:
+            self.map.flush()
+
+    def close(self):
+        self.flush()
+        self.times = self.values = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # A caller still holds a view; the mapping goes away with it
+
+
+class SeriesLog:
+    """Append-only, segmented columnar log of one series.
+
+    It replaces the ``deque(maxlen=window)`` of (value, receive time) tuples the
+    subscriber used to keep: append() takes the same tuples (a None value marks a
+    missed transmission and is stored as NaN), and iterating or len() covers the
+    last ``window`` samples. tail() is the fast path for the live view.
+    """
+
+    def __init__(self, directory, name, window=50, segment_samples=86400, max_segments=None,
+                 retention_seconds=None):
+        self.directory = directory
+        self.name = name
+        self.window = window
+        # A segment must hold more than the carried tail, or it would be full on creation
+        self.segment_samples = max(segment_samples, window * 2)
+        self.max_segments = max_segments
+        self.retention_seconds = retention_seconds
+        self.lock = threading.Lock()
+        self.segments = []  # oldest first, the last one is written to
+        self.load()
+
+    def segment_path(self, sequence):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{sequence:012d}{SEGMENT_SUFFIX}")
+
+    def load(self):
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            sequences = sorted(int(entry[:-len(SEGMENT_SUFFIX)]) for entry in os.listdir(self.directory)
+                               if entry.endswith(SEGMENT_SUFFIX))
+            for sequence in sequences:
+                self.segments.append(Segment(self.segment_path(sequence), sequence, self.segment_samples))
+        if not self.segments:
+            self.segments.append(Segment(self.segment_path(0), 0, self.segment_samples))
+        self.apply_retention()
+
+    def append(self, item):
+        value, received_at = item
+        with self.lock:
+            segment = self.segments[-1]
+            if segment.is_full():
+                segment = self.roll_over()
+            segment.append(int(received_at * 1e9), math.nan if value is None else value)
+
+    def roll_over(self):
+        previous = self.segments[-1]
+        segment = Segment(self.segment_path(previous.sequence + 1), previous.sequence + 1, self.segment_samples)
+        segment.carry_from(previous, self.window)
+        previous.flush()
+        self.segments.append(segment)
+        self.apply_retention()
+        return segment
+
+    def apply_retention(self):
+        """Drop the oldest segments beyond max_segments or older than retention_seconds."""
+        cutoff = None
+        if self.retention_seconds is not None:
+            cutoff = time.time_ns() - int(self.retention_seconds * 1e9)
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            too_many = self.max_segments is not None and len(self.segments) > self.max_segments
+            last_time = oldest.last_time_ns()
+            expired = cutoff is not None and (last_time is None or last_time < cutoff)
+            if not (too_many or expired):
+                break
+            self.segments.pop(0)
+            oldest.close()
+            if oldest.path is not None:
+                os.remove(oldest.path)
+
+    def tail(self, samples=None):
+        """(times in ns, values) of the newest samples, as views into the memory map.
+
+        Up to ``window`` samples this never copies; a longer tail that crosses a
+        segment boundary is assembled from history.
+        """
+        samples = self.window if samples is None else samples
+        with self.lock:
+            segment = self.segments[-1]
+            if samples <= segment.count or len(self.segments) == 1:
+                return segment.tail(samples)
+        times, values = self.read()
+        return times[-samples:], values[-samples:]
+
+    def read(self, since=None):
+        """Copy of every retained sample, optionally only those received at or after ``since`` (seconds)."""
+        since_ns = None if since is None else int(since * 1e9)
+        with self.lock:
+            parts = [segment.history() for segment in self.segments
+                     if since_ns is None or (segment.count and segment.last_time_ns() >= since_ns)]
+            if not parts:
+                return np.empty(0, dtype='<i8'), np.empty(0, dtype='<f8')
+            times = np.concatenate([part[0] for part in parts])
+            values = np.concatenate([part[1] for part in parts])
+        if since_ns is not None:
+            keep = times >= since_ns
+            times, values = times[keep], values[keep]
+        return times, values
+
+    def sample_count(self):
+        """Samples retained across all segments."""
+        with self.lock:
+            return sum(segment.count - segment.carried for segment in self.segments)
+
+    def __len__(self):
+        return len(self.tail()[1])
+
+    def __iter__(self):
+        times, values = self.tail()
+        for timestamp_ns, value in zip(times.tolist(), values.tolist()):
+            yield (None if math.isnan(value) else value, timestamp_ns / 1e9)
+
+    def flush(self):
+        with self.lock:
+            self.segments[-1].flush()
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+
+
+class TimeSeriesStore:
+    """Columnar store with one SeriesLog per series.
+
+    With a ``directory`` every series lives in its own sub-directory of segment
+    files and is picked up again on the next start; without one the segments are
+    anonymous memory maps and nothing outlives the process.
+    """
+
+    def __init__(self, directory=None, window=50, segment_samples=86400, max_segments=None,
+                 retention_seconds=None):
+        self.directory = directory
+        self.window = window
+        self.segment_samples = segment_samples
+        self.max_segments = max_segments
+        self.retention_seconds = retention_seconds
+        self.logs = {}
+        self.lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def names(self):
+        """Series held in memory plus any found on disk."""
+        names = set(self.logs)
+        if self.directory is not None:
+            names.update(unquote(entry) for entry in os.listdir(self.directory)
+                         if os.path.isdir(os.path.join(self.directory, entry)))
+        return sorted(names)
+
+    def series(self, name):
+        with self.lock:
+            log = self.logs.get(name)
+            if log is None:
+                directory = None
+                if self.directory is not None:
+                    directory = os.path.join(self.directory, quote(name, safe=''))
+                log = self.logs[name] = SeriesLog(directory, name, self.window, self.segment_samples,
+                                                  self.max_segments, self.retention_seconds)
+            return log
+
+    def flush(self):
+        for log in list(self.logs.values()):
+            log.flush()
+
+    def close(self):
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+            self.logs = {}
@@ -0,0 +1,342 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import Utils.group_7_config as config
+from Utils.group_7_metrics import get_registry
+from publishers.group_7_connection_pool import MqttConnectionPool
+
+METRICS = get_registry()
+PUBLISHED = METRICS.counter("aggregator_windows_published_total", "Closed windows published", ["window"])
+CLOSE_SECONDS = METRICS.histogram("aggregator_close_seconds", "Time to close one step over every stream")
+STREAMS = METRICS.counter("aggregator_streams_total", "Value streams given aggregation state")
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with log-spaced buckets (the DDSketch idea).
+
+    A value v > 0 is counted in bucket ceil(log(v) / log(gamma)), with
+    gamma = (1 + accuracy) / (1 - accuracy), so every quantile comes back within
+    ``accuracy`` relative error however many values went in. Sketches of the
+    same accuracy merge by adding bucket counts, and a merged-in sketch can be
+    subtracted again, which is how sliding windows drop their oldest pane.
+    Zero and negative values share one bucket and read back as 0.
+    """
+
+    __slots__ = ("accuracy", "log_gamma", "buckets", "zeros", "count")
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self.buckets = {}  # bucket index -> values counted
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        else:
+            self.zeros += 1
+        self.count += 1
+
+    def merge(self, other):
+        buckets = self.buckets
+        for key, count in other.buckets.items():
+            buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def subtract(self, other):
+        """Undo an earlier merge(other)."""
+        buckets = self.buckets
+        for key, count in other.buckets.items():
+            left = buckets[key] - count
+            if left:
+                buckets[key] = left
+            else:
+                del buckets[key]
+        self.zeros -= other.zeros
+        self.count -= other.count
+
+    def quantiles(self, fractions):
+        """Approximate value at each fraction (0..1) of the counted values, None when empty."""
+        if not self.count:
+            return [None] * len(fractions)
+        gamma = math.exp(self.log_gamma)
+        ranks = [fraction * (self.count - 1) for fraction in fractions]
+        results = [None] * len(fractions)
+        seen = self.zeros
+        for position, rank in enumerate(ranks):
+            if rank < seen:
+                results[position] = 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            for position, rank in enumerate(ranks):
+                if results[position] is None and rank < seen:
+                    # Midpoint of the bucket (gamma^(key-1), gamma^key], within the relative error of either end
+                    results[position] = 2 * gamma ** key / (gamma + 1)
+        return results
+
+
+class WindowStats:
+    """Count, sum, sum of squares, min, max and a quantile sketch of the values in a pane or window."""
+
+    __slots__ = ("count", "total", "total_squares", "low", "high", "sketch")
+
+    def __init__(self, accuracy):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        self.sketch.merge(other.sketch)
+
+    def subtract(self, other):
+        """Undo an earlier merge(other); low and high are left for the caller to recompute."""
+        self.count -= other.count
+        self.sketch.subtract(other.sketch)
+        if self.count:
+            self.total -= other.total
+            self.total_squares -= other.total_squares
+        else:
+            self.total = self.total_squares = 0.0  # Start clean instead of carrying rounding errors
+
+
+class WindowSpec:
+    """One configured window, with its length and step counted in base steps (the shortest step)."""
+
+    def __init__(self, name, length, step, base_step):
+        if step % base_step or length % step:
+            raise ValueError(f"Window {name}: the step must be a multiple of {base_step} s "
+                             f"and the length a multiple of the step")
+        self.name = name
+        self.length = length
+        self.step = step
+        self.step_ticks = round(step / base_step)
+        self.length_ticks = round(length / base_step)
+        self.panes = round(length / step)  # 1 for a tumbling window
+
+
+class StreamState:
+    """Aggregation state of one value stream (one field of one topic)."""
+
+    __slots__ = ("topics", "base", "pending", "panes", "totals")
+
+    def __init__(self, topics, accuracy):
+        self.topics = topics  # Aggregate topic per window
+        self.base = None  # WindowStats of the current base step, None until a value arrives
+        self.pending = [None] * len(topics)  # Per window: the step being filled
+        self.panes = [deque() for _ in topics]  # Per window: (end tick, WindowStats) of the steps in the window
+        self.totals = [WindowStats(accuracy) for _ in topics]  # Per window: every pane merged
+
+
+def aggregate_topic(root, window, topic, field=None):
+    """<root>/<window>/<topic without its first level>[/<field>], e.g. health/agg/1m/patient-00001/heart_rate."""
+    levels = [root, window]
+    rest = topic.partition('/')[2]
+    if rest:
+        levels.append(rest)
+    if field is not None:
+        levels.append(field)
+    return "/".join(levels)
+
+
+def aggregate_pool(host=None, port=None):
+    """One pooled connection for publishing aggregates, connected before returning.
+
+    Aggregates are live data: the pool has no outbox, so nothing is spooled to
+    disk and sent late, or left over for the next run.
+    """
+    pool = MqttConnectionPool(1, host=host, port=port, name="aggregator", outbox_dir="")
+    pool.acquire(config.AGGREGATE_TOPIC_ROOT)  # Opens the connection now instead of at the first window
+    pool.wait_until_connected()
+    return pool
+
+
+def pool_publisher(pool):
+    """publish(topic, payload) over a connection pool (publishers/group_7_connection_pool.py)."""
+    connections = {}
+
+    def publish(topic, payload):
+        connection = connections.get(topic)
+        if connection is None:
+            connection = connections[topic] = pool.acquire(topic)
+        connection.publish(topic, payload)
+    return publish
+
+
+class WindowAggregator:
+    """Subscriber sink that aggregates every accepted sample over time windows and publishes the results.
+
+    Each value of a reading is a stream (blood pressure gives two, systolic and
+    diastolic). A sample costs one update of its stream's current base step
+    (the shortest configured step), whatever the number of windows. When a
+    base step closes it is merged into each window's step in progress; when a
+    window's step closes, that step is merged into the window's running total
+    and the oldest step leaves the total by subtraction, so a sliding hour
+    costs the same per step as a tumbling second. Only windows that saw
+    samples are published, as JSON on aggregate_topic(). Windows follow the
+    wall clock: start() closes them on a background thread, or call advance()
+    regularly. ``publish`` is called as publish(topic, payload), outside the lock.
+    """
+
+    def __init__(self, publish, windows=None, quantiles=None, accuracy=None, topic_root=None):
+        windows = windows if windows is not None else config.AGGREGATE_WINDOWS
+        self.publish = publish
+        self.quantile_fractions = tuple(quantiles if quantiles is not None else config.AGGREGATE_QUANTILES)
+        self.quantile_keys = [f"p{fraction * 100:g}" for fraction in self.quantile_fractions]
+        self.accuracy = accuracy if accuracy is not None else config.AGGREGATE_SKETCH_ACCURACY
+        self.topic_root = topic_root if topic_root is not None else config.AGGREGATE_TOPIC_ROOT
+        self.base_step = min(window["step"] for window in windows)
+        self.windows = [WindowSpec(window["name"], window["length"], window["step"], self.base_step)
+                        for window in windows]
+        self.streams = {}  # topic -> StreamState per value field
+        self.open = []  # Streams with samples in the current base step
+        self.changed = [[] for _ in self.windows]  # Per window: streams with samples in the step being filled
+        self.emit_at = [{} for _ in self.windows]  # Per window: end tick -> streams with samples in that window
+        self.tick = math.floor(time.time() / self.base_step)  # Base steps since the epoch; the current one is open
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {"samples": 0, "published": 0}
+
+    # Sink hooks
+
+    def on_sample(self, topic, reading, received_at):
+        with self.lock:
+            states = self.streams.get(topic)
+            if states is None:
+                states = self.streams[topic] = self.new_streams(topic, reading)
+            for state, value in zip(states, reading[1:]):
+                base = state.base
+                if base is None:
+                    base = state.base = WindowStats(self.accuracy)
+                    self.open.append(state)
+                base.add(value)
+            self.stats["samples"] += 1
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def new_streams(self, topic, reading):
+        fields = reading._fields[1:]
+        states = []
+        for field in fields:
+            # The field is only spelled out when the topic alone does not say which value it is
+            suffix = field if len(fields) > 1 or '/' not in topic else None
+            topics = [aggregate_topic(self.topic_root, window.name, topic, suffix) for window in self.windows]
+            states.append(StreamState(topics, self.accuracy))
+        STREAMS.inc(len(states))
+        return states
+
+    # Closing windows
+
+    def start(self):
+        """Close windows on a background thread as the wall clock passes each step."""
+        def run():
+            while not self.stop_event.wait(max(0.0, (self.tick + 1) * self.base_step - time.time())):
+                self.advance(time.time())
+        self.thread = threading.Thread(target=run, name="WindowAggregator", daemon=True)
+        self.thread.start()
+
+    def advance(self, now):
+        """Close every base step that ended by ``now`` and publish the windows that closed with it."""
+        started = time.perf_counter()
+        messages = []
+        with self.lock:
+            while (self.tick + 1) * self.base_step <= now:
+                self.tick += 1
+                self.close_step(self.tick, messages)
+        for topic, payload in messages:
+            self.publish(topic, payload)
+        if messages:
+            CLOSE_SECONDS.observe(time.perf_counter() - started)
+        return len(messages)
+
+    def close_step(self, tick, messages):
+        """Fold the base step ending at ``tick`` into every window and collect the windows that end there."""
+        closing, self.open = self.open, []
+        for state in closing:
+            base, state.base = state.base, None
+            for position, window in enumerate(self.windows):
+                pending = state.pending[position]
+                if pending is None:
+                    self.changed[position].append(state)
+                    if window.step_ticks == 1:
+                        # The base step is the whole step; closed steps are never modified, so it can be shared
+                        state.pending[position] = base
+                        continue
+                    pending = state.pending[position] = WindowStats(self.accuracy)
+                pending.merge(base)
+
+        for position, window in enumerate(self.windows):
+            if tick % window.step_ticks:
+                continue
+            end = tick * self.base_step
+            header = {"timestamp": datetime.fromtimestamp(end).isoformat(), "window": window.name,
+                      "start": end - window.length, "end": end}
+            changed, self.changed[position] = self.changed[position], []
+            if window.panes == 1:
+                # Tumbling: the step just closed is the whole window
+                for state in changed:
+                    pane, state.pending[position] = state.pending[position], None
+                    messages.append((state.topics[position], self.window_payload(header, pane)))
+                self.stats["published"] += len(changed)
+                PUBLISHED.labels(window.name).inc(len(changed))
+                continue
+            emit_at = self.emit_at[position]
+            for state in changed:
+                pane, state.pending[position] = state.pending[position], None
+                state.panes[position].append((tick, pane))
+                state.totals[position].merge(pane)
+                # The step counts towards every window that ends within one length of it
+                for step in range(window.panes):
+                    emit_at.setdefault(tick + step * window.step_ticks, set()).add(state)
+            emitting = emit_at.pop(tick, ())
+            for state in emitting:
+                messages.append((state.topics[position], self.window_payload(header, state.totals[position])))
+                self.expire(state, position, tick - window.length_ticks + window.step_ticks)
+            self.stats["published"] += len(emitting)
+            PUBLISHED.labels(window.name).inc(len(emitting))
+
+    def expire(self, state, position, oldest_tick):
+        """Drop the steps ending before ``oldest_tick`` from a window; they are in none of its later windows."""
+        panes, total = state.panes[position], state.totals[position]
+        while panes and panes[0][0] < oldest_tick + 1:
+            total.subtract(panes.popleft()[1])
+        if panes:
+            total.low = min(pane.low for _, pane in panes)
+            total.high = max(pane.high for _, pane in panes)
+        else:
+            total.low, total.high = math.inf, -math.inf
+
+    def window_payload(self, header, stats):
+        mean = stats.total / stats.count
+        variance = max(stats.total_squares / stats.count - mean * mean, 0.0)
+        summary = dict(header)
+        summary.update(count=stats.count, min=stats.low, max=stats.high, mean=mean, stddev=math.sqrt(variance))
+        summary.update(zip(self.quantile_keys, stats.sketch.quantiles(self.quantile_fractions)))
+        return json.dumps(summary)
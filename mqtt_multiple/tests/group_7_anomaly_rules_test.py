@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+import numpy as np
+
+# Run from anywhere: the modules below import each other relative to mqtt_multiple/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from subscribers.group_7_anomaly_rules import AnomalyRuleEngine
+
+RULES = [
+    {"name": "hr_high", "kind": "threshold", "field": "heart_rate", "above": 150},
+    {"name": "hr_jump", "kind": "rate", "field": "heart_rate", "max_change": 60},
+    {"name": "hr_zscore", "kind": "zscore", "field": "heart_rate", "threshold": 3.0, "window": 50, "min_samples": 5},
+    {"name": "sys_jump", "kind": "rate", "field": "systolic", "max_change": 40},
+]
+
+
+def flag_one_by_one(samples):
+    engine = AnomalyRuleEngine(RULES)
+    return np.vstack([engine.evaluate([sample]) for sample in samples])
+
+
+def test_wild_sample_is_not_the_rate_reference():
+    samples = [("p1", "heart_rate", value, float(second))
+               for second, value in enumerate([80, 200, 82, 81, 83, 80, 79, 84, 82, 81])]
+    batch = AnomalyRuleEngine(RULES).evaluate(samples)
+    assert batch.any(axis=1).tolist() == [False, True] + [False] * 8
+    assert (batch == flag_one_by_one(samples)).all()
+
+
+def test_batch_matches_sample_by_sample():
+    generator = random.Random(7)
+    samples = []
+    for second in range(200):
+        for patient in range(generator.randint(1, 6)):
+            field = generator.choice(["heart_rate", "systolic", "spo2"])
+            value = generator.choice([generator.gauss(80, 5), generator.uniform(0, 250)])
+            samples.append((f"p{patient}", field, value, second + generator.random() / 2))
+    expected = flag_one_by_one(samples)
+    for size in (9, 40, 500, len(samples)):
+        engine = AnomalyRuleEngine(RULES)
+        hits = np.vstack([engine.evaluate(samples[start:start + size]) for start in range(0, len(samples), size)])
+        assert (hits == expected).all(), f"batches of {size}"